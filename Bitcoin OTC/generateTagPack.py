@@ -4,16 +4,44 @@ Convert #bitcoin-otc web of trust data to a TagPack.
 """
 
 import os
-from urllib.error import HTTPError
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlencode, unquote
-from urllib.request import urlretrieve, urlopen
 from datetime import datetime, date
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional
 
 import yaml
+from requests import RequestException
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.download import TIMEOUT, download_file, get_session
+from tagpack_converters.export import output_options, save_tagpack_as
+from tagpack_converters.lookup_cache import DAY, LookupCache
 
 
 SKS_LOOKUP_URL = 'https://sks.pod01.fleetstreetops.com/pks/lookup'
+SKS_WORKERS = 8
+KEY_CACHE_FILE_NAME = 'sks_keys.json'
+# Days the user IDs of a key, or the absence of a key, are reused before being looked up again
+KEY_CACHE_TTL = 30
+KEY_CACHE_NEGATIVE_TTL = 7
+
+
+def lookup_url(keyid: str) -> str:
+    params = urlencode({'search': '0x{id}'.format(id=keyid), 'fingerprint': 'on', 'op': 'index'})
+    return '{lookup_url}?{params}'.format(lookup_url=SKS_LOOKUP_URL, params=params)
+
+
+def lookup_uids(keyid: str) -> Optional[List[str]]:
+    """
+    Return the user IDs of an OpenPGP key on the keyserver, or None if the keyserver does not know the key.
+    """
+    response = get_session().get(lookup_url(keyid), timeout=TIMEOUT)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    lines = response.content.decode('utf-8').split('\n')
+    return [unquote(line.split(':')[1]) for line in lines if line.startswith('uid:')]
 
 
 class RawData:
@@ -25,7 +53,7 @@ class RawData:
         self.url = url
 
     def download(self):
-        urlretrieve(self.url, self.fn)
+        download_file(self.url, self.fn)
 
     def read(self) -> List[dict]:
         import json
@@ -38,8 +66,11 @@ class TagPackGenerator:
     Generate a TagPack from #bitcoin-otc web of trust data.
     """
 
-    def __init__(self, rows: List[dict], title: str, creator: str, description: str, lastmod: date, source: str):
+    def __init__(self, rows: List[dict], title: str, creator: str, description: str, lastmod: date, source: str,
+                 key_cache_fn: str = KEY_CACHE_FILE_NAME, max_workers: int = SKS_WORKERS):
         self.rows = rows
+        self.key_cache_fn = key_cache_fn
+        self.max_workers = max_workers
         self.data = {
             'title': title,
             'creator': creator,
@@ -47,13 +78,32 @@ class TagPackGenerator:
             'source': source,
             'lastmod': lastmod,
             'currency': 'BTC',
-            'category': 'user',
-            'tags': []
+            'category': 'user'
         }
 
-    def generate(self):
-        tags = []
-        self.data['tags'] = tags
+    def lookup_keys(self) -> Dict[str, List[str]]:
+        """
+        Return the user IDs of the keys of the rows, looked up concurrently unless found in the key cache. Keys the
+        keyserver does not know have no user IDs, and keys whose lookup failed, e.g. on a connection error, are left
+        out, and looked up again on the next run.
+        """
+        keyids = [row['keyid'] for row in self.rows if row['bitcoinaddress'] is not None and row['keyid'] is not None]
+        cache = LookupCache(self.key_cache_fn, KEY_CACHE_TTL * DAY, KEY_CACHE_NEGATIVE_TTL * DAY)
+        try:
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                futures = {executor.submit(lookup_uids, keyid): keyid for keyid in cache.missing(keyids)}
+                for future in as_completed(futures):
+                    try:
+                        cache[futures[future]] = future.result()
+                    except RequestException as error:
+                        print('{error}, URL: {url}'.format(error=error, url=lookup_url(futures[future])),
+                              file=sys.stderr)
+        finally:
+            cache.save()  # Keep the keys looked up so far, even if a lookup failed
+        return {keyid: cache[keyid] or [] for keyid in keyids if keyid in cache}
+
+    def generate(self) -> Iterator[dict]:
+        uids = self.lookup_keys()
         for row in self.rows:
             if row['bitcoinaddress'] is None:
                 continue  # There is no value for a tag without BTC address
@@ -62,21 +112,12 @@ class TagPackGenerator:
             keyid = row['keyid']
             if keyid is not None:
                 label += ['OpenPGP key id: {keyid}'.format(keyid=keyid)]
-                params = urlencode({'search': '0x{id}'.format(id=row['keyid']), 'fingerprint': 'on', 'op': 'index'})
-                url = '{lookup_url}?{params}'.format(lookup_url=SKS_LOOKUP_URL, params=params)
-                try:
-                    with urlopen(url) as req:
-                        lines = req.read().decode('utf-8').split('\n')
-                    label += [unquote(line.split(':')[1]) for line in lines if line.startswith('uid:')]
-                except HTTPError as error:
-                    if error.code != 404:
-                        print('{error}, URL: {url}'.format(error=error, url=url))
+                label += uids.get(keyid, [])
             tag['label'] = ', '.join(label)
-            tags.append(tag)
+            yield tag
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance)
 
 
 if __name__ == '__main__':
@@ -84,11 +125,9 @@ if __name__ == '__main__':
         config = yaml.safe_load(config_file)
 
     raw_data = RawData(config['RAW_FILE_NAME'], config['URL'])
-    if not os.path.exists(config['RAW_FILE_NAME']):
-        raw_data.download()
+    raw_data.download()  # Only transfers the data if it changed since the last download
 
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
-                                 last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+                                 last_mod, config['SOURCE'], config.get('KEY_CACHE_FILE_NAME', KEY_CACHE_FILE_NAME))
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
@@ -3,9 +3,10 @@
 Convert BitcoinAbuse data to a TagPack.
 """
 import os
+import sys
 import json
 from datetime import datetime, date
-from typing import List
+from typing import Iterable, Iterator, List
 
 import yaml
 from selenium import webdriver
@@ -16,6 +17,9 @@ from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.export import output_options, save_tagpack_as
+
 
 class RawData:
     """
@@ -113,13 +117,11 @@ class TagPackGenerator:
             'lastmod': lastmod,
             'currency': 'BTC',
             'category': 'perpetrator',
-            'confidence': 'web_crawl',
-            'tags': []
+            'confidence': 'web_crawl'
         }
         self.rows = rows
 
-    def generate(self):
-        tags = []
+    def generate(self) -> Iterator[dict]:
         for row in self.rows:
             label = 'Abuse report at BitcoinAbuse.com' if row['count'] == 1 else 'Abuse reports at BitcoinAbuse.com'
             lastmod = datetime.fromisoformat(row['latest_date']).date()
@@ -129,12 +131,10 @@ class TagPackGenerator:
                 'lastmod': lastmod,
                 'source': 'https://www.bitcoinabuse.com/reports/{address}'.format(address=row['address'])
             }
-            tags.append(tag)
-        self.data['tags'] = tags
+            yield tag
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance)
 
 
 if __name__ == '__main__':
@@ -148,5 +148,4 @@ if __name__ == '__main__':
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
                                  last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
@@ -7,14 +7,41 @@ import re
 import sys
 import json
 import time
+import glob
+import heapq
+import argparse
+import threading
+import itertools
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
 from datetime import datetime, date
-from typing import List, Union, TextIO
+from typing import Iterable, Iterator, List, Optional, Tuple, Union, TextIO
+from urllib.parse import urljoin
 
 import yaml
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
+import lxml.html
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
+try:  # Only needed to download the profiles with a browser
+    from selenium import webdriver
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.firefox.options import Options
+except ImportError:
+    webdriver = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.addresses import AddressScanner
+from tagpack_converters.archive import archive_files
+from tagpack_converters.coordinator import Coordinator, QueueWorker
+from tagpack_converters.export import output_options, save_tagpack_as
+from tagpack_converters.id_index import IdStateIndex
+from tagpack_converters.incremental import IncrementalExtraction
+from tagpack_converters.offset_index import OffsetIndex
+from tagpack_converters.rate_limit import RateLimiter, SharedRateLimiter
+from tagpack_converters.work_queue import WorkQueue
 
 # Taken from Sanctioned NBCTF generator and modified
 REGEX = [
@@ -26,6 +53,312 @@ REGEX = [
 ]
 
 BITCOINTALK_PROFILE_URL = 'https://bitcointalk.org/index.php?action=profile;u={user_id}'
+# The links of saved topic pages are resolved against the forum
+BITCOINTALK_URL = 'https://bitcointalk.org/index.php'
+ERROR_TITLE = 'An Error Has Occurred!'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0'
+FETCH_WORKERS = 4
+# Consecutive user IDs without profile after which the download of new users stops
+END_GAP = 1000
+# User IDs per range a process of a sharded download fetches at a time, and its JSON lines file next to the raw data
+SHARD_RANGE_SIZE = 100
+SHARD_FILE_NAME = '{fn}.shard-{pid}'
+# Next to the raw data, the queue of the ranges of user IDs of a distributed download, and the port of its coordinator
+QUEUE_SUFFIX = '.queue.sqlite'
+COORDINATOR_PORT = 8765
+PROFILE_TITLE_PREFIX = 'View the profile of '
+# The user ID of a saved profile page, in its file name, e.g. "index.php?action=profile;u=35" or "profile_35.html", or
+# else in the link of the page to the posts of the user
+PROFILE_FILE_REGEX = re.compile(r'(?:action=profile;u=|profile[_-])(\d+)')
+PROFILE_POSTS_REGEX = re.compile(rb'action=profile;u=(\d+);sa=showPosts')
+# Saved pages handed to a process of an ingestion at a time, and batches in flight per process
+INGEST_BATCH_SIZE = 64
+INGEST_BATCHES_AHEAD = 4
+# Requests per second to the forum, over all workers, like the pause of 1 second between the profiles of the browser
+REQUESTS_PER_SECOND = 1.0
+RETRIES = 5
+TIMEOUT = 60.0
+# Next to the raw data, the index of the user IDs found and not found
+ID_INDEX_SUFFIX = '.ids.npz'
+# Next to the raw data, the offset and length of the latest profile of each user ID
+OFFSET_INDEX_SUFFIX = '.offsets.npz'
+# Next to the raw data, the addresses extracted from the profiles so far
+ADDRESSES_SUFFIX = '.addresses.pickle'
+# The rows of the profile table, in a page without the tbody elements browsers insert into tables
+PROFILE_ROWS_XPATH = '//table/tr/td/table/tr[2]/td[1]/table/tr'
+# Elements a browser renders on lines of their own, and elements it does not render
+BLOCK_TAGS = {'address', 'blockquote', 'center', 'dd', 'div', 'dl', 'dt', 'fieldset', 'form', 'h1', 'h2', 'h3', 'h4',
+              'h5', 'h6', 'hr', 'li', 'ol', 'p', 'pre', 'table', 'tr', 'ul'}
+HIDDEN_TAGS = {'head', 'noscript', 'script', 'style', 'template', 'title'}
+WHITESPACE_REGEX = re.compile(r'[ \t\n\r\f]+')
+
+
+def rendered_text(element: etree.ElementBase) -> str:
+    """
+    Return the text of an element as a browser renders it, i.e. the text property of a Selenium element: runs of white
+    space collapsed into a space, lines broken at <br> and around block elements, and each line stripped.
+    """
+    lines = ['']
+
+    def break_line():
+        if lines[-1].strip():
+            lines.append('')
+
+    def walk(node):
+        if not isinstance(node.tag, str) or node.tag in HIDDEN_TAGS:
+            return
+        if node.tag == 'br':
+            lines.append('')
+            return
+        if node.tag in BLOCK_TAGS:
+            break_line()
+        lines[-1] += node.text or ''
+        for child in node:
+            walk(child)
+            lines[-1] += child.tail or ''
+        if node.tag in BLOCK_TAGS:
+            break_line()
+        elif node.tag in ('td', 'th'):
+            lines[-1] += ' '
+
+    walk(element)
+    lines = [WHITESPACE_REGEX.sub(' ', line).replace('\xa0', ' ').strip() for line in lines]
+    while lines and not lines[-1]:
+        lines.pop()
+    while lines and not lines[0]:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+def add_profile_entry(data: dict, key: str, value: str):
+    """
+    Add an entry of the profile table to the profile data, unless it holds no information.
+    """
+    # Normalise key and value
+    key = key.strip().lower().replace(':', '').replace(' ', '_')
+    value = value.strip()
+    # Skip entry with either empty key or empty value
+    if not key or not value:
+        return
+    # E-mail address is always hidden, hence we skip it
+    if key == 'email':
+        return
+    # Age may be hidden; if so, we skip the entry too
+    if key == 'age' and value == 'N/A':
+        return
+    # Convert values in certain entries to integers
+    if key in ('posts', 'activity', 'merit', 'age'):
+        value = int(value)
+    # Add entry to the profile data
+    data[key] = value
+
+
+def page_title(document: etree.ElementBase) -> str:
+    return ' '.join(document.findtext('.//title', '').split())
+
+
+def parse_profile(html: Union[str, bytes], user_id: int) -> Optional[dict]:
+    """
+    Parse a profile page with lxml into the data download_profile scrapes from it with a browser, or return None if
+    there is no such profile.
+    """
+    return parse_profile_document(lxml.html.document_fromstring(html), user_id)
+
+
+def parse_profile_document(document: etree.ElementBase, user_id: int) -> Optional[dict]:
+    if page_title(document) == ERROR_TITLE:
+        return None
+    etree.strip_tags(document, 'tbody')
+    data = {'user_id': user_id}
+    for entry in document.xpath(PROFILE_ROWS_XPATH):
+        keys, values = entry.xpath('td[1]/b'), entry.xpath('td[2]')
+        if keys and values:
+            add_profile_entry(data, rendered_text(keys[0]), rendered_text(values[0]))
+    signatures = document.xpath('//div[@class="signature"]')
+    if signatures:
+        signature = rendered_text(signatures[0])
+        if signature:
+            data['signature'] = signature
+    avatars = document.xpath('//img[@class="avatar"]')
+    if avatars and avatars[0].get('src'):
+        # The browser resolves the URL against the page
+        data['avatar_url'] = urljoin(BITCOINTALK_PROFILE_URL.format(user_id=user_id), avatars[0].get('src'))
+    avatar_text = ' '.join([rendered_text(avatar.getparent()) for avatar in avatars]).strip()
+    if avatar_text:
+        data['avatar_text'] = avatar_text
+    return data
+
+
+def parse_posts(document: etree.ElementBase, scanner: AddressScanner) -> List[dict]:
+    """
+    Return the URL, poster and addresses of each post of a topic page with addresses in its text, leaving out the
+    posts it quotes, whose addresses are not those of the poster.
+    """
+    posts = []
+    for header_and_post in document.xpath('//td[@class="td_headerandpost"]'):
+        links = header_and_post.xpath('.//div[@class="subject"]/a/@href')
+        bodies = header_and_post.xpath('.//div[@class="post"]')
+        if not links or not bodies:
+            continue
+        for quote in bodies[0].xpath('.//div[@class="quoteheader" or @class="quote"]'):
+            quote.drop_tree()
+        post_addresses = scanner.extract([rendered_text(bodies[0])])
+        if post_addresses:
+            posters = header_and_post.xpath('preceding-sibling::td[@class="poster_info"]/b/a')
+            posts.append({
+                'url': urljoin(BITCOINTALK_URL, links[0]),
+                'name': posters[0].text_content().strip() if posters else None,
+                'addresses': list(post_addresses.items())
+            })
+    return posts
+
+
+def ingest_page(name: str, content: bytes, scanner: AddressScanner) -> List[Tuple[str, dict]]:
+    """
+    Parse a saved page into the profile of a profile page or the posts with addresses of a topic page.
+    """
+    try:
+        document = lxml.html.document_fromstring(content)
+    except (etree.ParserError, ValueError):
+        return []  # Not a page, e.g. an empty file
+    if page_title(document).startswith(PROFILE_TITLE_PREFIX):
+        match = PROFILE_FILE_REGEX.search(os.path.basename(name)) or PROFILE_POSTS_REGEX.search(content)
+        if match is None:
+            print('No user ID for the profile page {name}'.format(name=name), file=sys.stderr)
+            return []
+        profile = parse_profile_document(document, int(match.group(1)))
+        return [('profile', profile)] if profile is not None else []
+    return [('post', post) for post in parse_posts(document, scanner)]
+
+
+def ingest_pages(pages: List[Tuple[str, Optional[bytes]]]) -> List[Tuple[str, dict]]:
+    """
+    Parse saved pages, given by name and content, or by path, into the profiles of profile pages and the posts with
+    addresses of topic pages, each returned with its kind, 'profile' or 'post'. Pages that fail to parse, e.g. as they
+    are truncated or hold malformed values, are skipped.
+    """
+    scanner = AddressScanner(REGEX)
+    records = []
+    for name, content in pages:
+        if content is None:
+            with open(name, 'rb') as page_file:
+                content = page_file.read()
+        try:
+            records.extend(ingest_page(name, content, scanner))
+        except Exception as error:
+            print('Skipped the page {name}: {error!r}'.format(name=name, error=error), file=sys.stderr)
+    return records
+
+
+class ProfileFetcher:
+    """
+    Fetch profile pages over HTTP and parse them with lxml, in a pool of worker threads sharing a budget of requests
+    per second.
+    """
+
+    def __init__(self, workers: int = FETCH_WORKERS, rate: float = REQUESTS_PER_SECOND,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.workers = workers
+        self.rate_limiter = rate_limiter or RateLimiter(rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': USER_AGENT})
+
+    def fetch(self, user_id: int) -> Optional[dict]:
+        url = BITCOINTALK_PROFILE_URL.format(user_id=user_id)
+        for retry in range(RETRIES):
+            self.rate_limiter.wait()
+            try:
+                response = self.session.get(url, timeout=TIMEOUT)
+            except requests.RequestException:
+                print('Retrying URL {url} (retry {retry})'.format(url=url, retry=retry + 1), file=sys.stderr)
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                print('Retrying URL {url} (retry {retry}, status {status})'.format(
+                    url=url, retry=retry + 1, status=response.status_code), file=sys.stderr)
+                continue
+            response.raise_for_status()
+            return parse_profile(response.content, user_id)
+        raise IOError('Cannot fetch URL {url}'.format(url=url))
+
+    def profiles(self, user_ids: Iterable[int]) -> Iterator[Tuple[int, Optional[dict]]]:
+        """
+        Yield the user IDs with their profiles, or None, in the order of the user IDs, which may be endless. Up to twice
+        as many profiles as there are workers are fetched ahead.
+        """
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='profile') as executor:
+            pending = deque()
+            try:
+                for user_id in user_ids:
+                    pending.append((user_id, executor.submit(self.fetch, user_id)))
+                    if len(pending) >= 2 * self.workers:
+                        user_id, future = pending.popleft()
+                        yield user_id, future.result()
+                while pending:
+                    user_id, future = pending.popleft()
+                    yield user_id, future.result()
+            finally:  # Also when the caller stops early
+                for _, future in pending:
+                    future.cancel()
+
+    def close(self):
+        self.session.close()
+
+
+class BrowserFetcher:
+    """
+    Fetch profiles one at a time with Firefox through Selenium, pausing 1 second between them.
+    """
+
+    def __init__(self):
+        if webdriver is None:
+            raise ImportError('Downloading the profiles with a browser requires selenium')
+        # Create Firefox webdriver, do not load Javascript and image files
+        options = Options()
+        options.set_preference('javascript.enabled', False)
+        options.set_preference('permissions.default.image', 2)
+        self.wd = webdriver.Firefox(options=options)
+
+    def profiles(self, user_ids: Iterable[int]) -> Iterator[Tuple[int, Optional[dict]]]:
+        for user_id in user_ids:
+            yield user_id, RawData.download_profile(self.wd, user_id)
+            # We pause for 1 second to confirm to the rules of the forum
+            time.sleep(1)
+
+    def close(self):
+        self.wd.quit()
+        if os.path.exists('geckodriver.log'):
+            os.remove('geckodriver.log')
+
+
+# In a process of a sharded download, its fetcher and the JSON lines file of its shard
+shard_fetcher = None
+shard_file = None
+
+
+def start_shard(fn: str, workers: int, rate_limiter: SharedRateLimiter):
+    global shard_fetcher, shard_file
+    shard_fetcher = ProfileFetcher(workers, rate_limiter=rate_limiter)
+    shard_file = open(SHARD_FILE_NAME.format(fn=fn, pid=os.getpid()), 'a', encoding='utf-8')
+
+
+def download_shard_range(first_user_id: int, last_user_id: int) -> List[int]:
+    """
+    Append the profiles of the user IDs from `first_user_id` to `last_user_id` to the shard of the process, and return
+    the user IDs without profile.
+    """
+    absent_user_ids = []
+    for user_id, profile in shard_fetcher.profiles(range(first_user_id, last_user_id + 1)):
+        if profile is not None:
+            print(json.dumps(profile, ensure_ascii=False), file=shard_file)
+        else:
+            absent_user_ids.append(user_id)
+    # The processes of the pool end without flushing their files
+    shard_file.flush()
+    return absent_user_ids
+
 
 class RawData:
     """
@@ -34,9 +367,10 @@ class RawData:
     def __init__(self, fn: str, url: str):
         self.fn = fn
         self.url = url
+        self.offsets = None
 
     @staticmethod
-    def download_profile(wd: webdriver.Remote, user_id: int) -> Union[dict, None]:
+    def download_profile(wd: 'webdriver.Remote', user_id: int) -> Union[dict, None]:
         url = BITCOINTALK_PROFILE_URL.format(user_id=user_id)
         for _ in range(5):
             try:
@@ -60,23 +394,7 @@ class RawData:
                 value = entry.find_element(By.XPATH, 'td[2]').text
             except NoSuchElementException:
                 continue  # No value, hence no information here
-            # Normalise key and value
-            key = key.strip().lower().replace(':', '').replace(' ', '_')
-            value = value.strip()
-            # Skip entry with either empty key or empty value
-            if not key or not value:
-                continue
-            # E-mail address is always hidden, hence we skip it
-            if key == 'email':
-                continue
-            # Age may be hidden; if so, we skip the entry too
-            if key == 'age' and value == 'N/A':
-                continue
-            # Convert values in certain entries to integers
-            if key in ('posts', 'activity', 'merit', 'age'):
-                value = int(value)
-            # Add entry to the profile data
-            data[key] = value
+            add_profile_entry(data, key, value)
         # Also scrape signature
         try:
             signature = wd.find_element(By.XPATH, '//div[@class="signature"]').text
@@ -104,136 +422,461 @@ class RawData:
         #print(data)
         return data
 
-    def download_profiles(self, out_file: TextIO, wd: webdriver.Remote, starting_user_id: int):
-        user_id = last_valid_user_id = starting_user_id
-        while True:
+    def download_profiles(self, out_file: TextIO, fetcher: Union[ProfileFetcher, BrowserFetcher],
+                          starting_user_id: int, index: IdStateIndex):
+        last_valid_user_id = starting_user_id
+        for user_id, profile in fetcher.profiles(itertools.count(starting_user_id)):
             # Exit if we could not fetch too many profiles
-            if user_id - last_valid_user_id >= 1000:
+            if user_id - last_valid_user_id >= END_GAP:
                 break
-            # Fetch profile and, if valid, save it
-            profile = self.download_profile(wd, user_id)
+            # If valid, save the profile
             if profile is not None:
                 last_valid_user_id = user_id
                 print(json.dumps(profile, ensure_ascii=False), file=out_file)
-            # We pause for 1 second to confirm to the rules of the forum
-            time.sleep(1)
-            user_id += 1
+            else:
+                index.mark_absent(user_id)
 
-    @staticmethod
-    def get_max_user_id(file: TextIO) -> int:
-        user_id = 0
-        for line in file:
-            profile = json.loads(line)
-            user_id = max(profile['user_id'], user_id)
-        return user_id
+    def download_profiles_sharded(self, processes: int, workers: int, rate: float, starting_user_id: int,
+                                  index: IdStateIndex):
+        """
+        Download the profiles of new users with several processes, each with its own session and `workers` threads,
+        sharing the budget of `rate` requests per second. The processes take ranges of SHARD_RANGE_SIZE user IDs in
+        turn and write the profiles into shards of their own, which are merged into the raw data at the end.
 
-    @staticmethod
-    def get_missing_user_ids(file: TextIO, max_id: int) -> List[int]:
-        user_ids = set()
-        for line in file:
-            profile = json.loads(line)
-            user_ids.add(profile['user_id'])
-        return [user_id for user_id in range(1, max_id + 1) if user_id not in user_ids]
-
-    def download_missing_profiles(self, out_file: TextIO, wd: webdriver.Remote, missing_ids: List[int]):
-        for user_id in missing_ids:
-            profile = self.download_profile(wd, user_id)
+        The download stops like download_profiles after END_GAP user IDs without profile following the last user ID
+        found, which is only known once the ranges up to there are done: until then, more ranges are handed out, a few
+        of which may turn out to be past the end.
+        """
+        rate_limiter = SharedRateLimiter(rate)
+        next_user_id = starting_user_id
+        # All user IDs before `checked_user_id` are checked, and the largest user ID found so far
+        checked_user_id = starting_user_id
+        last_valid_user_id = starting_user_id
+        done = {}
+        try:
+            with ProcessPoolExecutor(processes, initializer=start_shard,
+                                     initargs=(self.fn, workers, rate_limiter)) as executor:
+                in_flight = {}
+                while in_flight or checked_user_id - last_valid_user_id < END_GAP:
+                    while checked_user_id - last_valid_user_id < END_GAP and len(in_flight) < 2 * processes:
+                        last_user_id = next_user_id + SHARD_RANGE_SIZE - 1
+                        future = executor.submit(download_shard_range, next_user_id, last_user_id)
+                        in_flight[future] = (next_user_id, last_user_id)
+                        next_user_id = last_user_id + 1
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        first_user_id, last_user_id = in_flight.pop(future)
+                        absent_user_ids = future.result()
+                        for user_id in absent_user_ids:
+                            index.mark_absent(user_id)
+                        found = sorted(set(range(first_user_id, last_user_id + 1)) - set(absent_user_ids))
+                        if found:
+                            last_valid_user_id = max(last_valid_user_id, found[-1])
+                        done[first_user_id] = last_user_id
+                    while checked_user_id in done:
+                        checked_user_id = done.pop(checked_user_id) + 1
+        finally:
+            self.merge_shards()
+
+    def merge_shards(self):
+        """
+        Append the profiles of the shards of a sharded download, also one that was interrupted, to the raw data in the
+        order of the user IDs, and remove the shards. A process of the download appends its profiles in the order of
+        the user IDs, so that each shard is sorted.
+        """
+        shard_fns = sorted(glob.glob(glob.escape(SHARD_FILE_NAME.format(fn=self.fn, pid='')) + '*'))
+        if not shard_fns:
+            return
+        shard_files = [open(shard_fn, 'r', encoding='utf-8') for shard_fn in shard_fns]
+        try:
+            # Lines still being written when a download was interrupted are dropped
+            shards = [((json.loads(line)['user_id'], line) for line in shard_file if line.endswith('\n'))
+                      for shard_file in shard_files]
+            with open(self.fn, 'a', encoding='utf-8') as jsonlines_file:
+                for _, line in heapq.merge(*shards):
+                    jsonlines_file.write(line)
+        finally:
+            for shard_file in shard_files:
+                shard_file.close()
+        for shard_fn in shard_fns:
+            os.remove(shard_fn)
+
+    def download_missing_profiles(self, out_file: TextIO, fetcher: Union[ProfileFetcher, BrowserFetcher],
+                                  missing_ids: List[int], index: IdStateIndex):
+        for user_id, profile in fetcher.profiles(missing_ids):
             if profile is not None:
                 print(json.dumps(profile, ensure_ascii=False), file=out_file)
-            time.sleep(1)
+            else:
+                index.mark_absent(user_id)
 
-    def download(self, update=False):
-        # Create Firefox webdriver, do not load Javascript and image files
-        options = Options()
-        options.set_preference('javascript.enabled', False)
-        options.set_preference('permissions.default.image', 2)
-        wd = webdriver.Firefox(options=options)
-        # Scrape user profiles
-        if update:
-            # Calculate next user id
-            with open(self.fn, 'r', encoding='utf-8') as jsonlines_file:
-                next_user_id = self.get_max_user_id(jsonlines_file) + 1
-            print('Starting with user ID {next_user_id}'.format(next_user_id=next_user_id))
+    def download(self, update=False, browser=False, workers: int = FETCH_WORKERS, rate: float = REQUESTS_PER_SECOND,
+                 shards: int = 1):
+        """
+        Download the profiles over HTTP with several workers, or with a Firefox browser, which fetches them one by one.
+        With several shards, the profiles of new users are downloaded over HTTP by as many processes.
+
+        The user IDs found and not found are recorded in an IdStateIndex next to the raw data, so that an update starts
+        right after the largest user ID found without reading the raw data, and only retries the user IDs not found
+        whose backoff has passed, as most of them belong to deleted accounts.
+        """
+        fetcher = BrowserFetcher() if browser else ProfileFetcher(workers, rate)
+        index = IdStateIndex(self.fn + ID_INDEX_SUFFIX, 'user_id')
+        offsets = OffsetIndex(self.fn + OFFSET_INDEX_SUFFIX, 'user_id')
+        try:
+            # Keep the profiles of an interrupted sharded download
+            self.merge_shards()
+            # Scrape user profiles
+            if update:
+                # Calculate next user id, reading the profiles appended since the last update only
+                index.sync(self.fn)
+                next_user_id = index.max_present() + 1
+                print('Starting with user ID {next_user_id}'.format(next_user_id=next_user_id))
+            else:
+                index.clear()
+                offsets.clear()
+                open(self.fn, 'w').close()
+                next_user_id = 1
             # Proceed with next user id
+            if shards > 1 and not browser:
+                self.download_profiles_sharded(shards, workers, rate, next_user_id, index)
+            else:
+                with open(self.fn, 'a', encoding='utf-8') as jsonlines_file:
+                    self.download_profiles(jsonlines_file, fetcher, next_user_id, index)
+            # Try to download the missing user ids again whose backoff has passed. This should add missing profiles.
+            index.sync(self.fn)
+            missing_user_ids = index.due_ids()
+            print('Found {len} missing user IDs due for a retry; trying to re-fetch them...'.format(
+                len=len(missing_user_ids)))
             with open(self.fn, 'a', encoding='utf-8') as jsonlines_file:
-                self.download_profiles(jsonlines_file, wd, next_user_id)
-        else:
-            with open(self.fn, 'w', encoding='utf-8') as jsonlines_file:
-                self.download_profiles(jsonlines_file, wd, 1)
-        # Calculate missing user ids and try to download them again. This should add missing profiles.
-        with open(self.fn, 'r', encoding='utf-8') as jsonlines_file:
-            max_user_id = self.get_max_user_id(jsonlines_file)
-        with open(self.fn, 'r', encoding='utf-8') as jsonlines_file:
-            missing_user_ids = self.get_missing_user_ids(jsonlines_file, max_user_id)
-        print('Found {len} missing user IDs; trying to re-fetch them...'.format(len=len(missing_user_ids)))
-        with open(self.fn, 'a', encoding='utf-8') as jsonlines_file:
-            self.download_missing_profiles(jsonlines_file, wd, missing_user_ids)
-        # Clean up
-        wd.quit()
-        os.remove('geckodriver.log')
+                self.download_missing_profiles(jsonlines_file, fetcher, missing_user_ids, index)
+            index.sync(self.fn)
+        finally:
+            index.save()
+            # Index the profiles appended, also those of an interrupted download
+            offsets.sync(self.fn)
+            offsets.save()
+            # Clean up
+            fetcher.close()
+
+    def ingest(self, archive: str, posts_fn: str, processes: int = 1):
+        """
+        Parse the saved profile and topic pages of an archive, a directory or a tarball, in a pool of processes: write
+        the profiles into the raw data like downloaded ones, and the posts with addresses into a JSON lines file of
+        their own. Batches of pages are only read as the processes are ready for them, so that the memory used does not
+        grow with the size of the archive.
+        """
+        pages = archive_files(archive)
+        counts = {'profile': 0, 'post': 0}
+        tmp_fn, tmp_posts_fn = ['{fn}.{pid}.tmp'.format(fn=fn, pid=os.getpid()) for fn in (self.fn, posts_fn)]
+        try:
+            with ProcessPoolExecutor(processes) as executor, \
+                    open(tmp_fn, 'w', encoding='utf-8') as jsonlines_file, \
+                    open(tmp_posts_fn, 'w', encoding='utf-8') as posts_file:
+                out_files = {'profile': jsonlines_file, 'post': posts_file}
+
+                def write(records: List[Tuple[str, dict]]):
+                    for kind, record in records:
+                        print(json.dumps(record, ensure_ascii=False), file=out_files[kind])
+                        counts[kind] += 1
+
+                pending = deque()
+                for batch in iter(lambda: list(itertools.islice(pages, INGEST_BATCH_SIZE)), []):
+                    pending.append(executor.submit(ingest_pages, batch))
+                    if len(pending) >= INGEST_BATCHES_AHEAD * processes:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+        except BaseException:
+            for fn in (tmp_fn, tmp_posts_fn):
+                if os.path.exists(fn):
+                    os.remove(fn)
+            raise
+        os.replace(tmp_fn, self.fn)
+        os.replace(tmp_posts_fn, posts_fn)
+        print('Found {profiles} profiles and {posts} posts with addresses'.format(profiles=counts['profile'],
+                                                                                  posts=counts['post']))
 
     def read(self) -> List[dict]:
         with open(self.fn, 'r', encoding='utf-8') as jsonlines_file:
             return [json.loads(line) for line in jsonlines_file]
 
+    def offset_index(self) -> OffsetIndex:
+        """
+        Return the OffsetIndex of the profiles, loaded on first use, after indexing those appended since it was saved.
+        """
+        if self.offsets is None:
+            self.offsets = OffsetIndex(self.fn + OFFSET_INDEX_SUFFIX, 'user_id')
+        synced_size = self.offsets.synced_size
+        self.offsets.sync(self.fn)
+        if self.offsets.synced_size != synced_size:
+            self.offsets.save()
+        return self.offsets
+
+    def read_profiles(self, first_user_id: int, last_user_id: Optional[int] = None) -> Iterator[dict]:
+        """
+        Read the latest profile of each user ID from `first_user_id` to `last_user_id`, by default `first_user_id`
+        alone, without reading the rest of the raw data.
+        """
+        return self.offset_index().read(self.fn, first_user_id, last_user_id)
+
+    def deduplicate(self) -> int:
+        """
+        Rewrite the raw data with the latest profile of each user ID only, in the order of the user IDs, and return the
+        number of profiles dropped. The indexes next to the raw data are kept, as the same user IDs have a profile.
+        """
+        offsets = self.offset_index()
+        duplicate_count = offsets.duplicate_count
+        if not duplicate_count:
+            return 0
+        index = IdStateIndex(self.fn + ID_INDEX_SUFFIX, 'user_id')
+        index.sync(self.fn)
+        tmp_fn = '{fn}.{pid}.tmp'.format(fn=self.fn, pid=os.getpid())
+        offsets.write_deduplicated(self.fn, tmp_fn)
+        os.replace(tmp_fn, self.fn)
+        index.synced_size = os.path.getsize(self.fn)
+        index.save()
+        offsets.clear()
+        offsets.sync(self.fn)
+        offsets.save()
+        return duplicate_count
+
+
+class CrawlCoordinator(Coordinator):
+    """
+    Coordinate a download of the profiles of new users by workers on several hosts: lease them ranges of user IDs, take
+    the profiles they upload, and append them to the raw data in the order of the user IDs, as the ranges from the start
+    of the download are done.
+
+    The state of the download is kept in the queue, and the raw data is only appended to together with a commit of the
+    queue recording its size, so that the coordinator can be restarted without losing or repeating a range. Like
+    download_profiles, the download stops after END_GAP user IDs without profile following the last profile found.
+    """
+
+    def __init__(self, raw_data: RawData, queue: WorkQueue):
+        super().__init__(queue)
+        self.raw_data = raw_data
+        self.index = IdStateIndex(raw_data.fn + ID_INDEX_SUFFIX, 'user_id')
+        open(raw_data.fn, 'a').close()
+        raw_size = queue.get_meta('raw_size')
+        if raw_size is None:
+            # A new download, starting right after the largest user ID found
+            self.index.sync(raw_data.fn)
+            next_user_id = self.index.max_present() + 1
+            with queue.transaction():
+                for key in ('next_user_id', 'merged_user_id', 'last_valid_user_id'):
+                    queue.set_meta(key, next_user_id)
+                queue.set_meta('raw_size', os.path.getsize(raw_data.fn))
+        elif os.path.getsize(raw_data.fn) > raw_size:
+            # Profiles of a range whose merge was interrupted before it was committed, which is merged again
+            with open(raw_data.fn, 'r+b') as jsonlines_file:
+                jsonlines_file.truncate(raw_size)
+        self.index.sync(raw_data.fn)
+
+    def ended(self) -> bool:
+        return self.queue.get_meta('merged_user_id') - self.queue.get_meta('last_valid_user_id') >= END_GAP
+
+    def add_range(self) -> bool:
+        if self.ended():
+            return False
+        first_user_id = self.queue.get_meta('next_user_id')
+        with self.queue.transaction():
+            self.queue.add_range(first_user_id, first_user_id + SHARD_RANGE_SIZE - 1)
+            self.queue.set_meta('next_user_id', first_user_id + SHARD_RANGE_SIZE)
+        return True
+
+    def merge(self):
+        """
+        Append the profiles of the done ranges following the profiles appended before to the raw data.
+        """
+        last_valid_user_id = self.queue.get_meta('last_valid_user_id')
+        for first_user_id, last_user_id, result in self.queue.done_ranges(self.queue.get_meta('merged_user_id')):
+            with open(self.raw_data.fn, 'a', encoding='utf-8') as jsonlines_file:
+                for profile in sorted(result['profiles'], key=lambda profile: profile['user_id']):
+                    print(json.dumps(profile, ensure_ascii=False), file=jsonlines_file)
+                    last_valid_user_id = max(last_valid_user_id, profile['user_id'])
+            for user_id in result['absent']:
+                self.index.mark_absent(user_id)
+            with self.queue.transaction():
+                self.queue.remove(first_user_id)
+                self.queue.set_meta('merged_user_id', last_user_id + 1)
+                self.queue.set_meta('last_valid_user_id', last_valid_user_id)
+                self.queue.set_meta('raw_size', os.path.getsize(self.raw_data.fn))
+
+    def finish(self):
+        self.index.sync(self.raw_data.fn)
+        self.index.save()
+        self.raw_data.offset_index()
+
+
+class ProfileWorker(QueueWorker):
+    """
+    Download the ranges of user IDs leased from a CrawlCoordinator, and upload the profiles found and the user IDs
+    without profile.
+    """
+
+    def __init__(self, coordinator_url: str, fetcher: Union[ProfileFetcher, BrowserFetcher]):
+        super().__init__(coordinator_url)
+        self.fetcher = fetcher
+
+    def crawl_range(self, first_id: int, last_id: int, held: threading.Event) -> dict:
+        profiles, absent_user_ids = [], []
+        for user_id, profile in self.fetcher.profiles(range(first_id, last_id + 1)):
+            if not held.is_set():
+                break
+            if profile is not None:
+                profiles.append(profile)
+            else:
+                absent_user_ids.append(user_id)
+        return {'profiles': profiles, 'absent': absent_user_ids}
+
+    def close(self):
+        self.fetcher.close()
+        super().close()
+
+
+def extract_addresses(scanner: AddressScanner, row: dict) -> Optional[Tuple[str, List[Tuple[str, str]]]]:
+    """
+    Return the name of the user and the addresses and currencies found in the profile, or None if there are none.
+    """
+    user_addresses = scanner.extract(row.values())
+    return (row['name'], list(user_addresses.items())) if user_addresses else None
+
 
 class TagPackGenerator:
     """
     Generate a TagPack from BitcoinTalk users data.
     """
 
-    def __init__(self, rows: List[dict], title: str, creator: str, description: str, lastmod: date, source: str):
+    def __init__(self, rows: Optional[List[dict]], title: str, creator: str, description: str, lastmod: date,
+                 source: str, raw_fn: Optional[str] = None, processes: int = 1, posts_fn: Optional[str] = None):
+        """
+        Without rows, the addresses are extracted from the raw data file `raw_fn` incrementally, i.e. only from the
+        profiles appended to it since the last TagPack, keeping those extracted before in a file next to it. Many
+        appended profiles are extracted by `processes` worker processes, each from its own part of the file.
+
+        The posts with addresses of an ingested archive in `posts_fn` are tagged after the profiles.
+        """
         self.rows = rows
+        self.raw_fn = raw_fn
+        self.processes = processes
+        self.posts_fn = posts_fn
         self.data = {
             'title': title,
             'creator': creator,
             'description': description,
             'lastmod': lastmod,
-            'category': 'user',  # like in the OFAC TagPack generator
-            'tags': []
+            'category': 'user'  # like in the OFAC TagPack generator
         }
         self.source = source
 
-    def generate(self):
-        tags = []
+    def user_addresses(self) -> Iterable[Tuple[int, Tuple[str, List[Tuple[str, str]]]]]:
+        scanner = AddressScanner(REGEX)
+        if self.rows is None:
+            signature = json.dumps([(currency, regex.pattern) for currency, regex in REGEX])
+            extraction = IncrementalExtraction(self.raw_fn + ADDRESSES_SUFFIX, signature, 'user_id')
+            yield from extraction.update(self.raw_fn, partial(extract_addresses, scanner), self.processes)
+            return
         for row in self.rows:
-            user_addresses = {}
-            for key, value in row.items():
-                if type(value) != str:
-                    continue
-                for currency, address_pattern in REGEX:
-                    for match in address_pattern.finditer(value):
-                        address = match.group(0)
-                        if address not in user_addresses:
-                            user_addresses[address] = currency
-            #if user_addresses:
-            #    print(row['user_id'], user_addresses)
-            for address, currency in user_addresses.items():
+            user_addresses = extract_addresses(scanner, row)
+            if user_addresses:
+                yield row['user_id'], user_addresses
+
+    def generate(self) -> Iterator[dict]:
+        for user_id, (name, user_addresses) in self.user_addresses():
+            for address, currency in user_addresses:
                 tag = {
                     'address': address,
                     'currency': currency,
-                    'label': 'User {name} at BitcoinTalk forum'.format(name=row['name']),
-                    'source': BITCOINTALK_PROFILE_URL.format(user_id=row['user_id'])
+                    'label': 'User {name} at BitcoinTalk forum'.format(name=name),
+                    'source': BITCOINTALK_PROFILE_URL.format(user_id=user_id)
                 }
-                tags.append(tag)
-        self.data['tags'] = tags
+                yield tag
+        if self.posts_fn is None:
+            return
+        with open(self.posts_fn, 'r', encoding='utf-8') as posts_file:
+            for line in posts_file:
+                post = json.loads(line)
+                label = 'User {name} at BitcoinTalk forum'.format(name=post['name']) if post['name'] else \
+                    'Post at BitcoinTalk forum'
+                for address, currency in post['addresses']:
+                    yield {'address': address, 'currency': currency, 'label': label, 'source': post['url']}
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance)
 
 
 if __name__ == '__main__':
     with open('config.yaml', 'r') as config_file:
         config = yaml.safe_load(config_file)
 
+    parser = argparse.ArgumentParser(description='Convert BitcoinTalk users data to a TagPack.')
+    parser.add_argument('mode', nargs='?', choices=['update', 'lookup', 'dedup', 'serve', 'work', 'ingest'],
+                        help='update: download the profiles of new users, and those missing, before converting; '
+                             'lookup: print the profiles of the given user IDs; '
+                             'dedup: drop the profiles downloaded again from the raw data; '
+                             'serve: coordinate the download of the profiles of new users by workers, before '
+                             'converting; work: download profiles for the coordinator; '
+                             'ingest: convert the saved profile and topic pages of an archive')
+    parser.add_argument('user_ids', nargs='*', help='with lookup, user IDs or ranges of user IDs like 100-200')
+    parser.add_argument('--browser', action='store_true', help='download the profiles with Firefox, one by one')
+    parser.add_argument('--workers', type=int, default=FETCH_WORKERS,
+                        help='profiles downloaded at the same time (default %(default)s)')
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND,
+                        help='requests per second to the forum, over all workers (default %(default)s)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='processes extracting the addresses of many new profiles, or parsing the pages of an '
+                             'archive (default %(default)s)')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='processes downloading the profiles of new users, each with its own workers, sharing the '
+                             'requests per second (default %(default)s)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='with serve, the address the coordinator listens on (default %(default)s)')
+    parser.add_argument('--port', type=int, default=COORDINATOR_PORT,
+                        help='with serve, the port the coordinator listens on (default %(default)s)')
+    parser.add_argument('--coordinator', default='http://127.0.0.1:{port}/'.format(port=COORDINATOR_PORT),
+                        help='with work, the URL of the coordinator (default %(default)s)')
+    parser.add_argument('--archive', help='with ingest, the directory or tarball of saved pages')
+    args = parser.parse_args()
+    if args.mode == 'ingest' and not args.archive:
+        parser.error('ingest needs the --archive of saved pages')
+    if args.browser and args.shards > 1:
+        parser.error('the browser downloads the profiles one by one, without shards')
+
     raw_data = RawData(config['RAW_FILE_NAME'], config['URL'])
-    update_raw_data = len(sys.argv) >= 2 and sys.argv[1] == 'update'
+    if args.mode == 'lookup':
+        for user_ids in args.user_ids:
+            first_user_id, _, last_user_id = user_ids.partition('-')
+            for profile in raw_data.read_profiles(int(first_user_id), int(last_user_id or first_user_id)):
+                print(json.dumps(profile, ensure_ascii=False))
+        sys.exit()
+    if args.mode == 'dedup':
+        print('Dropped {count} profiles downloaded again'.format(count=raw_data.deduplicate()))
+        sys.exit()
+    if args.mode == 'work':
+        worker = ProfileWorker(args.coordinator, BrowserFetcher() if args.browser else ProfileFetcher(args.workers,
+                                                                                                     args.rate))
+        try:
+            worker.run()
+        finally:
+            worker.close()
+        sys.exit()
+    if args.mode == 'ingest':
+        archive_data = RawData(config['ARCHIVE_PROFILES_FILE_NAME'], config['URL'])
+        archive_data.ingest(args.archive, config['ARCHIVE_POSTS_FILE_NAME'], args.processes)
+        last_mod = datetime.fromtimestamp(os.path.getmtime(args.archive)).date()
+        generator = TagPackGenerator(None, config['TITLE'], config['CREATOR'], config['DESCRIPTION'], last_mod,
+                                     config['SOURCE'], config['ARCHIVE_PROFILES_FILE_NAME'], args.processes,
+                                     config['ARCHIVE_POSTS_FILE_NAME'])
+        generator.saveYaml(config['ARCHIVE_TAGPACK_FILE_NAME'], **output_options(config))
+        sys.exit()
+    if args.mode == 'serve':
+        CrawlCoordinator(raw_data, WorkQueue(config['RAW_FILE_NAME'] + QUEUE_SUFFIX)).serve(args.host, args.port)
+
+    update_raw_data = args.mode == 'update'
     if not os.path.exists(config['RAW_FILE_NAME']) or update_raw_data:
-        raw_data.download(update_raw_data)
+        raw_data.download(update_raw_data, args.browser, args.workers, args.rate, args.shards)
 
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
-    generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
-                                 last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+    generator = TagPackGenerator(None, config['TITLE'], config['CREATOR'], config['DESCRIPTION'], last_mod,
+                                 config['SOURCE'], config['RAW_FILE_NAME'], args.processes)
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
@@ -4,12 +4,14 @@ Convert CoinPayU data to a TagPack.
 """
 import logging
 import os
+import sys
 import re
 import json
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timezone
 from queue import Queue
 from time import sleep
+from typing import Iterable, Iterator
 
 import yaml
 from selenium import webdriver
@@ -19,6 +21,9 @@ from selenium.webdriver.support.select import Select
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.export import output_options, save_tagpack_as
+
 
 RE_DATE_BLOCKCHAIR = re.compile(r'date: (\d\d\d\d-\d\d-\d\d)')
 RE_DATE_ETHERSCAN = re.compile(r'\(([^)]+)\)')
@@ -242,25 +247,21 @@ class TagPackGenerator:
             'source': source,
             'category': 'faucet',
             'confidence': 'web_crawl',
-            'lastmod': lastmod,
-            'tags': []
+            'lastmod': lastmod
         }
         self.source = source
 
-    def generate(self):
-        tags = []
+    def generate(self) -> Iterator[dict]:
         for row in self.rows:
             tag = {
                 'address': row['address'],
                 'currency': row['currency'],
                 'lastmod': datetime.fromisoformat(row['date']).date()
             }
-            tags.append(tag)
-        self.data['tags'] = tags
+            yield tag
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False, allow_unicode=True))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance, allow_unicode=True)
 
 
 if __name__ == '__main__':
@@ -275,5 +276,4 @@ if __name__ == '__main__':
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
                                  last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
@@ -2,19 +2,14 @@
 # -*- coding:utf-8 -*- 
 
 import os
-import re
+import sys
 import yaml
-import requests
 
-# Taken from OFAC Specially Designated Nationals generator and modified
-REGEX = [
-    ('BTC', re.compile(r'\b((bc(0([ac-hj-np-z02-9]{39}|[ac-hj-np-z02-9]{59})|1[ac-hj-np-z02-9]{8,87}))|[13][a-km-zA-HJ-NP-Z1-9]{25,34})\b')),
-    ('BCH', re.compile(r'\b(((?:bitcoincash|bchtest):)?([13][0-9a-zA-Z]{33}))|(((?:bitcoincash|bchtest):)?(qp)?[0-9a-zA-Z]{40})\b')),
-    ('LTC', re.compile(r'\b([LM3][a-km-zA-HJ-NP-Z1-9]{25,33})\b')),
-    ('ZEC', re.compile(r'\b([tz][13][a-km-zA-HJ-NP-Z1-9]{33})\b')),
-    ('ETH', re.compile(r'\b((0x)?[0-9a-fA-F]{40})\b')),
-    ('USDT', re.compile(r'\bT[A-Za-z1-9]{33}\b'))
-]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.batch import classify_addresses
+from tagpack_converters.download import download_file
+from tagpack_converters.export import output_options, save_tagpack_as
+from tagpack_converters.yaml_cache import load_yaml_cached
 
 
 class RawData:
@@ -25,14 +20,10 @@ class RawData:
             self.downloadYaml()
 
     def downloadYaml(self):
-        res = requests.get(self.url)
-        with open(self.fileName, "w") as fout:
-            fout.write(res.text)
+        download_file(self.url, self.fileName)
 
     def returnYaml(self):
-        with open(self.fileName, "r") as fin:
-            yamlData = yaml.safe_load(fin.read())
-        return yamlData
+        return load_yaml_cached(self.fileName)
 
 
 class Tag:
@@ -59,13 +50,9 @@ class TagPack:
         self.data["creator"]     = creator
         self.data["description"] = description
         self.data["lastmod"]     = lastmod
-        self.data["tags"]        = []
 
-    def addTag(self, tag):
-        self.data["tags"] += [tag.getTagData()]
-
-    def dumpYaml(self):
-        return yaml.dump(self.data, sort_keys=False)
+    def saveYaml(self, fileName, tags, formats=("yaml",), shards=1, balance="count"):
+        save_tagpack_as(fileName, self.data, (tag.getTagData() for tag in tags), formats, shards, balance)
 
 
 class TagPackGenerator:
@@ -75,6 +62,7 @@ class TagPackGenerator:
         self.checkList = ["addresses", "coin", "name", "reporter", "category"]
 
     def generate(self):
+        valid_data = []
         for datum in self.rawYaml:
             invalid = False
             for check in self.checkList:
@@ -83,24 +71,24 @@ class TagPackGenerator:
                     break
             if invalid:
                 continue
+            valid_data.append(datum)
+        coins = iter(classify_addresses([address for datum in valid_data for address in datum["addresses"]]))
+        for datum in valid_data:
             for address in datum["addresses"]:
-                for coin, address_format in REGEX:
-                    if address_format.fullmatch(address):
-                        datum["coin"] = coin
-                        break
-                else:
+                coin = next(coins)
+                if not coin:
                     print('Unknown address format: ' + address)
                     continue
+                datum["coin"] = coin
                 tag = Tag(address,
                           datum["coin"],
                           datum["name"],
                           datum["reporter"], 
                           datum["category"])
-                self.tagPack.addTag(tag)
+                yield tag
 
-    def saveYaml(self, fileName):
-        with open(fileName, "w") as fout:
-            fout.write(self.tagPack.dumpYaml())
+    def saveYaml(self, fileName, formats=("yaml",), shards=1, balance="count"):
+        self.tagPack.saveYaml(fileName, self.generate(), formats, shards, balance)
 
 
 if __name__ == "__main__":
@@ -111,5 +99,4 @@ if __name__ == "__main__":
     rawYaml = rawData.returnYaml()
 
     tagPackGenerator = TagPackGenerator(rawYaml, config["TITLE"], config["CREATOR"], config["DESCRIPTION"], config["LASTMOD"])
-    tagPackGenerator.generate()
-    tagPackGenerator.saveYaml(config["TAGPACK_FILE_NAME"])
+    tagPackGenerator.saveYaml(config["TAGPACK_FILE_NAME"], **output_options(config))
@@ -3,127 +3,144 @@
 Convert GlassChain data to a TagPack.
 """
 import os
+import sys
 import re
 import json
+import asyncio
 import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
 from urllib.parse import urljoin
+from typing import Iterable, List, Optional, Tuple
 
 import yaml
 from bs4 import BeautifulSoup
-from requests import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.crawl import MAX_CONNECTIONS, MAX_CONNECTIONS_PER_HOST, Crawler
+from tagpack_converters.export import save_tagpack_as
 
 BTC_REGEX = re.compile(r'\b((bc(0([ac-hj-np-z02-9]{39}|[ac-hj-np-z02-9]{59})|1[ac-hj-np-z02-9]{8,87}))|[13][a-km-zA-HJ-NP-Z1-9]{25,34})\b')
+GLASSCHAIN_URL = 'https://glasschain.org/'
+NOT_FOUND_URL = 'https://glasschain.org/404'
+ADDRESSES_URL = 'https://glasschain.org/views/wallet/Addresses.cfm?ref={wallet_id}&page={index}&paging={paging}'
+WALLET_KPI_URL = 'https://api.glasschain.io/taffy/api/index.cfm?endpoint=/wallet/getWalletKPI&walletid={wallet_id}'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0'
+
 
+def parse_providers(html: str) -> List[Tuple[str, str, str]]:
+    """
+    Return the name, category and link of each provider of the providers page having wallets.
+    """
+    providers = []
+    table = BeautifulSoup(html, features='html.parser').select_one('main table')
+    for row in table.find_all('tr'):
+        cells = row.find_all('td')
+        wallet_count = int(cells[2].find('span').text)
+        link_element = cells[0].find('a')
+        provider_name = link_element.text
+        if wallet_count == 0:
+            logging.debug('Skipping provider {name}'.format(name=provider_name))
+            continue
+        providers.append((provider_name, cells[1].text, link_element.get('href')))
+    return providers
 
-class LiveServerSession(Session):  # From https://stackoverflow.com/a/51026159
-    def __init__(self, base_url=None):
-        super().__init__()
-        self.base_url = base_url
 
-    def request(self, method, url, *args, **kwargs):
-        joined_url = urljoin(self.base_url, url)
-        return super().request(method, joined_url, *args, **kwargs)
+def parse_wallets(html: str) -> List[dict]:
+    """
+    Return the wallets of a provider page, without their addresses yet.
+    """
+    wallets = []
+    table = BeautifulSoup(html, features='html.parser').select_one('main table')
+    for row in table.find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) == 0:  # Header row
+            continue
+        if len(cells) == 1 and cells[0].text == 'No Wallets identified yet':  # Empty row
+            continue
+        wallet_lastmod, wallet_creator = tuple(cells[1].find('label').text.split(' by '))
+        wallets.append({
+            'source': cells[0].find('a').get('href'),
+            'label': cells[1].find('b').text,
+            'lastmod': wallet_lastmod,
+            'creator': wallet_creator,
+            'addresses': []
+        })
+    return wallets
 
 
-def get_data(s: Session, url: str):
-    for retry in range(20):
-        try:
-            return s.get(url, timeout=60.0)
-        except:
-            logging.debug('Retry {retry}'.format(retry=retry+1))
+def parse_addresses(html: str) -> List[str]:
+    addresses = []
+    for address_link in BeautifulSoup(html, 'html.parser').find_all('a'):
+        address = address_link.text
+        if not BTC_REGEX.match(address):
+            logging.warning('Address {address} has wrong format'.format(address=address))
             continue
-    else:
-        raise SystemExit('Too many retries')
+        addresses.append(address)
+    return addresses
 
 
 class RawData:
     """
     Download and read data provided by the source.
+
+    The providers, their wallets and the addresses of the wallets are crawled concurrently, but kept in the order of
+    the pages listing them, so that the raw data does not depend on the order the responses arrive in.
     """
-    def __init__(self, fn: str, url: str):
+    def __init__(self, fn: str, url: str, max_connections: int = MAX_CONNECTIONS,
+                 max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST):
         self.fn = fn
         self.url = url
         self.data = {}
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
 
     @staticmethod
-    def download_wallet(s: Session, link: str, addresses: list):
+    async def download_wallet(crawler: Crawler, link: str, addresses: list):
         wallet_id = link.split('/')[-1]
         # Get count of addresses
-        wallet_data_url = 'https://api.glasschain.io/taffy/api/index.cfm?endpoint=/wallet/getWalletKPI&walletid={wallet_id}'.format(wallet_id=wallet_id)
-        response = get_data(s, wallet_data_url)
+        response = await crawler.get(WALLET_KPI_URL.format(wallet_id=wallet_id))
         addresses_count = json.loads(response.text)['data'][0]['DSP_INT_WALLET_ADDRESSES']
         # Get addresses from paginated table
         page_index = 0
         while len(addresses) < addresses_count:
             logging.debug('Fetch page {index} having {count} addresses of {max}'.format(index=page_index, count=len(addresses), max=addresses_count))
-            addr_url = 'https://glasschain.org/views/wallet/Addresses.cfm?ref={wallet_id}&page={index}&paging=100000'.format(wallet_id=wallet_id, index=page_index)
-            response = get_data(s, addr_url)
-            for address_link in BeautifulSoup(response.text, 'html.parser').find_all('a'):
-                address = address_link.text
-                if not BTC_REGEX.match(address):
-                    logging.warning('Address {address} has wrong format')
-                    continue
-                addresses.append(address)
+            response = await crawler.get(ADDRESSES_URL.format(wallet_id=wallet_id, index=page_index, paging=100000))
+            addresses.extend(await crawler.parse(parse_addresses, response.text))
             page_index += 1
 
-    def download_provider(self, s: Session, link: str, wallets: list):
-        response = get_data(s, link)
-        if response.url == 'https://glasschain.org/404':
+    async def download_provider(self, crawler: Crawler, link: str, wallets: list):
+        response = await crawler.get(link)
+        if response.url == NOT_FOUND_URL:
             logging.warning('Provider not found!')
             return
-        page = BeautifulSoup(response.text, features='html.parser')
-        table = page.select_one('main table')
-        for row in table.find_all('tr'):
-            cells = row.find_all('td')
-            if len(cells) == 0:  # Header row
-                continue
-            if len(cells) == 1 and cells[0].text == 'No Wallets identified yet':  # Empty row
-                continue
-            wallet_link = cells[0].find('a').get('href')
-            wallet_label = cells[1].find('b').text
-            wallet_lastmod, wallet_creator = tuple(cells[1].find('label').text.split(' by '))
-            wallet = {
-                'source': wallet_link,
-                'label': wallet_label,
-                'lastmod': wallet_lastmod,
-                'creator': wallet_creator,
-                'addresses': []
-            }
-            wallets.append(wallet)
-            logging.info('Downloading wallet {label}'.format(label=wallet_label))
-            self.download_wallet(s, wallet_link, wallet['addresses'])
-
-    def download_providers(self, s: Session, data: dict):
-        response = get_data(s, self.url)
-        page = BeautifulSoup(response.text, features='html.parser')
-        table = page.select_one('main table')
-        for row in table.find_all('tr'):
-            cells = row.find_all('td')
-            wallet_count = int(cells[2].find('span').text)
-            link_element = cells[0].find('a')
-            provider_name = link_element.text
-            if wallet_count == 0:
-                logging.debug('Skipping provider {name}'.format(name=provider_name))
-                continue
-            provider_link = link_element.get('href')
-            provider_category = cells[1].text
+        wallets.extend(await crawler.parse(parse_wallets, response.text))
+        for wallet in wallets:
+            logging.info('Downloading wallet {label}'.format(label=wallet['label']))
+        await asyncio.gather(*(self.download_wallet(crawler, wallet['source'], wallet['addresses'])
+                               for wallet in wallets))
+
+    async def download_providers(self, crawler: Crawler, data: dict):
+        response = await crawler.get(self.url)
+        providers = await crawler.parse(parse_providers, response.text)
+        tasks = []
+        for provider_name, provider_category, provider_link in providers:
             # Create provider entry and fill it with content
-            provider = {
+            data[provider_name] = {
                 'category': provider_category,
                 'wallets': []
             }
             logging.info('Downloading provider {name}'.format(name=provider_name))
-            self.download_provider(s, provider_link, provider['wallets'])
-            data[provider_name] = provider
+            tasks.append(self.download_provider(crawler, provider_link, data[provider_name]['wallets']))
+        await asyncio.gather(*tasks)
 
-    def download(self):
-        with LiveServerSession(self.url) as session:
-            session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0'
-            })
-            self.download_providers(session, self.data)
+    async def crawl(self):
+        async with Crawler(self.url, {'User-Agent': USER_AGENT}, self.max_connections,
+                           self.max_connections_per_host) as crawler:
+            await self.download_providers(crawler, self.data)
 
+    def download(self):
+        asyncio.run(self.crawl())
         with open(self.fn, 'w', encoding='utf-8') as json_file:
             json.dump(self.data, json_file, ensure_ascii=False, indent=4)
 
@@ -132,12 +149,22 @@ class RawData:
             return json.load(json_file)
 
 
+def save_wallet_tagpack(fn: str, header: dict, addresses: List[str], formats: Iterable[str]) -> Tuple[str, int]:
+    """
+    Write the TagPack of a wallet, in a worker process.
+    """
+    save_tagpack_as(fn, header, ({'address': address} for address in addresses), formats)
+    return fn, len(addresses)
+
+
 class TagPackGenerator:
     """
     Generate a TagPack from BitcoinTalk users data.
     """
 
-    def __init__(self, raw_data_: dict, title: str, creator: str, description: str, lastmod: str, source: str):
+    def __init__(self, raw_data_: dict, title: str, creator: str, description: str, lastmod: str, source: str,
+                 max_workers: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 formats: Iterable[str] = ('yaml',), out_dir: str = ''):
         self.raw_data = raw_data_
         self.data = {
             'title': title,
@@ -145,6 +172,11 @@ class TagPackGenerator:
             'description': description
         }
         self.source = source
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Wallets handed over to the workers but not yet written, whose addresses are held by the pool
+        self.max_in_flight = max_in_flight or 2 * self.max_workers
+        self.formats = list(formats)
+        self.out_dir = out_dir
 
     def generate(self):
 
@@ -188,13 +220,10 @@ class TagPackGenerator:
             raise ValueError('Creator of wallet {label} is not Glasschain, but {creator}'.format(label=l,
                                                                                                  creator=w['creator']))
 
-        providers_sorted_by_size = sorted(self.raw_data.keys(),
-                                          key=lambda name: sum(map(lambda wallet: len(wallet['addresses']),
-                                                                   self.raw_data[name]['wallets'])))
-        for provider_name in providers_sorted_by_size:
+        jobs = []
+        for provider_name, provider in self.raw_data.items():
             # Get provider
             logging.info('Process provider {name}'.format(name=provider_name))
-            provider = self.raw_data[provider_name]
             category = get_category_from_provider(provider)
             # Process wallets
             for wallet_index, wallet in enumerate(provider['wallets'], 1):
@@ -202,20 +231,34 @@ class TagPackGenerator:
                 logging.debug('Processing wallet {label}'.format(label=label))
                 get_creator_from_wallet(wallet, label)  # The call is needed to verify that creator is Glasschain only
                 get_currency_from_wallet(wallet)  # The call is needed to verify that currency is BTC only
-                self.data['currency'] = 'BTC'
-                self.data['label'] = label
-                self.data['lastmod'] = datetime.fromisoformat(wallet['lastmod']).date()
-                self.data['source'] = urljoin('https://glasschain.org/', wallet['source'])
-                self.data['category'] = category
-                self.data['tags'] = [{'address': address} for address in wallet['addresses']]
-                fn = 'glasschain_{name}_wallet_{index}_tagpack.yaml'.format(name=provider_name, index=wallet_index)
-                self.saveYaml(fn)
-           # Delete provider
-            del self.raw_data[provider_name]
-
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False))
+                header = dict(self.data,
+                              currency='BTC',
+                              label=label,
+                              lastmod=datetime.fromisoformat(wallet['lastmod']).date(),
+                              source=urljoin(GLASSCHAIN_URL, wallet['source']),
+                              category=category)
+                fn = os.path.join(self.out_dir, 'glasschain_{name}_wallet_{index}_tagpack.yaml'.format(
+                    name=provider_name, index=wallet_index))
+                jobs.append((fn, header, wallet['addresses']))
+        # The wallets are only referenced by the jobs from now on, and released once written
+        self.raw_data.clear()
+        # Largest wallets first, so that no large one is left to a single worker at the end
+        jobs.sort(key=lambda job: len(job[2]))
+        self.saveYaml(jobs)
+
+    def saveYaml(self, jobs: List[Tuple[str, dict, List[str]]]):
+        """
+        Write the TagPacks of the wallets in a pool of worker processes, taking the jobs from the end of the list.
+        """
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = set()
+            while jobs or in_flight:
+                while jobs and len(in_flight) < self.max_in_flight:
+                    in_flight.add(executor.submit(save_wallet_tagpack, *jobs.pop(), self.formats))
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    fn, tag_count = future.result()
+                    logging.info('Saved {count} tags to {fn}'.format(count=tag_count, fn=fn))
 
     def generateAndSave(self):
         self.generate()
@@ -233,5 +276,5 @@ if __name__ == '__main__':
 
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).isoformat()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
-                                 last_mod, config['SOURCE'])
+                                 last_mod, config['SOURCE'], formats=config.get('TAGPACK_FORMATS', ['yaml']))
     generator.generateAndSave()
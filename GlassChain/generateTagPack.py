@@ -3,119 +3,135 @@
 Convert GlassChain data to a TagPack.
 """
 import os
+import sys
 import re
 import json
+import asyncio
 import logging
 from datetime import datetime
 from urllib.parse import urljoin
+from typing import Iterable, Iterator, List, Tuple
 
 import yaml
 from bs4 import BeautifulSoup
-from requests import Session
 
-BTC_REGEX = re.compile(r'\b((bc(0([ac-hj-np-z02-9]{39}|[ac-hj-np-z02-9]{59})|1[ac-hj-np-z02-9]{8,87}))|[13][a-km-zA-HJ-NP-Z1-9]{25,34})\b')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.crawl import MAX_CONNECTIONS, MAX_CONNECTIONS_PER_HOST, Crawler
+from tagpack_converters.export import output_options, save_tagpack_as
 
+BTC_REGEX = re.compile(r'\b((bc(0([ac-hj-np-z02-9]{39}|[ac-hj-np-z02-9]{59})|1[ac-hj-np-z02-9]{8,87}))|[13][a-km-zA-HJ-NP-Z1-9]{25,34})\b')
+GLASSCHAIN_URL = 'https://glasschain.org/'
+NOT_FOUND_URL = 'https://glasschain.org/404'
+ADDRESSES_URL = 'https://glasschain.org/views/wallet/Addresses.cfm?ref={wallet_id}&page={index}&paging={paging}'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0'
 
-class LiveServerSession(Session):  # From https://stackoverflow.com/a/51026159
-    def __init__(self, base_url=None):
-        super().__init__()
-        self.base_url = base_url
 
-    def request(self, method, url, *args, **kwargs):
-        joined_url = urljoin(self.base_url, url)
-        return super().request(method, joined_url, *args, **kwargs)
+def parse_providers(html: str) -> List[Tuple[str, str, str]]:
+    """
+    Return the name, category and link of each provider of the providers page having wallets.
+    """
+    providers = []
+    table = BeautifulSoup(html, features='html.parser').select_one('main table')
+    for row in table.find_all('tr'):
+        cells = row.find_all('td')
+        wallet_count = int(cells[2].find('span').text)
+        link_element = cells[0].find('a')
+        provider_name = link_element.text
+        if wallet_count == 0:
+            logging.debug('Skipping provider {name}'.format(name=provider_name))
+            continue
+        providers.append((provider_name, cells[1].text, link_element.get('href')))
+    return providers
 
 
-def get_data(s: Session, url: str):
-    for retry in range(20):
-        try:
-            return s.get(url, timeout=60.0)
-        except:
-            logging.debug('Retry {retry}'.format(retry=retry+1))
+def parse_wallets(html: str) -> List[dict]:
+    """
+    Return the wallets of a provider page, without their addresses yet.
+    """
+    wallets = []
+    table = BeautifulSoup(html, features='html.parser').select_one('main table')
+    for row in table.find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) == 0:  # Header row
+            continue
+        if len(cells) == 1 and cells[0].text == 'No Wallets identified yet':  # Empty row
             continue
-    else:
-        raise SystemExit('Too many retries')
+        wallet_lastmod, wallet_creator = tuple(cells[1].find('label').text.split(' by '))
+        wallets.append({
+            'source': cells[0].find('a').get('href'),
+            'label': cells[1].find('b').text,
+            'lastmod': wallet_lastmod,
+            'creator': wallet_creator,
+            'addresses': []
+        })
+    return wallets
+
+
+def parse_addresses(html: str) -> List[str]:
+    addresses = []
+    for address_link in BeautifulSoup(html, 'html.parser').find_all('a'):
+        address = address_link.text
+        if not BTC_REGEX.match(address):
+            logging.warning('Address {address} has wrong format'.format(address=address))
+            continue
+        addresses.append(address)
+    return addresses
 
 
 class RawData:
     """
     Download and read data provided by the source.
+
+    The providers, their wallets and the addresses of the wallets are crawled concurrently, but kept in the order of
+    the pages listing them, so that the raw data does not depend on the order the responses arrive in.
     """
-    def __init__(self, fn: str, url: str):
+    def __init__(self, fn: str, url: str, max_connections: int = MAX_CONNECTIONS,
+                 max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST):
         self.fn = fn
         self.url = url
         self.data = {}
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
 
     @staticmethod
-    def download_wallet(s: Session, link: str, addresses: list):
+    async def download_wallet(crawler: Crawler, link: str, addresses: list):
         wallet_id = link.split('/')[-1]
         # Get addresses from paginated table
-        addr_url = 'https://glasschain.org/views/wallet/Addresses.cfm?ref={wallet_id}&page=0&paging=11'.format(wallet_id=wallet_id)
-        response = get_data(s, addr_url)
-        for address_link in BeautifulSoup(response.text, 'html.parser').find_all('a'):
-            address = address_link.text
-            if not BTC_REGEX.match(address):
-                logging.warning('Address {address} has wrong format')
-                continue
-            addresses.append(address)
-
-    def download_provider(self, s: Session, link: str, wallets: list):
-        response = get_data(s, link)
-        if response.url == 'https://glasschain.org/404':
+        response = await crawler.get(ADDRESSES_URL.format(wallet_id=wallet_id, index=0, paging=11))
+        addresses.extend(await crawler.parse(parse_addresses, response.text))
+
+    async def download_provider(self, crawler: Crawler, link: str, wallets: list):
+        response = await crawler.get(link)
+        if response.url == NOT_FOUND_URL:
             logging.warning('Provider not found!')
             return
-        page = BeautifulSoup(response.text, features='html.parser')
-        table = page.select_one('main table')
-        for row in table.find_all('tr'):
-            cells = row.find_all('td')
-            if len(cells) == 0:  # Header row
-                continue
-            if len(cells) == 1 and cells[0].text == 'No Wallets identified yet':  # Empty row
-                continue
-            wallet_link = cells[0].find('a').get('href')
-            wallet_label = cells[1].find('b').text
-            wallet_lastmod, wallet_creator = tuple(cells[1].find('label').text.split(' by '))
-            wallet = {
-                'source': wallet_link,
-                'label': wallet_label,
-                'lastmod': wallet_lastmod,
-                'creator': wallet_creator,
-                'addresses': []
-            }
-            wallets.append(wallet)
-            logging.info('Downloading wallet {label}'.format(label=wallet_label))
-            self.download_wallet(s, wallet_link, wallet['addresses'])
-
-    def download_providers(self, s: Session, data: dict):
-        response = get_data(s, self.url)
-        page = BeautifulSoup(response.text, features='html.parser')
-        table = page.select_one('main table')
-        for row in table.find_all('tr'):
-            cells = row.find_all('td')
-            wallet_count = int(cells[2].find('span').text)
-            link_element = cells[0].find('a')
-            provider_name = link_element.text
-            if wallet_count == 0:
-                logging.debug('Skipping provider {name}'.format(name=provider_name))
-                continue
-            provider_link = link_element.get('href')
-            provider_category = cells[1].text
+        wallets.extend(await crawler.parse(parse_wallets, response.text))
+        for wallet in wallets:
+            logging.info('Downloading wallet {label}'.format(label=wallet['label']))
+        await asyncio.gather(*(self.download_wallet(crawler, wallet['source'], wallet['addresses'])
+                               for wallet in wallets))
+
+    async def download_providers(self, crawler: Crawler, data: dict):
+        response = await crawler.get(self.url)
+        providers = await crawler.parse(parse_providers, response.text)
+        tasks = []
+        for provider_name, provider_category, provider_link in providers:
             # Create provider entry and fill it with content
-            provider = {
+            data[provider_name] = {
                 'category': provider_category,
                 'wallets': []
             }
             logging.info('Downloading provider {name}'.format(name=provider_name))
-            self.download_provider(s, provider_link, provider['wallets'])
-            data[provider_name] = provider
+            tasks.append(self.download_provider(crawler, provider_link, data[provider_name]['wallets']))
+        await asyncio.gather(*tasks)
 
-    def download(self):
-        with LiveServerSession(self.url) as session:
-            session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0'
-            })
-            self.download_providers(session, self.data)
+    async def crawl(self):
+        async with Crawler(self.url, {'User-Agent': USER_AGENT}, self.max_connections,
+                           self.max_connections_per_host) as crawler:
+            await self.download_providers(crawler, self.data)
 
+    def download(self):
+        asyncio.run(self.crawl())
         with open(self.fn, 'w', encoding='utf-8') as json_file:
             json.dump(self.data, json_file, ensure_ascii=False, indent=4)
 
@@ -135,14 +151,11 @@ class TagPackGenerator:
             'title': title,
             'creator': creator,
             'description': description,
-            'currency': 'BTC',
-            'tags': []
+            'currency': 'BTC'
         }
         self.source = source
 
-    def generate(self):
-        tags = []
-
+    def generate(self) -> Iterator[dict]:
         def get_category_from_provider(p: dict) -> str:
             category_map = {
                 'Advertising Networks': 'organization',
@@ -195,19 +208,17 @@ class TagPackGenerator:
                 get_creator_from_wallet(wallet, label)  # The call is needed to verify that creator is Glasschain only
                 get_currency_from_wallet(wallet)  # The call is needed to verify that currency is BTC only
                 for address in wallet['addresses']:
-                    tags.append({
+                    yield {
                         'address': address,
                         'is_cluster_definer': True,
                         'label': label,
                         'lastmod': last_mod.date(),
-                        'source': urljoin('https://glasschain.org/', wallet['source']),
+                        'source': urljoin(GLASSCHAIN_URL, wallet['source']),
                         'category': category
-                    })
-        self.data['tags'] = tags
+                    }
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance)
 
 
 if __name__ == '__main__':
@@ -223,5 +234,4 @@ if __name__ == '__main__':
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).isoformat()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
                                  last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
@@ -1,10 +1,21 @@
+import os
 import re
+import sys
 import json
-import yaml
 import datetime
 import requests
+from urllib.parse import urlparse
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.download import download_file
+from tagpack_converters.export import save_tagpack_as
 
 ALIASES = {"XBT": "BTC"}
+CHUNK_SIZE = 1024 * 1024
+DIGITAL_CURRENCY_ADDRESS = "Digital Currency Address - "
+# Elements of the SDN XML (sdn.xml) and the advanced sanctions XML (sdn_advanced.xml) holding digital currency addresses
+XML_ADDRESS_ELEMENTS = {"id", "FeatureType", "Feature"}
 
 REGEX = {"BTC": r"\b([13][a-km-zA-HJ-NP-Z1-9]{25,34})|bc(0([ac-hj-np-z02-9]{39}|[ac-hj-np-z02-9]{59})|1[ac-hj-np-z02-9]{8,87})\b",
          "BCH": r"\b(((?:bitcoincash|bchtest):)?([13][0-9a-zA-Z]{33}))|(((?:bitcoincash|bchtest):)?(qp)?[0-9a-zA-Z]{40})\b",
@@ -12,12 +23,13 @@ REGEX = {"BTC": r"\b([13][a-km-zA-HJ-NP-Z1-9]{25,34})|bc(0([ac-hj-np-z02-9]{39}|
          "ZEC": r"\b([tz][13][a-km-zA-HJ-NP-Z1-9]{33})\b",
          "ETH": r"\b((0x)?[0-9a-fA-F]{40})\b",
          "USDT": r"\bT[A-Za-z1-9]{33}\b"}
+REGEX = {assetCode: re.compile(pattern) for assetCode, pattern in REGEX.items()}
 
 
 class Convert:
     @staticmethod
-    def load_config():
-        with open("config.json", "r") as json_data_file:
+    def load_config(fileName="config.json"):
+        with open(fileName, "r") as json_data_file:
             config = json.load(json_data_file)
         return config
 
@@ -29,37 +41,109 @@ class Convert:
     @staticmethod
     def checkValidAddress(assetCode, address):
         try:
-            matched = re.match(REGEX[assetCode], address)
+            matched = REGEX[assetCode].match(address)
             if matched is None:
                 print("Is this a valid address?: %s (%s)" % (address, assetCode))
         except:
             print("Is this a valid address?: %s (%s)" % (address, assetCode))
 
     @staticmethod
-    def add_details(raw_data):
+    def split_entries(chunks):
+        """
+        Yield the ";"-separated entries of the text arriving in chunks, with line breaks turned into spaces.
+        """
+        rest = ""
+        for chunk in chunks:
+            entries = (rest + chunk.replace("\n", " ")).split(";")
+            rest = entries.pop()
+            yield from entries
+        yield rest
+
+    @staticmethod
+    def register_address(tags, registered_addresses, address, assetCode):
+        if address in registered_addresses:
+            return
+        registered_addresses.add(address)
+        for alias in ALIASES:
+            if assetCode == alias:
+                assetCode = ALIASES[assetCode]
+        Convert.checkValidAddress(assetCode, address)
+        tags += [Convert.add_tag(address, assetCode)]
+
+    @staticmethod
+    def add_details(chunks):
         tags = []
-        lines = raw_data.replace("\n", " ").split(";")
-        for line in lines:
+        registered_addresses = set()
+        for line in Convert.split_entries(chunks):
             if "Digital Currency Address" in line:
                 splitted = line.lstrip().replace("alt. ", "").split(" ")
                 (address, assetCode) = (splitted[5], splitted[4])
-                isAddressRegistered = False
-                for tag in tags:
-                    if address == tag["address"]:
-                        isAddressRegistered = True
-                        break
-                if isAddressRegistered:
-                    continue
-                for alias in ALIASES:
-                    if assetCode == alias:
-                        assetCode = ALIASES[assetCode]
-                Convert.checkValidAddress(assetCode, address)
-                tags += [Convert.add_tag(address, assetCode)]
+                Convert.register_address(tags, registered_addresses, address, assetCode)
         return tags
 
     @staticmethod
-    def add_tags():
-        config = Convert.load_config()
+    def local_name(element):
+        return element.tag.rpartition("}")[2]
+
+    @staticmethod
+    def add_details_xml(source):
+        """
+        Read the SDN XML or the advanced sanctions XML incrementally from a file object.
+
+        In sdn.xml, addresses are "id" elements typed by their "idType". In sdn_advanced.xml, they are "Feature"
+        elements whose FeatureTypeID refers to a "FeatureType" listed before the parties. Every element is dropped
+        from the tree once parsed, unless it is part of such an element, so the tree only ever holds the current path.
+        """
+        tags = []
+        registered_addresses = set()
+        featureTypes = {}
+        parents = []
+        keep = 0
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            name = Convert.local_name(element)
+            if event == "start":
+                parents.append(element)
+                if name in XML_ADDRESS_ELEMENTS:
+                    keep += 1
+                continue
+            parents.pop()
+            if name in XML_ADDRESS_ELEMENTS:
+                keep -= 1
+                if name == "FeatureType" and (element.text or "").startswith(DIGITAL_CURRENCY_ADDRESS):
+                    featureTypes[element.get("ID")] = element.text[len(DIGITAL_CURRENCY_ADDRESS):].strip()
+                elif name == "Feature" and element.get("FeatureTypeID") in featureTypes:
+                    for detail in element.iter():
+                        if Convert.local_name(detail) == "VersionDetail" and detail.text:
+                            Convert.register_address(tags, registered_addresses, detail.text.strip(),
+                                                     featureTypes[element.get("FeatureTypeID")])
+                elif name == "id":
+                    fields = {Convert.local_name(child): (child.text or "").strip() for child in element}
+                    if fields.get("idType", "").startswith(DIGITAL_CURRENCY_ADDRESS):
+                        Convert.register_address(tags, registered_addresses, fields.get("idNumber", ""),
+                                                 fields["idType"][len(DIGITAL_CURRENCY_ADDRESS):])
+            if keep == 0 and parents:
+                parents[-1].remove(element)
+        return tags
+
+    @staticmethod
+    def raw_file_name(config, configFileName="config.json"):
+        """
+        The file the SDN list is downloaded to, next to the configuration, named after the source unless configured.
+        """
+        fileName = config.get("raw_file_name", os.path.basename(urlparse(config["source"]).path))
+        return os.path.join(os.path.dirname(configFileName), fileName)
+
+    @staticmethod
+    def read_tags(fileName, source):
+        if source.lower().endswith(".xml"):
+            with open(fileName, "rb") as xml_file:
+                return Convert.add_details_xml(xml_file)
+        with open(fileName, "r", encoding="utf-8", errors="replace") as text_file:
+            return Convert.add_details(iter(lambda: text_file.read(CHUNK_SIZE), ""))
+
+    @staticmethod
+    def add_tags(configFileName="config.json", download=True):
+        config = Convert.load_config(configFileName)
         if "source" not in config or "label" not in config or "creator" not in config or "category" not in config or "title" not in config:
             print("config.json file needs to define a title, a source, a label, a category and a creator")
             return
@@ -73,17 +157,22 @@ class Convert:
             "category": config["category"],
             "source": config["source"]
         }
-        try:
-            with requests.get(config["source"]) as source:
-                raw_data = source.text
-                tags = Convert.add_details(raw_data)
-        except requests.exceptions.ConnectionError as exc:
-            print(exc)
-        data["tags"] = tags
+        fileName = Convert.raw_file_name(config, configFileName)
+        if download:
+            try:
+                download_file(config["source"], fileName)
+            except requests.exceptions.ConnectionError as exc:
+                print(exc)
+                if not os.path.exists(fileName):
+                    raise
+                print("Using the SDN list downloaded before: %s" % fileName)
+        data["tags"] = Convert.read_tags(fileName, config["source"])
         return data
 
 
 if __name__ == "__main__":
     out = Convert.add_tags()
-    with open("OFAC_tagpack.yaml", "w") as fout:
-        yaml.dump(out, fout, sort_keys=False)
+    if out is not None:
+        config = Convert.load_config()
+        save_tagpack_as("OFAC_tagpack.yaml", out, out["tags"], config.get("formats", ["yaml"]), config.get("shards", 1),
+                        config.get("shard_balance", "count"))
@@ -3,13 +3,14 @@
 Convert PipeFlare data to a TagPack.
 """
 import os
+import sys
 import re
 import json
 import logging
 from datetime import datetime, date
 from queue import Queue
 from threading import Thread
-from typing import Set
+from typing import Iterable, Iterator, Set
 
 import yaml
 from selenium import webdriver
@@ -19,6 +20,9 @@ from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.export import output_options, save_tagpack_as
+
 ZEC_REGEX = re.compile(r'\b([tz][13][a-km-zA-HJ-NP-Z1-9]{33})\b')
 ZEC_EXPLORER_URL = 'https://explorer.zcha.in/transactions/'
 LEADERBOARD_INTERVAL = 40
@@ -193,25 +197,21 @@ class TagPackGenerator:
             'currency': 'ZEC',
             'label': 'PipeFlare',
             'category': 'faucet',
-            'confidence': 'web_crawl',
-            'tags': []
+            'confidence': 'web_crawl'
         }
         self.source = source
 
-    def generate(self):
-        tags = []
+    def generate(self) -> Iterator[dict]:
         for row in self.rows:
             tag = {
                 'address': row['address'],
                 'lastmod': datetime.fromisoformat(row['date']).date(),
                 'source': row['source']
             }
-            tags.append(tag)
-        self.data['tags'] = tags
+            yield tag
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False, allow_unicode=True))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance, allow_unicode=True)
 
 
 if __name__ == '__main__':
@@ -226,5 +226,4 @@ if __name__ == '__main__':
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
                                  last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
@@ -2,11 +2,17 @@
 # -*- coding:utf-8 -*- 
 
 import os
+import sys
 import json
 from datetime import datetime as dt
 
 import yaml
-import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.addresses import CURRENCIES
+from tagpack_converters.batch import classify_addresses
+from tagpack_converters.download import download_file
+from tagpack_converters.export import output_options, save_tagpack_as
 
 
 class RawData:
@@ -17,9 +23,7 @@ class RawData:
             self.downloadJson()
 
     def downloadJson(self):
-        res = requests.get(self.url)
-        with open(self.fileName, "w") as fout:
-            fout.write(res.text)
+        download_file(self.url, self.fileName)
 
     def returnJson(self):
         with open(self.fileName, "r") as fin:
@@ -38,13 +42,10 @@ class Tag:
 class TagPack:
     def __init__(self, title, creator, description, lastmod, source):
         self.data = {"title": title, "creator": creator, "description": description, "lastmod": lastmod,
-                     "category": "perpetrator", "abuse": "ransomware", "source": source, "tags": []}
-
-    def addTag(self, tag):
-        self.data["tags"] += [tag.getTagData()]
+                     "category": "perpetrator", "abuse": "ransomware", "source": source}
 
-    def dumpYaml(self):
-        return yaml.dump(self.data, sort_keys=False)
+    def saveYaml(self, fileName, tags, formats=("yaml",), shards=1, balance="count"):
+        save_tagpack_as(fileName, self.data, (tag.getTagData() for tag in tags), formats, shards, balance)
 
 
 class TagPackGenerator:
@@ -65,6 +66,7 @@ class TagPackGenerator:
             return blockchain
 
     def generate(self):
+        valid_data = []
         for datum in self.rawJson:
             invalid = False
             for check in self.checkList:
@@ -73,14 +75,22 @@ class TagPackGenerator:
                     break
             if invalid:
                 continue
+            valid_data.append(datum)
+        recognised_coins = classify_addresses([datum["address"] for datum in valid_data])
+        for datum, recognised_coin in zip(valid_data, recognised_coins):
+            coin = self.getCoinAlias(datum["blockchain"])
+            # Warn about addresses that are no valid address of their currency, if we can validate it, but keep them;
+            # legacy Bitcoin Cash addresses are recognised as BTC
+            if coin in CURRENCIES and recognised_coin != coin and (coin, recognised_coin) != ("BCH", "BTC"):
+                print("Address {address} is no valid {coin} address".format(address=datum["address"], coin=coin),
+                      file=sys.stderr)
             tag = Tag(datum["address"],
-                      self.getCoinAlias(datum["blockchain"]),
+                      coin,
                       "Ransomware: {family}".format(family=datum["family"]))
-            self.tagPack.addTag(tag)
+            yield tag
 
-    def saveYaml(self, fileName):
-        with open(fileName, "w") as fout:
-            fout.write(self.tagPack.dumpYaml())
+    def saveYaml(self, fileName, formats=("yaml",), shards=1, balance="count"):
+        self.tagPack.saveYaml(fileName, self.generate(), formats, shards, balance)
 
 
 if __name__ == "__main__":
@@ -93,5 +103,4 @@ if __name__ == "__main__":
     lastmod = dt.now().date()
 
     tagPackGenerator = TagPackGenerator(rawJson, config["TITLE"], config["CREATOR"], config["DESCRIPTION"], lastmod, config["SOURCE"])
-    tagPackGenerator.generate()
-    tagPackGenerator.saveYaml(config["TAGPACK_FILE_NAME"])
+    tagPackGenerator.saveYaml(config["TAGPACK_FILE_NAME"], **output_options(config))
@@ -4,12 +4,17 @@ Convert Southern Poverty Law Center Cryptocurrency Report to a TagPack.
 """
 
 import os
+import sys
 import csv
 from datetime import datetime, date
-from typing import List
+from typing import Iterable, Iterator, List
 
 import yaml
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.download import download_file
+from tagpack_converters.export import output_options, save_tagpack_as
+
 
 CURRENCY = {
     'Bitcoin Addresses': 'BTC',
@@ -28,8 +33,7 @@ class RawData:
         self.url = url
 
     def download(self):
-        from urllib.request import urlretrieve
-        urlretrieve(self.url, self.fn)
+        download_file(self.url, self.fn)
 
     def read(self) -> List[dict]:
         with open(self.fn, 'r',encoding='utf-8', newline='') as csvfile:
@@ -51,13 +55,11 @@ class TagPackGenerator:
             'lastmod': lastmod,
             'abuse': 'extremism',
             'category': 'user',  # like in the OFAC TagPack generator
-            'source': source,
-            'tags': []
+            'source': source
         }
         self.source = source
 
-    def generate(self):
-        tags = []
+    def generate(self) -> Iterator[dict]:
         for row in self.rows:
             for column in ['Bitcoin Addresses', 'Ethereum Addresses', 'Litecoin Addresses', 'Monero Address']:
                 for address in row[column].split('\n'):
@@ -68,12 +70,10 @@ class TagPackGenerator:
                         'currency': CURRENCY[column],
                         'label': row['Entity']
                     }
-                    tags.append(tag)
-        self.data['tags'] = tags
+                    yield tag
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance)
 
 
 if __name__ == '__main__':
@@ -81,11 +81,9 @@ if __name__ == '__main__':
         config = yaml.safe_load(config_file)
 
     raw_data = RawData(config['RAW_FILE_NAME'], config['URL'])
-    if not os.path.exists(config['RAW_FILE_NAME']):
-        raw_data.download()
+    raw_data.download()  # Only transfers the data if it changed since the last download
 
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
                                  last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
@@ -4,10 +4,10 @@ Convert Seizures of Cryptocurrency list by National Bureau for Counter Terror Fi
 """
 
 import os
-import re
+import sys
 import csv
 from datetime import datetime
-from typing import List
+from typing import Iterable, Iterator, List
 
 import yaml
 from selenium import webdriver
@@ -15,16 +15,9 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-
-# Taken from OFAC Specially Designated Nationals generator and modified
-REGEX = [
-    ('BTC', re.compile(r'\b((bc(0([ac-hj-np-z02-9]{39}|[ac-hj-np-z02-9]{59})|1[ac-hj-np-z02-9]{8,87}))|[13][a-km-zA-HJ-NP-Z1-9]{25,34})\b')),
-    ('BCH', re.compile(r'\b(((?:bitcoincash|bchtest):)?([13][0-9a-zA-Z]{33}))|(((?:bitcoincash|bchtest):)?(qp)?[0-9a-zA-Z]{40})\b')),
-    ('LTC', re.compile(r'\b([LM3][a-km-zA-HJ-NP-Z1-9]{25,33})\b')),
-    ('ZEC', re.compile(r'\b([tz][13][a-km-zA-HJ-NP-Z1-9]{33})\b')),
-    ('ETH', re.compile(r'\b((0x)?[0-9a-fA-F]{40})\b')),
-    ('USDT', re.compile(r'\b(T[A-Za-z1-9]{33})\b'))
-]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.addresses import classify_address
+from tagpack_converters.export import output_options, save_tagpack_as
 
 
 class RawData:
@@ -68,11 +61,9 @@ class RawData:
                 order_id = row[0].text.strip().replace('\n', ' ').replace('  ', ' ')
             for column_index in range(1 if len(row) == column_count else 0, len(row)):
                 cell_value = row[column_index].text.strip()
-                for currency, address_format in REGEX:
-                    match = address_format.fullmatch(cell_value)
-                    if match:
-                        data_rows.append([order_id, match.group(1), currency])
-                        break
+                currency = classify_address(cell_value)
+                if currency is not None:
+                    data_rows.append([order_id, cell_value, currency])
         wd.quit()
         # Write data rows to CSV file
         with open(self.fn, 'w', encoding='utf-8', newline='') as csvfile:
@@ -99,12 +90,10 @@ class TagPackGenerator:
             'lastmod': lastmod,
             'source': source,
             'category': 'perpetrator',
-            'abuse': 'terrorism',
-            'tags': []
+            'abuse': 'terrorism'
         }
 
-    def generate(self):
-        tags = []
+    def generate(self) -> Iterator[dict]:
         processed_addresses = set()
         for row in self.rows:
             if row['Address'] in processed_addresses:
@@ -114,13 +103,11 @@ class TagPackGenerator:
                 'currency': row['Currency'],
                 'label': 'Seized by NBCTF of Israel (order ID: {order_id})'.format(order_id=row['Order ID'])
             }
-            tags.append(tag)
+            yield tag
             processed_addresses.add(row['Address'])
-        self.data['tags'] = tags
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance)
 
 
 if __name__ == '__main__':
@@ -134,5 +121,4 @@ if __name__ == '__main__':
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
                                  last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
\ No newline at end of file
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
\ No newline at end of file
@@ -3,22 +3,20 @@
 Convert ScamSearch data to a TagPack.
 """
 import os
-import re
+import sys
 import json
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 import yaml
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 
-REGEX = [
-    ('BTC', re.compile(r'\b((bc(0([ac-hj-np-z02-9]{39}|[ac-hj-np-z02-9]{59})|1[ac-hj-np-z02-9]{8,87}))|[13][a-km-zA-HJ-NP-Z1-9]{25,34})\b')),
-    ('BCH', re.compile(r'\b(((?:bitcoincash|bchtest):)?([13][0-9a-zA-Z]{33}))|(((?:bitcoincash|bchtest):)?(qp)?[0-9a-zA-Z]{40})\b')),
-    ('LTC', re.compile(r'\b([LM3][a-km-zA-HJ-NP-Z1-9]{25,33})\b')),
-    ('ZEC', re.compile(r'\b([tz][13][a-km-zA-HJ-NP-Z1-9]{33})\b')),
-    ('ETH', re.compile(r'\b((0x)?[0-9a-fA-F]{40})\b'))
-]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.addresses import classify_address
+from tagpack_converters.export import output_options, save_tagpack_as
+
+CURRENCIES = ('BTC', 'BCH', 'LTC', 'ZEC', 'ETH')
 NO_BTC_INTERVAL = 100
 
 
@@ -37,11 +35,8 @@ class RawData:
             scraped_addresses = set()
 
             def find_currency(address: str) -> Optional[str]:
-                for currency, regex in REGEX:
-                    if regex.fullmatch(address):
-                        return currency
-                else:
-                    return None
+                currency = classify_address(address)
+                return currency if currency in CURRENCIES else None
 
             def find_unscraped_address_index(addresses: List[str]) -> Tuple[Optional[int], Optional[str]]:
                 for index, address in enumerate(addresses):
@@ -99,13 +94,11 @@ class TagPackGenerator:
             'description': description,
             'lastmod': lastmod,
             'category': 'perpetrator',
-            'confidence': 'web_crawl',
-            'tags': []
+            'confidence': 'web_crawl'
         }
         self.source = source
 
-    def generate(self):
-        tags = []
+    def generate(self) -> Iterator[dict]:
         for row in self.rows:
             tag = {
                 'address': row['address'],
@@ -115,12 +108,10 @@ class TagPackGenerator:
                     address=row['address']
                 )
             }
-            tags.append(tag)
-        self.data['tags'] = tags
+            yield tag
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False, allow_unicode=True))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance, allow_unicode=True)
 
 
 if __name__ == '__main__':
@@ -134,5 +125,4 @@ if __name__ == '__main__':
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
                                  last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
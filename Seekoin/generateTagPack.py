@@ -4,15 +4,19 @@ Convert SeeKoin data to a TagPack.
 """
 
 import os
+import sys
 import json
 from datetime import datetime, date
-from typing import List
+from typing import Iterable, Iterator, List
 
 import yaml
 from selenium import webdriver
 from selenium.common import StaleElementReferenceException
 from selenium.webdriver.common.by import By
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tagpack_converters.export import output_options, save_tagpack_as
+
 
 class RawData:
     """
@@ -73,13 +77,11 @@ class TagPackGenerator:
             'description': description,
             'lastmod': lastmod,
             'category': 'perpetrator',
-            'confidence': 'web_crawl',
-            'tags': []
+            'confidence': 'web_crawl'
         }
         self.source = source
 
-    def generate(self):
-        tags = []
+    def generate(self) -> Iterator[dict]:
         for row in self.rows:
             tag = {
                 'address': row['address'],
@@ -87,12 +89,10 @@ class TagPackGenerator:
                 'label': '{type} report(s) at SeeKoin.com'.format(type=row['type']),
                 'source': 'https://seekoin.com/addr-{address}'.format(address=row['address'])
             }
-            tags.append(tag)
-        self.data['tags'] = tags
+            yield tag
 
-    def saveYaml(self, fn: str):
-        with open(fn, 'w', encoding='utf-8') as f:
-            f.write(yaml.dump(self.data, sort_keys=False))
+    def saveYaml(self, fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1, balance: str = 'count'):
+        save_tagpack_as(fn, self.data, self.generate(), formats, shards, balance)
 
 
 if __name__ == '__main__':
@@ -106,5 +106,4 @@ if __name__ == '__main__':
     last_mod = datetime.fromtimestamp(os.path.getmtime(config['RAW_FILE_NAME'])).date()
     generator = TagPackGenerator(raw_data.read(), config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
                                  last_mod, config['SOURCE'])
-    generator.generate()
-    generator.saveYaml(config['TAGPACK_FILE_NAME'])
+    generator.saveYaml(config['TAGPACK_FILE_NAME'], **output_options(config))
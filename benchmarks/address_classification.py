@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Compare classifying addresses by trying each REGEX fullmatch in turn with the shared classify_address, called once
+per address and in bulk through classify_addresses, which is timed on a list of strings, as the converters pass, and on
+a fixed-width array. The addresses are random strings in the formats of the currencies, including mixed-case hex.
+
+Unlike the other two, the REGEX loop validates no checksums, which is what classify_address spends most of its time
+on when all addresses are distinct, e.g. with both counts equal. classify_addresses validates the checksums of all
+distinct addresses at once, but for the double SHA-256 of Base58Check addresses, so that it too is slower than the
+REGEX loop then.
+
+Usage: python3 address_classification.py [address count] [distinct address count]
+"""
+import re
+import sys
+import random
+
+import numpy as np
+
+from utils import timed
+
+from tagpack_converters.addresses import classify_address
+from tagpack_converters.batch import classify_addresses
+from tagpack_converters.checksums import BASE58_ALPHABET, BECH32_ALPHABET
+
+# The list the EtherScamDB, ScamSearch and Sanctioned NBCTF converters used before classify_address
+REGEX = [
+    ('BTC', re.compile(r'\b((bc(0([ac-hj-np-z02-9]{39}|[ac-hj-np-z02-9]{59})|1[ac-hj-np-z02-9]{8,87}))|[13][a-km-zA-HJ-NP-Z1-9]{25,34})\b')),
+    ('BCH', re.compile(r'\b(((?:bitcoincash|bchtest):)?([13][0-9a-zA-Z]{33}))|(((?:bitcoincash|bchtest):)?(qp)?[0-9a-zA-Z]{40})\b')),
+    ('LTC', re.compile(r'\b([LM3][a-km-zA-HJ-NP-Z1-9]{25,33})\b')),
+    ('ZEC', re.compile(r'\b([tz][13][a-km-zA-HJ-NP-Z1-9]{33})\b')),
+    ('ETH', re.compile(r'\b((0x)?[0-9a-fA-F]{40})\b')),
+    ('USDT', re.compile(r'\bT[A-Za-z1-9]{33}\b'))
+]
+
+
+def random_address(rnd: random.Random) -> str:
+    prefix = rnd.choice(['1', '3', 'L', 't1', 'T', '0x', '0x', 'bc1', 'bitcoincash:'])
+    if prefix == '0x':
+        return prefix + ''.join(rnd.choices(rnd.choice(['0123456789abcdef', '0123456789abcdefABCDEF']), k=40))
+    if prefix in ('bc1', 'bitcoincash:'):
+        return prefix + ''.join(rnd.choices(BECH32_ALPHABET, k=42 - len(prefix) if prefix == 'bc1' else 42))
+    return prefix + ''.join(rnd.choices(BASE58_ALPHABET, k=34 - len(prefix)))
+
+
+def classify_regex(address: str):
+    for currency, address_format in REGEX:
+        if address_format.fullmatch(address):
+            return currency
+    return None
+
+
+if __name__ == '__main__':
+    address_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000000
+    distinct_count = int(sys.argv[2]) if len(sys.argv) >= 3 else 50000
+    rnd = random.Random(42)
+    distinct_addresses = [random_address(rnd) for _ in range(distinct_count)]
+    addresses = rnd.choices(distinct_addresses, k=address_count)
+    results = {}
+    with timed('REGEX fullmatch loop', results):
+        for address in addresses:
+            classify_regex(address)
+    with timed('classify_address', results):
+        expected = [classify_address(address) or '' for address in addresses]
+    classify_address.cache_clear()
+    with timed('classify_addresses', results):
+        actual = classify_addresses(addresses)
+    assert list(actual) == expected, 'Classification results differ'
+    column = np.array(addresses, dtype='U91')
+    with timed('classify_addresses on an array', results):
+        actual = classify_addresses(column)
+    assert list(actual) == expected, 'Classification results of the array differ'
+    for name in ('classify_address', 'classify_addresses', 'classify_addresses on an array'):
+        print('Speedup of {name}: {speedup:.1f}x on {count} lookups of {distinct} distinct addresses'.format(
+            name=name, speedup=results['REGEX fullmatch loop'] / results[name], count=address_count,
+            distinct=distinct_count))
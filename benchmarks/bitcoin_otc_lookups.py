@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Generate the Bitcoin OTC tags of synthetic users against a local stub keyserver with a fixed latency: with one lookup
+at a time, concurrently, and again from the key cache, which must not send any request.
+
+Usage: python3 bitcoin_otc_lookups.py [user_count] [latency_ms]
+
+Every fifth key is unknown to the stub keyserver, which answers 404 as the SKS keyservers do.
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils import load_converter, timed
+
+
+class StubKeyserver(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.request_count += 1
+        time.sleep(self.server.latency)
+        keyid = parse_qs(urlparse(self.path).query)['search'][0][2:]
+        if int(keyid, 16) % 5 == 0:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = 'info:1:1\npub:{keyid}:1:2048:1500000000::\nuid:User%20{keyid}%20<{keyid}@example.org>:1500000000::\n'
+        body = body.format(keyid=keyid).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def synthetic_rows(user_count: int):
+    return [{'nick': 'user{index}'.format(index=index),
+             'keyid': '{index:016X}'.format(index=index) if index % 3 else None,
+             'bitcoinaddress': '1Otc{index:030d}'.format(index=index)} for index in range(user_count)]
+
+
+if __name__ == '__main__':
+    user_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 300
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubKeyserver)
+    server.daemon_threads = True
+    server.latency = (float(sys.argv[2]) if len(sys.argv) >= 3 else 20) / 1000
+    server.request_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    module = load_converter('Bitcoin OTC')
+    module.SKS_LOOKUP_URL = 'http://127.0.0.1:{port}/pks/lookup'.format(port=server.server_address[1])
+    rows = synthetic_rows(user_count)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        def generate(name: str, key_cache_fn: str, max_workers: int):
+            generator = module.TagPackGenerator(rows, 'title', 'creator', 'description', None, 'source', key_cache_fn,
+                                                max_workers)
+            with timed(name, results):
+                return list(generator.generate())
+
+        sequential = generate('one lookup at a time', os.path.join(tmp_dir, 'sequential.json'), 1)
+        concurrent = generate('concurrent', os.path.join(tmp_dir, 'keys.json'), module.SKS_WORKERS)
+        assert concurrent == sequential, 'The concurrent lookups gave other labels'
+        request_count = server.request_count
+        cached = generate('cached', os.path.join(tmp_dir, 'keys.json'), module.SKS_WORKERS)
+        assert cached == sequential, 'The cached lookups gave other labels'
+        assert server.request_count == request_count, 'The cached run sent requests'
+    server.shutdown()
+    print('{count} lookups per run, concurrent {speedup:.1f} times faster'.format(
+        count=request_count // 2, speedup=results['one lookup at a time'] / results['concurrent']))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Ingest a synthetic archive of saved Bitcointalk profile and topic pages, made of copies of the pages of
+fixtures/bitcointalk, as a directory and as a gzipped tarball, in one process and in several, and check the profiles and
+posts found against the fixtures. The memory of the process reading the archive must not grow with its size.
+
+Usage: python3 bitcointalk_archive.py [page_count] [processes]
+"""
+import os
+import sys
+import json
+import shutil
+import tarfile
+import tempfile
+import tracemalloc
+
+from utils import load_converter, timed
+from bitcointalk_profiles import FIXTURES_DIR, load_fixtures
+
+
+def write_archive(archive_dir: str, page_count: int, pages: dict):
+    """
+    Write the pages into subdirectories of a thousand pages, as profiles of their own user IDs, topics, error pages
+    and files that are not pages.
+    """
+    for index in range(page_count):
+        page_dir = os.path.join(archive_dir, '{index:04d}'.format(index=index // 1000))
+        os.makedirs(page_dir, exist_ok=True)
+        kind = index % 5
+        if kind < 2:
+            fn = 'index.php?action=profile;u={index}'.format(index=index)
+            content = pages[(35, 4102)[kind]]
+        elif kind < 4:
+            fn, content = 'index.php?topic={index}.0'.format(index=index), pages['topic']
+        else:
+            fn, content = ('profile_{index}.html'.format(index=index), pages[99]) if index % 2 else \
+                ('empty_{index}'.format(index=index), b'')
+        with open(os.path.join(page_dir, fn), 'wb') as page_file:
+            page_file.write(content)
+
+
+def read_jsonl(fn: str) -> list:
+    with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+        return [json.loads(line) for line in jsonlines_file]
+
+
+def expected_records(page_count: int, profiles: dict, posts: list):
+    expected_profiles, expected_posts = [], []
+    for index in range(page_count):
+        kind = index % 5
+        if kind < 2:
+            expected_profiles.append(dict(profiles[(35, 4102)[kind]], user_id=index))
+        elif kind < 4:
+            expected_posts.extend(posts)
+    return expected_profiles, expected_posts
+
+
+if __name__ == '__main__':
+    page_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 20000
+    processes = int(sys.argv[2]) if len(sys.argv) >= 3 else os.cpu_count()
+    module = load_converter('Bitcointalk Users')
+    fixtures = load_fixtures()
+    pages = {user_id: page for user_id, page, _ in fixtures}
+    profiles = {user_id: profile for user_id, _, profile in fixtures}
+    with open(os.path.join(FIXTURES_DIR, 'topic_5.html'), 'rb') as page_file:
+        pages['topic'] = page_file.read()
+    with open(os.path.join(FIXTURES_DIR, 'topic_5.json'), 'r') as json_file:
+        posts = json.load(json_file)
+    document = module.lxml.html.document_fromstring(pages['topic'])
+    # As written to JSON, with the address and currency pairs as lists
+    assert json.loads(json.dumps(module.parse_posts(document, module.AddressScanner(module.REGEX)))) == posts, \
+        'The posts differ'
+    expected_profiles, expected_posts = expected_records(page_count, profiles, posts)
+    key = json.dumps
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive_dir = os.path.join(tmp_dir, 'archive')
+        write_archive(archive_dir, page_count, pages)
+        tarball = os.path.join(tmp_dir, 'archive.tar.gz')
+        with tarfile.open(tarball, 'w:gz') as tar_file:
+            tar_file.add(archive_dir, arcname='archive')
+        fn, posts_fn = os.path.join(tmp_dir, 'profiles.jsonl'), os.path.join(tmp_dir, 'posts.jsonl')
+        for archive in (archive_dir, tarball):
+            outputs = {}
+            for process_count in (1, processes):
+                name = '{archive}, {count} processes'.format(archive=os.path.basename(archive), count=process_count)
+                with timed(name, results):
+                    module.RawData(fn, module.BITCOINTALK_PROFILE_URL).ingest(archive, posts_fn, process_count)
+                outputs[process_count] = read_jsonl(fn), read_jsonl(posts_fn)
+                # The pages are ingested in the order of the archive, which depends on the file system
+                assert sorted(map(key, outputs[process_count][0])) == sorted(map(key, expected_profiles)), \
+                    'Other profiles'
+                assert sorted(map(key, outputs[process_count][1])) == sorted(map(key, expected_posts)), 'Other posts'
+            assert outputs[processes] == outputs[1], 'The processes ingested the pages in another order'
+        generator = module.TagPackGenerator(None, 'title', 'creator', 'description', None, 'source', fn,
+                                            posts_fn=posts_fn)
+        tags = list(generator.generate())
+        assert {tag['source'] for tag in tags if 'topic=' in tag['source']} == {post['url'] for post in posts}
+        del outputs, tags
+        # The memory allocated by the process reading the archive, which holds a few batches of pages at a time
+        tracemalloc.start()
+        module.RawData(fn, module.BITCOINTALK_PROFILE_URL).ingest(tarball, posts_fn, processes)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        shutil.rmtree(archive_dir)
+    print('{count} pages, {speedup:.1f} times faster with {processes} processes on {cpus} CPUs, at most {peak:.1f} MB '
+          'allocated while reading the tarball'.format(
+              count=page_count, processes=processes, cpus=os.cpu_count(), peak=peak / 1024 / 1024,
+              speedup=results['archive, 1 processes'] / results['archive, {count} processes'.format(count=processes)]))
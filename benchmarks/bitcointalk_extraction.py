@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compare the per-currency finditer extraction with the single-pass AddressScanner on synthetic BitcoinTalk profiles.
+
+Usage: python3 bitcointalk_extraction.py [profile count]
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+
+from utils import load_converter, timed
+
+from tagpack_converters.addresses import AddressScanner
+
+BASE58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+BECH32 = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+WORDS = ['bitcoin', 'trade', 'escrow', 'signature', 'campaign', 'wallet', 'hodl', 'moon', 'btc', 'eth', 'send', 'to']
+
+
+def random_address(rnd: random.Random) -> str:
+    kind = rnd.randrange(5)
+    if kind == 0:
+        return '1' + ''.join(rnd.choices(BASE58, k=33))
+    if kind == 1:
+        return 'bc1q' + ''.join(rnd.choices(BECH32, k=38))
+    if kind == 2:
+        return '0x' + ''.join(rnd.choices('0123456789abcdef', k=40))
+    if kind == 3:
+        return 'L' + ''.join(rnd.choices(BASE58, k=33))
+    return 'bitcoincash:qp' + ''.join(rnd.choices(BECH32, k=40))
+
+
+def random_text(rnd: random.Random, length: int) -> str:
+    words = []
+    for _ in range(length):
+        roll = rnd.random()
+        if roll < 0.02:
+            words.append(random_address(rnd))
+        elif roll < 0.05:
+            words.append(''.join(rnd.choices('0123456789abcdef', k=rnd.randrange(20, 80))))  # Hex-like noise
+        else:
+            words.append(rnd.choice(WORDS))
+    return ' '.join(words)
+
+
+def write_profiles(fn: str, count: int):
+    rnd = random.Random(42)
+    with open(fn, 'w', encoding='utf-8') as jsonlines_file:
+        for user_id in range(1, count + 1):
+            profile = {
+                'user_id': user_id,
+                'name': 'user{user_id}'.format(user_id=user_id),
+                'posts': rnd.randrange(1000),
+                'position': 'Member',
+                'signature': random_text(rnd, rnd.randrange(60)),
+                'avatar_text': random_text(rnd, rnd.randrange(5)),
+                'avatar_url': 'https://bitcointalk.org/useravatars/avatar_{user_id}.png'.format(user_id=user_id)
+            }
+            print(json.dumps(profile, ensure_ascii=False), file=jsonlines_file)
+
+
+def extract_finditer(regex, rows):
+    result = []
+    for row in rows:
+        user_addresses = {}
+        for key, value in row.items():
+            if type(value) != str:
+                continue
+            for currency, address_pattern in regex:
+                for match in address_pattern.finditer(value):
+                    address = match.group(0)
+                    if address not in user_addresses:
+                        user_addresses[address] = currency
+        result.append(user_addresses)
+    return result
+
+
+def extract_scanner(regex, rows):
+    scanner = AddressScanner(regex)
+    return [scanner.extract(row.values()) for row in rows]
+
+
+if __name__ == '__main__':
+    profile_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000000
+    converter = load_converter('Bitcointalk Users')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = os.path.join(tmp_dir, 'bitcointalk_users.jsonl')
+        write_profiles(fn, profile_count)
+        rows = converter.RawData(fn, converter.BITCOINTALK_PROFILE_URL).read()
+    results = {}
+    with timed('finditer per currency', results):
+        expected = extract_finditer(converter.REGEX, rows)
+    with timed('single-pass scanner', results):
+        actual = extract_scanner(converter.REGEX, rows)
+    assert [list(a.items()) for a in actual] == [list(e.items()) for e in expected], 'Extraction results differ'
+    print('Speedup: {speedup:.1f}x on {count} profiles'.format(
+        speedup=results['finditer per currency'] / results['single-pass scanner'], count=profile_count))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Time finding where a Bitcointalk update starts and which user IDs it retries, on synthetic raw data: by reading the
+whole JSONL file twice as the update used to, and with the IdStateIndex kept next to it, once when it is built and once
+after a thousand profiles were appended.
+
+Usage: python3 bitcointalk_id_index.py [profile_count]
+
+Every 20th user ID has no profile, as if the account was deleted.
+"""
+import os
+import sys
+import json
+import tempfile
+
+from utils import timed
+from tagpack_converters.id_index import IdStateIndex
+
+
+def write_profiles(fn: str, user_ids, mode: str = 'w'):
+    with open(fn, mode, encoding='utf-8') as jsonlines_file:
+        for user_id in user_ids:
+            if user_id % 20:
+                profile = {'user_id': user_id, 'name': 'user{id}'.format(id=user_id), 'posts': user_id % 100,
+                           'signature': 'Donations welcome'}
+                print(json.dumps(profile), file=jsonlines_file)
+
+
+def scan_twice(fn: str):
+    with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+        max_user_id = max(json.loads(line)['user_id'] for line in jsonlines_file)
+    with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+        user_ids = {json.loads(line)['user_id'] for line in jsonlines_file}
+    return max_user_id, [user_id for user_id in range(1, max_user_id + 1) if user_id not in user_ids]
+
+
+if __name__ == '__main__':
+    profile_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000000
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = os.path.join(tmp_dir, 'bitcointalk_users.jsonl')
+        write_profiles(fn, range(1, profile_count + 1))
+        with timed('read the JSONL twice', results):
+            max_user_id, missing = scan_twice(fn)
+        with timed('build the index', results):
+            index = IdStateIndex(fn + '.ids.npz', 'user_id')
+            index.sync(fn)
+            index.save()
+        assert index.max_present() == max_user_id and index.due_ids() == missing
+        for user_id in missing:
+            index.mark_absent(user_id)
+        index.save()
+        write_profiles(fn, range(profile_count + 1, profile_count + 1001), 'a')
+        with timed('update with the index', results):
+            index = IdStateIndex(fn + '.ids.npz', 'user_id')
+            index.sync(fn)
+            due = index.due_ids()
+        # Only the user IDs without profile among those appended are due, those checked before wait for their backoff
+        assert index.max_present() == scan_twice(fn)[0]
+        assert due == scan_twice(fn)[1][len(missing):], 'Absent user IDs retried before their backoff'
+        print('Index of {size} KB for {count} user IDs'.format(size=os.path.getsize(fn + '.ids.npz') // 1024,
+                                                               count=index.max_present()))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Time generating the Bitcointalk tags of synthetic profiles after a thousand profiles were appended, from all the rows
+read into memory as before, and incrementally from the raw data file with the addresses extracted before, and check
+that both give the same tags. Some of the appended profiles were downloaded again, unchanged or changed.
+
+Usage: python3 bitcointalk_incremental.py [profile_count]
+"""
+import os
+import sys
+import json
+import tempfile
+
+from utils import load_converter, timed
+from bitcointalk_extraction import write_profiles
+
+
+def generate(module, fn: str, incremental: bool) -> list:
+    rows = None if incremental else module.RawData(fn, module.BITCOINTALK_PROFILE_URL).read()
+    generator = module.TagPackGenerator(rows, 'title', 'creator', 'description', None, 'source', fn)
+    return list(generator.generate())
+
+
+if __name__ == '__main__':
+    profile_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000000
+    module = load_converter('Bitcointalk Users')
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = os.path.join(tmp_dir, 'bitcointalk_users.jsonl')
+        write_profiles(fn, profile_count)
+        with timed('first incremental extraction', results):
+            first = generate(module, fn, True)
+        assert first == generate(module, fn, False), 'The first incremental extraction gave other tags'
+        # The same profiles with a thousand more, as the profiles are random with the same seed
+        write_profiles(fn, profile_count + 1000)
+        with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+            again = [json.loads(line) for _, line in zip(range(10), jsonlines_file)]
+        with open(fn, 'a', encoding='utf-8') as jsonlines_file:
+            for profile in again:
+                if profile['user_id'] % 2:
+                    profile['signature'] = '1BoatSLRHtKNngkdXEeobR76b53LETtpyT'
+                print(json.dumps(profile, ensure_ascii=False), file=jsonlines_file)
+        with timed('all rows', results):
+            expected = generate(module, fn, False)
+        with timed('incremental', results):
+            actual = generate(module, fn, True)
+        assert actual == expected, 'The incremental extraction gave other tags'
+        with timed('incremental, nothing appended', results):
+            assert generate(module, fn, True) == expected
+    print('{count} tags, incremental {speedup:.1f} times faster after 1000 profiles appended'.format(
+        count=len(expected), speedup=results['all rows'] / results['incremental']))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Time reading single Bitcointalk profiles and ranges of profiles from synthetic raw data: by scanning the JSONL file, and
+through the OffsetIndex kept next to it. Then append profiles downloaded again and check that dropping them keeps the
+latest profile of each user ID.
+
+Usage: python3 bitcointalk_offsets.py [profile_count] [lookup_count]
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+
+from utils import load_converter, timed
+from bitcointalk_id_index import write_profiles
+
+
+def scan(fn: str, first_user_id: int, last_user_id: int) -> list:
+    with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+        profiles = {}
+        for line in jsonlines_file:
+            profile = json.loads(line)
+            if first_user_id <= profile['user_id'] <= last_user_id:
+                profiles[profile['user_id']] = profile
+    return [profiles[user_id] for user_id in sorted(profiles)]
+
+
+if __name__ == '__main__':
+    profile_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000000
+    lookup_count = int(sys.argv[2]) if len(sys.argv) >= 3 else 1000
+    module = load_converter('Bitcointalk Users')
+    rnd = random.Random(42)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = os.path.join(tmp_dir, 'bitcointalk_users.jsonl')
+        write_profiles(fn, range(1, profile_count + 1))
+        raw_data = module.RawData(fn, module.BITCOINTALK_PROFILE_URL)
+        user_ids = [rnd.randrange(1, profile_count + 1) for _ in range(lookup_count)]
+        with timed('scan for one profile', results):
+            expected = scan(fn, user_ids[0], user_ids[0])
+        with timed('build the index', results):
+            raw_data.offset_index()
+        with timed('{count} profiles through the index'.format(count=lookup_count), results):
+            found = [list(raw_data.read_profiles(user_id)) for user_id in user_ids]
+        assert found[0] == expected
+        assert all(profiles == ([] if user_id % 20 == 0 else [{'user_id': user_id, 'name': 'user{id}'.format(
+            id=user_id), 'posts': user_id % 100, 'signature': 'Donations welcome'}])
+            for user_id, profiles in zip(user_ids, found)), 'The index found other profiles'
+        first_user_id = profile_count // 2
+        with timed('scan for 1000 user IDs', results):
+            expected = scan(fn, first_user_id, first_user_id + 999)
+        with timed('1000 user IDs through the index', results):
+            assert list(raw_data.read_profiles(first_user_id, first_user_id + 999)) == expected
+
+        # Profiles downloaded again, some of them changed since
+        with open(fn, 'a', encoding='utf-8') as jsonlines_file:
+            for user_id in range(1, 1001):
+                if user_id % 20:
+                    profile = {'user_id': user_id, 'name': 'user{id}'.format(id=user_id), 'posts': user_id % 100 + 1,
+                               'signature': 'Donations welcome'}
+                    print(json.dumps(profile), file=jsonlines_file)
+        expected = scan(fn, 1, profile_count)
+        with timed('drop the profiles downloaded again', results):
+            dropped = raw_data.deduplicate()
+        assert dropped == 950
+        with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+            assert [json.loads(line) for line in jsonlines_file] == expected, 'Dropped other profiles'
+        assert raw_data.offset_index().duplicate_count == 0
+    print('Index lookup {speedup:.0f} times faster than a scan'.format(
+        speedup=results['scan for one profile'] * lookup_count /
+        results['{count} profiles through the index'.format(count=lookup_count)]))
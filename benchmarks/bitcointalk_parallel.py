@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Time extracting the Bitcointalk tags of synthetic profiles from scratch, in this process and split over worker
+processes reading their ranges of the raw data file through a memory map, and check that both give the same tags as
+the rows read into memory. Some profiles at the end were downloaded again, and the last line is still being written.
+
+Usage: python3 bitcointalk_parallel.py [profile_count] [processes]
+"""
+import os
+import sys
+import json
+import tempfile
+
+from utils import load_converter, timed
+from bitcointalk_extraction import write_profiles
+
+
+def generate(module, fn: str, processes: int) -> list:
+    if os.path.exists(fn + module.ADDRESSES_SUFFIX):
+        os.remove(fn + module.ADDRESSES_SUFFIX)
+    generator = module.TagPackGenerator(None, 'title', 'creator', 'description', None, 'source', fn, processes)
+    return list(generator.generate())
+
+
+if __name__ == '__main__':
+    profile_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000000
+    processes = int(sys.argv[2]) if len(sys.argv) >= 3 else os.cpu_count()
+    module = load_converter('Bitcointalk Users')
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = os.path.join(tmp_dir, 'bitcointalk_users.jsonl')
+        write_profiles(fn, profile_count)
+        with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+            again = [json.loads(line) for _, line in zip(range(10), jsonlines_file)]
+        with open(fn, 'a', encoding='utf-8') as jsonlines_file:
+            for profile in again:
+                print(json.dumps(profile, ensure_ascii=False), file=jsonlines_file)
+        rows = module.RawData(fn, module.BITCOINTALK_PROFILE_URL).read()
+        with open(fn, 'a', encoding='utf-8') as jsonlines_file:
+            jsonlines_file.write('{"user_id": 1, "name": "user1", "signature": "1BoatSLRHtKNngkdXEeobR76b53LETtpyT')
+        expected = list(module.TagPackGenerator(rows, 'title', 'creator', 'description', None, 'source').generate())
+        with timed('1 process', results):
+            sequential = generate(module, fn, 1)
+        name = '{count} processes'.format(count=processes)
+        with timed(name, results):
+            parallel = generate(module, fn, processes)
+        assert sequential == expected, 'The extraction in this process gave other tags'
+        assert parallel == expected, 'The extraction in worker processes gave other tags'
+    print('{count} tags, {processes} processes {speedup:.1f} times faster on {cpus} CPUs'.format(
+        count=len(expected), processes=processes, speedup=results['1 process'] / results[name], cpus=os.cpu_count()))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Parse the saved BitcoinTalk profile pages of fixtures/bitcointalk with the lxml parser of the Bitcointalk Users
+converter, check the profiles against the ones saved next to them, and time the parser. Then fetch profiles from a
+local stub forum serving the pages with a fixed latency, with one worker and with several workers sharing the same
+budget of requests per second, and check that the budget holds.
+
+Usage: python3 bitcointalk_profiles.py [profile_count] [requests_per_second] [latency_ms]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from utils import ROOT_DIR, load_converter, timed
+
+FIXTURES_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'fixtures', 'bitcointalk')
+
+
+def load_fixtures():
+    """
+    Return the user ID, page and saved profile of each fixture.
+    """
+    fixtures = []
+    for html_fn in sorted(glob.glob(os.path.join(FIXTURES_DIR, 'profile_*.html'))):
+        user_id = int(os.path.basename(html_fn)[len('profile_'):-len('.html')])
+        with open(html_fn, 'rb') as html_file, open(html_fn[:-len('.html')] + '.json', 'r') as json_file:
+            fixtures.append((user_id, html_file.read(), json.load(json_file)))
+    return fixtures
+
+
+class StubForum(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.request_times.append(time.monotonic())
+        time.sleep(self.server.latency)
+        user_id = int(urlparse(self.path).query.rpartition('u=')[2])
+        body = self.server.pages[user_id % len(self.server.pages)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=ISO-8859-1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def max_requests_per_second(request_times) -> int:
+    request_times = sorted(request_times)
+    start, peak = 0, 0
+    for end, request_time in enumerate(request_times):
+        while request_times[start] <= request_time - 1.0:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+
+if __name__ == '__main__':
+    profile_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 100
+    rate = float(sys.argv[2]) if len(sys.argv) >= 3 else 20.0
+    latency = (float(sys.argv[3]) if len(sys.argv) >= 4 else 200) / 1000
+    module = load_converter('Bitcointalk Users')
+    fixtures = load_fixtures()
+    for user_id, page, profile in fixtures:
+        assert module.parse_profile(page, user_id) == profile, 'Profile {user_id} differs'.format(user_id=user_id)
+    results = {}
+    with timed('parse {count} pages'.format(count=100 * len(fixtures)), results):
+        for _ in range(100):
+            for user_id, page, profile in fixtures:
+                module.parse_profile(page, user_id)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubForum)
+    server.daemon_threads = True
+    server.pages = [page for _, page, _ in fixtures]
+    server.latency = latency
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    module.BITCOINTALK_PROFILE_URL = 'http://127.0.0.1:{port}/index.php?action=profile;u={{user_id}}'.format(
+        port=server.server_address[1])
+    fetched = {}
+    for workers in (1, module.FETCH_WORKERS * 2):
+        server.request_times = []
+        fetcher = module.ProfileFetcher(workers, rate)
+        name = '{workers} workers, {rate} requests per second'.format(workers=workers, rate=rate)
+        with timed(name, results):
+            fetched[workers] = list(fetcher.profiles(range(1, profile_count + 1)))
+        fetcher.close()
+        peak = max_requests_per_second(server.request_times)
+        print('{name}: {speed:.1f} profiles per second, at most {peak} requests in a second'.format(
+            name=name, speed=profile_count / results[name], peak=peak))
+        assert peak <= rate + 1, 'The workers exceeded the budget'
+    assert fetched[1] == fetched[module.FETCH_WORKERS * 2], 'The workers fetched other profiles'
+    assert [user_id for user_id, _ in fetched[1]] == list(range(1, profile_count + 1))
+    server.shutdown()
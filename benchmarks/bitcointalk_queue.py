@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Download the profiles of a local stub forum with a coordinator and queue workers, one of which dies right after
+leasing a range, and check that the range is leased again once its lease expired, that every user ID is requested
+once, and that the raw data is the one a download by a single process writes. Then check that a coordinator restarted
+after a merge was interrupted neither loses nor repeats the profiles of a range.
+
+Usage: python3 bitcointalk_queue.py [user_count] [workers] [latency_ms]
+
+Every 20th user ID has no profile, as if the account was deleted, and so have all user IDs after user_count.
+"""
+import os
+import sys
+import time
+import socket
+import tempfile
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer
+
+import requests
+
+from utils import load_converter, timed
+from bitcointalk_profiles import load_fixtures
+from bitcointalk_shards import StubUsers
+
+RATE = 1000.0
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+if __name__ == '__main__':
+    user_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000
+    worker_count = int(sys.argv[2]) if len(sys.argv) >= 3 else 3
+    latency = (float(sys.argv[3]) if len(sys.argv) >= 4 else 20) / 1000
+    module = load_converter('Bitcointalk Users')
+    from tagpack_converters.work_queue import WorkQueue
+
+    pages = {user_id: page for user_id, page, _ in load_fixtures()}
+    forum = ThreadingHTTPServer(('127.0.0.1', 0), StubUsers)
+    forum.daemon_threads = True
+    forum.profile_page, forum.error_page = pages[35], pages[99]
+    forum.user_count = user_count
+    forum.latency = latency
+    forum.lock = threading.Lock()
+    forum.request_times = []
+    threading.Thread(target=forum.serve_forever, daemon=True).start()
+    forum_url = 'http://127.0.0.1:{port}/index.php?action=profile;u={{user_id}}'.format(port=forum.server_address[1])
+    module.BITCOINTALK_PROFILE_URL = forum_url
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        expected_fn = os.path.join(tmp_dir, 'expected.jsonl')
+        with timed('single process', results):
+            module.RawData(expected_fn, forum_url).download(rate=RATE)
+        with open(expected_fn, 'r', encoding='utf-8') as jsonlines_file:
+            expected = jsonlines_file.read()
+
+        fn = os.path.join(tmp_dir, 'bitcointalk_users.jsonl')
+        raw_data = module.RawData(fn, forum_url)
+        coordinator = module.CrawlCoordinator(raw_data, WorkQueue(fn + module.QUEUE_SUFFIX, lease_time=2.0))
+        port = free_port()
+        coordinator_url = 'http://127.0.0.1:{port}/'.format(port=port)
+        serving = threading.Thread(target=coordinator.serve, args=('127.0.0.1', port))
+        serving.start()
+        time.sleep(0.5)
+        # A worker that dies right after leasing its first range
+        dead_lease = requests.post(coordinator_url + 'lease', json={'worker': 'dead'}).json()
+        forum.request_times = []
+        requested = Counter()
+        original_fetch = module.ProfileFetcher.fetch
+
+        def counted_fetch(fetcher, user_id):
+            with forum.lock:
+                requested[user_id] += 1
+            return original_fetch(fetcher, user_id)
+
+        module.ProfileFetcher.fetch = counted_fetch
+        workers = [module.ProfileWorker(coordinator_url, module.ProfileFetcher(rate=RATE / worker_count))
+                   for _ in range(worker_count)]
+        with timed('{count} queue workers'.format(count=worker_count), results):
+            threads = [threading.Thread(target=worker.run) for worker in workers]
+            for thread in threads:
+                thread.start()
+            serving.join()
+            for thread in threads:
+                thread.join()
+        module.ProfileFetcher.fetch = original_fetch
+        with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+            assert jsonlines_file.read() == expected, 'The queue workers downloaded other profiles'
+        assert set(range(dead_lease['first_id'], dead_lease['last_id'] + 1)) <= set(requested), \
+            'The range of the dead worker was lost'
+        assert max(requested.values()) == 1, 'User IDs were requested more than once'
+        assert not os.path.exists(fn + module.QUEUE_SUFFIX), 'The queue of a finished download was left behind'
+
+        # A coordinator restarted after appending the profiles of a range, but before committing the merge
+        os.remove(fn)
+        os.remove(fn + module.ID_INDEX_SUFFIX)
+        queue = WorkQueue(fn + module.QUEUE_SUFFIX)
+        coordinator = module.CrawlCoordinator(module.RawData(fn, forum_url), queue)
+        fetcher = module.ProfileFetcher(rate=RATE)
+        for _ in range(3):
+            lease = coordinator.lease('worker')
+            user_ids = range(lease['first_id'], lease['last_id'] + 1)
+            fetched = list(fetcher.profiles(user_ids))
+            coordinator.complete(lease['lease'], {
+                'profiles': [profile for _, profile in fetched if profile],
+                'absent': [user_id for user_id, profile in fetched if profile is None]})
+        with open(fn, 'a', encoding='utf-8') as jsonlines_file:
+            jsonlines_file.write('{"user_id": 301, "name": "appended by an interrupted merge"}\n')
+        queue.close()
+        queue = WorkQueue(fn + module.QUEUE_SUFFIX)
+        coordinator = module.CrawlCoordinator(module.RawData(fn, forum_url), queue)
+        lease = coordinator.lease('worker')
+        assert lease['first_id'] == 301, 'The restarted coordinator lost track of the ranges'
+        with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+            assert jsonlines_file.read() == ''.join(expected.splitlines(True)[:285]), \
+                'The restarted coordinator kept the profiles of the interrupted merge'
+        queue.close()
+        fetcher.close()
+    forum.shutdown()
+    print('{count} profiles, {workers} queue workers {speedup:.1f} times faster than one process'.format(
+        count=expected.count('\n'), workers=worker_count,
+        speedup=results['single process'] / results['{count} queue workers'.format(count=worker_count)]))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Download the profiles of a local stub forum with a fixed latency into empty raw data, with the workers of a single
+process and with several processes taking ranges of user IDs, and check that both write the same raw data, find the
+same user IDs without profile, stop after the same gap at the end, and keep to the budget of requests per second.
+
+Usage: python3 bitcointalk_shards.py [user_count] [shards] [requests_per_second] [latency_ms]
+
+Every 20th user ID has no profile, as if the account was deleted, and so have all user IDs after user_count.
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+
+from utils import load_converter, timed
+from bitcointalk_profiles import StubForum, load_fixtures, max_requests_per_second
+
+
+class StubUsers(StubForum):
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.request_times.append(time.monotonic())
+        time.sleep(self.server.latency)
+        user_id = int(self.path.rpartition('u=')[2])
+        valid = user_id <= self.server.user_count and user_id % 20
+        body = self.server.profile_page if valid else self.server.error_page
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=ISO-8859-1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == '__main__':
+    user_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000
+    shards = int(sys.argv[2]) if len(sys.argv) >= 3 else 4
+    rate = float(sys.argv[3]) if len(sys.argv) >= 4 else 500.0
+    latency = (float(sys.argv[4]) if len(sys.argv) >= 5 else 100) / 1000
+    module = load_converter('Bitcointalk Users')
+    pages = {user_id: page for user_id, page, _ in load_fixtures()}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubUsers)
+    server.daemon_threads = True
+    server.profile_page, server.error_page = pages[35], pages[99]
+    server.user_count = user_count
+    server.latency = latency
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Set before the processes of the shards are forked, which inherit it
+    module.BITCOINTALK_PROFILE_URL = 'http://127.0.0.1:{port}/index.php?action=profile;u={{user_id}}'.format(
+        port=server.server_address[1])
+    results, raw_data, states = {}, {}, {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for shard_count in (1, shards):
+            server.request_times = []
+            name = '{count} shards'.format(count=shard_count)
+            fn = os.path.join(tmp_dir, '{count}.jsonl'.format(count=shard_count))
+            with timed(name, results):
+                module.RawData(fn, module.BITCOINTALK_PROFILE_URL).download(rate=rate, shards=shard_count)
+            peak = max_requests_per_second(server.request_times)
+            print('{name}: {count} requests, at most {peak} in a second'.format(
+                name=name, count=len(server.request_times), peak=peak))
+            assert peak <= rate + 1, 'The shards exceeded the budget'
+            with open(fn, 'r', encoding='utf-8') as jsonlines_file:
+                raw_data[shard_count] = jsonlines_file.read()
+            with np.load(fn + module.ID_INDEX_SUFFIX) as arrays:
+                states[shard_count] = np.trim_zeros(arrays['state'], 'b')
+            assert not [name for name in os.listdir(tmp_dir) if '.shard-' in name], 'Shards left behind'
+    assert raw_data[shards] == raw_data[1], 'The shards downloaded other profiles'
+    assert np.array_equal(states[shards][:len(states[1])], states[1]), 'The shards found other user IDs'
+    assert len(states[shards]) - len(states[1]) < 2 * shards * module.SHARD_RANGE_SIZE
+    server.shutdown()
+    print('{count} profiles, {shards} shards {speedup:.1f} times faster'.format(
+        count=raw_data[1].count('\n'), shards=shards, speedup=results['1 shards'] / results[name]))
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Time a nightly refresh of the Seekoin converter on synthetic raw data: the first build, a rebuild of unchanged data
+skipped by the build cache, the same after the raw data was downloaded again with the same content, and a rebuild
+after the content changed.
+
+Usage: python3 build_cache.py [row_count]
+
+The converter folder is copied to a temporary folder, so that the repository is left untouched.
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+from utils import ROOT_DIR, timed
+from tagpack_converters.sources import REGISTRY
+
+
+def write_rows(fn: str, row_count: int, comment: str):
+    with open(fn, 'w', encoding='utf-8') as jsonlines_file:
+        for index in range(row_count):
+            row = {'address': '1Seekoin{index:026d}'.format(index=index), 'date': '2022-01-01', 'type': 'Scam',
+                   'hits': index % 10, 'comment': comment}
+            print(json.dumps(row), file=jsonlines_file)
+
+
+if __name__ == '__main__':
+    row_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 200000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        folder = os.path.join(tmp_dir, 'Seekoin')
+        shutil.copytree(os.path.join(ROOT_DIR, 'Seekoin'), folder)
+        converter = type(REGISTRY['seekoin'])('Seekoin', folder)
+        write_rows(converter.raw_file_name, row_count, 'first')
+        results = {}
+        with timed('first build', results):
+            converter.run()
+        tagpack_stat = os.stat(converter.tagpack_file_name)
+        with timed('unchanged', results):
+            converter.run()
+        write_rows(converter.raw_file_name, row_count, 'first')
+        with timed('downloaded again', results):
+            converter.run()
+        assert os.stat(converter.tagpack_file_name).st_mtime_ns == tagpack_stat.st_mtime_ns, 'The TagPack was rebuilt'
+        write_rows(converter.raw_file_name, row_count, 'changed')
+        with timed('changed', results):
+            converter.run()
+        assert os.stat(converter.tagpack_file_name).st_mtime_ns != tagpack_stat.st_mtime_ns, 'The TagPack was reused'
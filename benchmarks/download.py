@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Download a file from a local stub HTTP server with tagpack_converters.download, and check that unchanged files are not
+transferred again, that an interrupted download leaves the previous file untouched and is resumed, and that a file
+changed meanwhile is downloaded again in full.
+
+Usage: python3 download.py [megabytes]
+
+The file has at least 2 MB, so that the interrupted downloads receive a whole chunk of download_file first.
+
+The server answers with ETag and Last-Modified validators, supports conditional and Range requests, and can drop the
+connection halfway through a response.
+"""
+import os
+import sys
+import hashlib
+import tempfile
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import timed
+from tagpack_converters.download import CHUNK_SIZE, DOWNLOADED, NOT_MODIFIED, RESUMED, download_file
+
+# Bytes sent before an interruption: download_file writes whole chunks, so that the bytes of the chunk the connection
+# drops in are lost, whatever the size of the file
+INTERRUPT_AFTER = CHUNK_SIZE + CHUNK_SIZE // 2
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.content = b''
+        self.etag = None
+        self.last_modified = None
+        self.drop_after = None  # Bytes of the next response sent before dropping the connection
+        self.sent = 0
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{port}/data.csv'.format(port=self.server_address[1])
+
+    def publish(self, content: bytes, version: int):
+        self.content = content
+        self.etag = '"{digest}"'.format(digest=hashlib.sha256(content).hexdigest()[:16])
+        self.last_modified = formatdate(1600000000 + version, usegmt=True)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.send_header('ETag', server.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range') in (server.etag, server.last_modified):
+            start = int(range_header[len('bytes='):].rstrip('-'))
+            if start >= len(server.content):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        body = server.content[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', 'bytes {start}-{end}/{length}'.format(
+                start=start, end=len(server.content) - 1, length=len(server.content)))
+        self.send_header('ETag', server.etag)
+        self.send_header('Last-Modified', server.last_modified)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if server.drop_after is not None:
+            body, server.drop_after = body[:server.drop_after], None
+            self.close_connection = True
+        self.wfile.write(body)
+        server.sent += len(body)
+
+
+def content_of(size: int, version: int) -> bytes:
+    line = 'address,version,{version}\n'.format(version=version).encode()
+    return (line * (size // len(line) + 1))[:size]
+
+
+def read(fn: str) -> bytes:
+    with open(fn, 'rb') as in_file:
+        return in_file.read()
+
+
+if __name__ == '__main__':
+    size = max(int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) >= 2 else 64 * 1024 * 1024, 2 * CHUNK_SIZE)
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = os.path.join(tmp_dir, 'data.csv')
+        server.publish(content_of(size, 1), 1)
+        with timed('first download', results):
+            assert download_file(server.url, fn) == DOWNLOADED
+        assert read(fn) == server.content
+
+        server.sent = 0
+        with timed('unchanged', results):
+            assert download_file(server.url, fn) == NOT_MODIFIED
+        assert server.sent == 0, 'An unchanged file was transferred again'
+
+        server.publish(content_of(size, 2), 2)
+        server.drop_after = INTERRUPT_AFTER
+        try:
+            download_file(server.url, fn)
+        except Exception as error:
+            print('Interrupted as expected: {error}'.format(error=type(error).__name__))
+        else:
+            raise AssertionError('The interrupted download succeeded')
+        assert read(fn) == content_of(size, 1), 'The interrupted download replaced the file'
+        received = os.path.getsize(fn + '.part')
+        print('Received {received} of {size} bytes before the interruption'.format(received=received, size=size))
+
+        server.sent = 0
+        with timed('resumed', results):
+            assert download_file(server.url, fn) == RESUMED
+        assert read(fn) == server.content
+        assert received and server.sent == size - received, 'The download was not resumed where it stopped'
+
+        server.publish(content_of(size, 3), 3)
+        server.drop_after = INTERRUPT_AFTER
+        try:
+            download_file(server.url, fn)
+        except Exception:
+            pass
+        server.publish(content_of(size, 4), 4)
+        with timed('changed while interrupted', results):
+            assert download_file(server.url, fn) == DOWNLOADED
+        assert read(fn) == server.content
+        assert not os.path.exists(fn + '.part')
+    server.shutdown()
+    print('All checks passed')
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Compare loading a synthetic EtherScamDB scams.yaml with pure-Python `yaml.safe_load`, as the converter did, with
+libyaml, and with the parse cache cold (parsing and writing the cache) and warm (reading the cache). Then change the
+file and check that the cache is invalidated.
+
+Usage: python3 etherscamdb_loading.py [scale]
+
+The synthetic file holds `scale` times the entries of the current scams.yaml.
+"""
+import os
+import sys
+import random
+import tempfile
+
+import yaml
+
+from utils import timed
+from tagpack_converters.yaml_cache import CACHE_SUFFIX, SafeLoader, load_yaml_cached
+
+# Roughly the current size of the database
+ENTRY_COUNT = 7000
+CATEGORIES = ['Phishing', 'Scamming', 'Fake ICO', 'Scam']
+REPORTERS = ['MyCrypto', 'MetaMask', 'CryptoScamDB', 'https://twitter.com/sniko_']
+
+
+def write_scams(fn: str, scale: int):
+    rnd = random.Random(42)
+    entries = []
+    for index in range(ENTRY_COUNT * scale):
+        name = 'myetherwallet-{index}.com'.format(index=index)
+        entries.append({
+            'id': index,
+            'name': name,
+            'url': 'http://{name}'.format(name=name),
+            'category': rnd.choice(CATEGORIES),
+            'subcategory': 'MyEtherWallet',
+            'description': 'Fake MyEtherWallet site asking for private keys, reported {count} times'.format(
+                count=rnd.randrange(1, 50)),
+            'addresses': ['0x' + ''.join(rnd.choices('0123456789abcdef', k=40)) for _ in range(rnd.randrange(0, 3))],
+            'reporter': rnd.choice(REPORTERS),
+            'coin': 'ETH'
+        })
+    with open(fn, 'w', encoding='utf-8') as scams_file:
+        yaml.dump(entries, scams_file, sort_keys=False, Dumper=getattr(yaml, 'CDumper', yaml.Dumper))
+
+
+if __name__ == '__main__':
+    scale = int(sys.argv[1]) if len(sys.argv) >= 2 else 1
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = os.path.join(tmp_dir, 'etherscamdb_raw.yaml')
+        write_scams(fn, scale)
+        print('{size:.1f} MB of YAML, loaded with {loader}'.format(
+            size=os.path.getsize(fn) / 1024 ** 2, loader=SafeLoader.__name__))
+        results = {}
+        with timed('yaml.safe_load', results):
+            with open(fn, 'r') as fin:
+                expected = yaml.safe_load(fin.read())
+        with timed('libyaml', results):
+            with open(fn, 'rb') as fin:
+                assert yaml.load(fin, Loader=SafeLoader) == expected
+        with timed('cold cache', results):
+            assert load_yaml_cached(fn) == expected
+        with timed('warm cache', results):
+            assert load_yaml_cached(fn) == expected
+        print('Cache of {size:.1f} MB, warm load {speedup:.0f} times faster than yaml.safe_load'.format(
+            size=os.path.getsize(fn + CACHE_SUFFIX) / 1024 ** 2,
+            speedup=results['yaml.safe_load'] / results['warm cache']))
+        # Same size and modification time, different content
+        stat = os.stat(fn)
+        with open(fn, 'r+b') as scams_file:
+            scams_file.seek(stat.st_size - 4)
+            scams_file.write(b'BTC\n')
+        os.utime(fn, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        with timed('changed file', results):
+            assert load_yaml_cached(fn)[-1]['coin'] == 'BTC', 'The cache was not invalidated'
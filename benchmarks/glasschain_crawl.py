@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Crawl a synthetic GlassChain site served by a local stub HTTP server with a random latency per request, once with a
+single connection, i.e. one request at a time as the crawl used to run, and once with the default connection pool of
+tagpack_converters.crawl, and check that both write the same raw data.
+
+Usage: python3 glasschain_crawl.py [provider_count] [wallets_per_provider] [latency_ms]
+
+Both scripts of the GlassChain folder are crawled: the one reading the first page of addresses of each wallet, and the
+large one asking the wallet API for the address count first.
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils import load_converter, timed
+
+ADDRESSES_PER_WALLET = 20
+BECH32_DIGITS = str.maketrans('0123456789', 'qpzry9x8gf')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(random.uniform(0, 2 * self.server.latency))
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/providers':
+            body = self.providers_page()
+        elif url.path.startswith('/provider/'):
+            body = self.provider_page(int(url.path.split('/')[-1]))
+        elif url.path == '/addresses':
+            body = self.addresses_page(int(query['ref'][0]), int(query['page'][0]))
+        elif url.path == '/kpi':
+            body = json.dumps({'data': [{'DSP_INT_WALLET_ADDRESSES': ADDRESSES_PER_WALLET}]})
+        else:
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def providers_page(self) -> str:
+        rows = ''.join('<tr><td><a href="/provider/{index}">Provider {index}</a></td><td>Crypto Exchanges</td>'
+                       '<td><span>{count}</span></td></tr>'.format(index=index, count=index % 5 and 1)
+                       for index in range(self.server.provider_count))
+        return '<html><main><table>{rows}</table></main></html>'.format(rows=rows)
+
+    def provider_page(self, provider: int) -> str:
+        rows = ''.join('<tr><td><a href="/wallet/btc/{id}">{id}</a></td><td><b>Wallet {id}</b>'
+                       '<label>2022-01-0{day} by Glasschain</label></td></tr>'.format(
+                           id=provider * 1000 + index, day=index % 9 + 1)
+                       for index in range(self.server.wallets_per_provider))
+        return '<html><main><table><tr><th>Wallet</th></tr>{rows}</table></main></html>'.format(rows=rows)
+
+    @staticmethod
+    def addresses_page(wallet: int, page: int) -> str:
+        if page > 0:
+            return '<html></html>'
+        # Bech32 addresses, spelling the digits with characters of the bech32 alphabet
+        return ''.join('<a>bc1q{digits}</a>'.format(digits='{wallet:019d}{index:019d}'.format(
+            wallet=wallet, index=index).translate(BECH32_DIGITS)) for index in range(ADDRESSES_PER_WALLET))
+
+
+def crawl(module, url: str, fn: str, max_connections: int) -> bytes:
+    raw_data = module.RawData(fn, url, max_connections=max_connections)
+    raw_data.download()
+    with open(fn, 'rb') as json_file:
+        return json_file.read()
+
+
+if __name__ == '__main__':
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.provider_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 20
+    server.wallets_per_provider = int(sys.argv[2]) if len(sys.argv) >= 3 else 10
+    server.latency = (float(sys.argv[3]) if len(sys.argv) >= 4 else 20) / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = 'http://127.0.0.1:{port}'.format(port=server.server_address[1])
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for script in ('generateTagPack.py', 'generateTagPack-large.py'):
+            module = load_converter('GlassChain', script)
+            module.NOT_FOUND_URL = base_url + '/404'
+            module.ADDRESSES_URL = base_url + '/addresses?ref={wallet_id}&page={index}&paging={paging}'
+            module.WALLET_KPI_URL = base_url + '/kpi?walletid={wallet_id}'
+            fn = os.path.join(tmp_dir, 'glasschain.json')
+            with timed('{script}, one request at a time'.format(script=script), results):
+                sequential = crawl(module, base_url + '/providers', fn, max_connections=1)
+            with timed('{script}, concurrent'.format(script=script), results):
+                concurrent = crawl(module, base_url + '/providers', fn, max_connections=module.MAX_CONNECTIONS)
+            assert concurrent == sequential, 'The concurrent crawl wrote different raw data'
+            data = json.loads(concurrent)
+            assert all(len(wallet['addresses']) == ADDRESSES_PER_WALLET
+                       for provider in data.values() for wallet in provider['wallets'])
+            print('{script}: {speedup:.1f} times faster, {count} wallets'.format(
+                script=script, count=sum(len(provider['wallets']) for provider in data.values()),
+                speedup=results['{script}, one request at a time'.format(script=script)] /
+                results['{script}, concurrent'.format(script=script)]))
+    server.shutdown()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compare the OFAC converter parsing the whole SDN list at once with the streaming parser on a synthetic sdnlist.txt,
+and with the incremental parser of the same list in the advanced sanctions XML format.
+
+Usage: python3 ofac_parser.py [scale]
+
+The synthetic list holds `scale` times the entries of the current list; the default of 100 takes several minutes,
+mostly in the quadratic duplicate check of the whole-text parser. Each parser runs in a process of its own, so that
+the peak resident memory can be told apart.
+"""
+import os
+import sys
+import random
+import resource
+import tempfile
+import textwrap
+from xml.sax.saxutils import escape
+import multiprocessing
+
+from typing import List, Tuple
+
+from utils import load_converter, timed
+
+# Roughly the current size of the list
+ENTRY_COUNT = 18000
+ADDRESS_ENTRY_SHARE = 0.03
+BASE58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+XML_FEATURE_TYPES = {'XBT': 344, 'ETH': 345}
+
+
+def random_entry(rnd: random.Random, index: int) -> Tuple[List[str], List[Tuple[str, str]]]:
+    fields = ['NAME{index}, Firstname (a.k.a. ALIAS{index})'.format(index=index),
+              'DOB {day:02d} Jan 19{year:02d}'.format(day=rnd.randrange(1, 29), year=rnd.randrange(100)),
+              'nationality Country{country}'.format(country=rnd.randrange(200)),
+              'Passport {number}'.format(number=rnd.randrange(10 ** 9))]
+    addresses = []
+    if rnd.random() < ADDRESS_ENTRY_SHARE:
+        for _ in range(rnd.randrange(1, 4)):
+            if rnd.random() < 0.5:
+                addresses.append(('XBT', '1' + ''.join(rnd.choices(BASE58, k=33))))
+            else:
+                addresses.append(('ETH', '0x' + ''.join(rnd.choices('0123456789abcdef', k=40))))
+    return fields, addresses
+
+
+def format_text_entry(fields: List[str], addresses: List[Tuple[str, str]]) -> str:
+    fields = fields + ['{alt}Digital Currency Address - {code} {address}'.format(
+        alt='alt. ' if index else '', code=asset_code, address=address)
+        for index, (asset_code, address) in enumerate(addresses)]
+    text = '; '.join(fields) + ' [SDGT].'
+    return '\n'.join(textwrap.wrap(text, width=80)) + '\n\n'
+
+
+def format_xml_entry(index: int, fields: List[str], addresses: List[Tuple[str, str]]) -> str:
+    features = ''.join(
+        '<Feature ID="{index}{number}" FeatureTypeID="{type_id}"><FeatureVersion ReliabilityID="1">'
+        '<VersionDetail DetailTypeID="1432">{address}</VersionDetail></FeatureVersion></Feature>'.format(
+            index=index, number=number, type_id=XML_FEATURE_TYPES[asset_code], address=address)
+        for number, (asset_code, address) in enumerate(addresses))
+    names = ''.join('<Comment>{field}</Comment>'.format(field=escape(field)) for field in fields)
+    return '<DistinctParty FixedRef="{index}"><Profile ID="{index}" PartySubTypeID="4"><Identity>{names}</Identity>' \
+           '{features}</Profile></DistinctParty>\n'.format(index=index, names=names, features=features)
+
+
+def write_sdn_lists(text_fn: str, xml_fn: str, scale: int):
+    rnd = random.Random(42)
+    with open(text_fn, 'w', encoding='utf-8') as text_file, open(xml_fn, 'w', encoding='utf-8') as xml_file:
+        xml_file.write('<?xml version="1.0" encoding="utf-8"?>\n<Sanctions xmlns="http://www.un.org/sanctions/1.0">'
+                       '<ReferenceValueSets><FeatureTypeValues>')
+        for asset_code, type_id in XML_FEATURE_TYPES.items():
+            xml_file.write('<FeatureType ID="{type_id}">Digital Currency Address - {code}</FeatureType>'.format(
+                type_id=type_id, code=asset_code))
+        xml_file.write('</FeatureTypeValues></ReferenceValueSets><DistinctParties>\n')
+        for index in range(ENTRY_COUNT * scale):
+            fields, addresses = random_entry(rnd, index)
+            text_file.write(format_text_entry(fields, addresses))
+            xml_file.write(format_xml_entry(index, fields, addresses))
+        xml_file.write('</DistinctParties></Sanctions>\n')
+
+
+def add_details_whole_text(convert, raw_data):
+    """
+    The parser of the OFAC converter before it streamed its input.
+    """
+    tags = []
+    lines = raw_data.replace("\n", " ").split(";")
+    for line in lines:
+        if "Digital Currency Address" in line:
+            splitted = line.lstrip().replace("alt. ", "").split(" ")
+            (address, assetCode) = (splitted[5], splitted[4])
+            isAddressRegistered = False
+            for tag in tags:
+                if address == tag["address"]:
+                    isAddressRegistered = True
+                    break
+            if isAddressRegistered:
+                continue
+            tags += [convert.add_tag(address, assetCode)]
+    return tags
+
+
+def run_parser(fn: str, mode: str):
+    converter = load_converter('OFAC Specially Designated Nationals')
+    if mode == 'xml':
+        with open(fn, 'rb') as sdn_file:
+            tags = converter.Convert.add_details_xml(sdn_file)
+    else:
+        with open(fn, 'r', encoding='utf-8') as sdn_file:
+            if mode == 'streaming':
+                tags = converter.Convert.add_details(iter(lambda: sdn_file.read(converter.CHUNK_SIZE), ''))
+            else:
+                tags = add_details_whole_text(converter.Convert, sdn_file.read())
+    return len(tags), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if __name__ == '__main__':
+    scale = int(sys.argv[1]) if len(sys.argv) >= 2 else 100
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_fn, xml_fn = os.path.join(tmp_dir, 'sdnlist.txt'), os.path.join(tmp_dir, 'sdn_advanced.xml')
+        write_sdn_lists(text_fn, xml_fn, scale)
+        results = {}
+        for name, fn, mode in (('whole text', text_fn, 'whole'), ('streaming text', text_fn, 'streaming'),
+                               ('advanced XML', xml_fn, 'xml')):
+            size = os.path.getsize(fn) / 1024 ** 2
+            with context.Pool(1) as pool, timed(name, results):
+                tag_count, max_rss = pool.apply(run_parser, (fn, mode))
+            print('{tags} tags from {size:.1f} MB at {throughput:.1f} MB/s, peak RSS {rss:.0f} MB'.format(
+                tags=tag_count, size=size, throughput=size / results[name], rss=max_rss / 1024))
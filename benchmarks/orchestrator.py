@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compare running simulated converters one after another, as when running the scripts one by one, with running their
+stages under the orchestrator of tagpack_converters.runner, and check that the per-host limit holds.
+
+Usage: python3 orchestrator.py [time_scale]
+
+The simulated converters sleep instead of downloading, generating and saving, for the seconds of SIMULATED_STAGES
+times `time_scale` (default 0.05): two long crawls of the same site, two light downloads of another site, and a few
+independent ones.
+"""
+import sys
+import time
+import threading
+from collections import Counter
+
+from utils import timed
+from tagpack_converters.converter import Converter
+from tagpack_converters.runner import format_summary, run_converters
+
+# Seconds of the download, generate and save stages, and the host of the download
+SIMULATED_STAGES = {
+    'CrawlA': (60, 2, 2, 'crawl.example'),
+    'CrawlB': (40, 2, 1, 'crawl.example'),
+    'LightA': (3, 1, 1, 'api.example'),
+    'LightB': (3, 1, 1, 'api.example'),
+    'LightC': (2, 5, 2, 'files.example'),
+    'LightD': (4, 1, 1, 'other.example')
+}
+MAX_TASKS_PER_HOST = 1
+
+
+class SimulatedConverter(Converter):
+
+    def __init__(self, name: str, seconds: tuple, host: str, time_scale: float, load: Counter, lock: threading.Lock):
+        super().__init__(name, name)
+        self.seconds = [value * time_scale for value in seconds]
+        self.host = host
+        self.load = load
+        self.lock = lock
+
+    def hosts(self, stage: str):
+        return {self.host} if stage == 'download' else set()
+
+    def build_inputs(self):
+        return None  # Always generate
+
+    def download(self):
+        with self.lock:
+            self.load[self.host] += 1
+            assert self.load[self.host] <= MAX_TASKS_PER_HOST, 'Too many downloads from {host}'.format(host=self.host)
+        time.sleep(self.seconds[0])
+        with self.lock:
+            self.load[self.host] -= 1
+
+    def generate(self):
+        time.sleep(self.seconds[1])
+        return self.name
+
+    def save(self, generator):
+        assert generator == self.name
+        time.sleep(self.seconds[2])
+
+    def run(self):
+        self.download()
+        self.save(self.generate())
+
+
+if __name__ == '__main__':
+    time_scale = float(sys.argv[1]) if len(sys.argv) >= 2 else 0.05
+    load, lock = Counter(), threading.Lock()
+    converters = [SimulatedConverter(name, stages[:3], stages[3], time_scale, load, lock)
+                  for name, stages in SIMULATED_STAGES.items()]
+    results = {}
+    with timed('one after another', results):
+        for converter in converters:
+            converter.run()
+    with timed('orchestrated', results):
+        tasks = run_converters(converters, max_tasks=8, max_tasks_per_host=MAX_TASKS_PER_HOST)
+    print(format_summary(tasks))
+    assert all(task.status == 'ok' for task in tasks)
+    print('Orchestrated run {speedup:.1f} times faster'.format(
+        speedup=results['one after another'] / results['orchestrated']))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Check the TagEmitter against `yaml.dump` on golden tags, then compare their throughput and write a TagPack of many
+tags with the TagPackWriter.
+
+Usage: python3 tagpack_emitter.py [tag_count]
+
+`yaml.dump` only serialises a sample of 100000 tags, as it takes about half a millisecond per tag. The default of
+10000000 tags makes a TagPack file of about 1.7 GB, which is written to a temporary folder.
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+
+import yaml
+
+from utils import timed
+from tagpack_converters.tagpack import TagEmitter, save_tagpack
+from tagpack_writer import HEADER, synthetic_tags
+
+SAMPLE_SIZE = 100000
+# Tags whose values PyYAML writes plain, quoted or folded, or which the template leaves to libyaml
+GOLDEN_TAGS = [
+    {'address': '1BoatSLRHtKNngkdXEeobR76b53LETtpyT', 'currency': 'BTC', 'label': 'User satoshi at BitcoinTalk forum',
+     'source': 'https://bitcointalk.org/index.php?action=profile;u=3', 'lastmod': date(2022, 1, 31)},
+    {'address': '0x52908400098527886E0F7030069857D2E4169EE7', 'currency': 'ETH', 'is_cluster_definer': True,
+     'category': 'exchange', 'abuse': 'scam'},
+    {'address': 't1XyzBeNVdBzMhdD8Y4zKMnC6oAERpfnf5B', 'label': 'Ransomware: Locky', 'lastmod': None},
+    {'address': 'bitcoincash:qpm2qsznhks23z7629mms6s4cwef74vcwvy22gdx6a', 'currency': 'BCH'},
+    {'address': '1234567890', 'label': 'yes', 'source': 'null', 'category': '2021-01-01', 'abuse': '~'},
+    {'address': '0x1f', 'label': '1e3', 'source': '.inf', 'category': '<<', 'abuse': '='},
+    {'address': '', 'label': ' leading space', 'source': 'trailing space ', 'category': 'colon:', 'abuse': 'a: b'},
+    {'address': '#comment', 'label': 'not a # comment', 'source': '- dash', 'category': '? question', 'abuse': '...'},
+    {'address': "it's", 'label': '"quoted"', 'source': '[flow]', 'category': '{flow}', 'abuse': '@at'},
+    {'address': 'a', 'label': 'line\nbreak', 'source': 'tab\there', 'category': 'back\\slash', 'abuse': '%percent'},
+    {'address': 'b', 'label': 'Scam at ' + 'a very long label ' * 6, 'source': 'x' * 120},
+    {'address': 'c', 'label': 'Seized by NBCTF of Israel (order ID: 1234), address of a wallet at an exchange'},
+    {'address': 'd', 'label': 'Seized by NBCTF of Israel (order ID: 1234), address of a wallet at an exchanges'},
+    {'address': 'e', 'label': 'Usér ünicode € at BitcoinTalk forum', 'source': '\U0001f600', 'category': '\ufeff'},
+    {'address': 'f', 'lastmod': datetime(2020, 1, 2, 3, 4, 5), 'is_cluster_definer': False, 'category': 5},
+    {'address': 'g', 'confidence': 'web_crawl', 'label': ['not', 'a', 'string']},
+    {}
+]
+
+
+def check_golden_tags():
+    for allow_unicode in (False, True):
+        emitter = TagEmitter(allow_unicode=allow_unicode)
+        for tag in GOLDEN_TAGS:
+            expected = yaml.dump([tag], sort_keys=False, allow_unicode=allow_unicode)
+            emitted = emitter.emit([tag])
+            assert yaml.safe_load(emitted) == [tag], 'The emitted tag does not load to {tag}'.format(tag=tag)
+            if all(emitter.format_scalar(field, value) is not None for field, value in tag.items()):
+                assert emitted == expected, 'The emitted tag differs from yaml.dump: {tag}'.format(tag=tag)
+    print('{count} golden tags are equivalent to yaml.dump'.format(count=len(GOLDEN_TAGS)))
+
+
+if __name__ == '__main__':
+    tag_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 10000000
+    check_golden_tags()
+    sample = list(synthetic_tags(min(SAMPLE_SIZE, tag_count)))
+    results = {}
+    with timed('yaml.dump', results):
+        expected = yaml.dump(sample, sort_keys=False)
+    with timed('TagEmitter', results):
+        emitted = TagEmitter().emit(sample)
+    assert emitted == expected, 'The emitted tags differ from yaml.dump'
+    for name in results:
+        print('{name}: {throughput:.0f} tags/s'.format(name=name, throughput=len(sample) / results[name]))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = os.path.join(tmp_dir, 'tagpack.yaml')
+        with timed('TagPackWriter', results):
+            save_tagpack(fn, HEADER, synthetic_tags(tag_count))
+        print('{tags} tags at {throughput:.0f} tags/s, {size:.0f} MB'.format(
+            tags=tag_count, throughput=tag_count / results['TagPackWriter'], size=os.path.getsize(fn) / 1024 ** 2))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare writing a TagPack with `yaml.dump` of the whole document, as the converters did, with the streaming
+TagPackWriter, and check that both files are identical.
+
+Usage: python3 tagpack_writer.py [tag_count]
+
+Each writer runs in a process of its own, so that the peak resident memory can be told apart.
+"""
+import os
+import sys
+import filecmp
+import resource
+import tempfile
+import multiprocessing
+from datetime import date
+from typing import Iterator
+
+import yaml
+
+from utils import timed
+from tagpack_converters.tagpack import save_tagpack
+
+HEADER = {
+    'title': 'Benchmark TagPack',
+    'creator': 'Benchmark',
+    'description': 'Synthetic tags of BitcoinTalk users',
+    'lastmod': date(2022, 1, 1),
+    'category': 'user'
+}
+
+
+def synthetic_tags(tag_count: int) -> Iterator[dict]:
+    for index in range(tag_count):
+        yield {
+            'address': '1Tag{index:030d}'.format(index=index),
+            'currency': 'BTC',
+            'label': 'User user{index} at BitcoinTalk forum'.format(index=index),
+            'source': 'https://bitcointalk.org/index.php?action=profile;u={index}'.format(index=index)
+        }
+
+
+def run_writer(fn: str, tag_count: int, mode: str):
+    if mode == 'streaming':
+        save_tagpack(fn, HEADER, synthetic_tags(tag_count))
+    else:
+        data = dict(HEADER, tags=list(synthetic_tags(tag_count)))
+        with open(fn, 'w', encoding='utf-8') as f:
+            f.write(yaml.dump(data, sort_keys=False))
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if __name__ == '__main__':
+    tag_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 1000000
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = {}
+        fns = {}
+        for name, mode in (('whole document', 'whole'), ('streaming', 'streaming')):
+            fns[mode] = os.path.join(tmp_dir, '{mode}.yaml'.format(mode=mode))
+            with context.Pool(1) as pool, timed(name, results):
+                max_rss = pool.apply(run_writer, (fns[mode], tag_count, mode))
+            print('{tags} tags at {throughput:.0f} tags/s, peak RSS {rss:.0f} MB'.format(
+                tags=tag_count, throughput=tag_count / results[name], rss=max_rss / 1024))
+        assert filecmp.cmp(fns['whole'], fns['streaming'], shallow=False), 'The TagPack files differ'
@@ -0,0 +1,32 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import os
+import sys
+import time
+import importlib.util
+from contextlib import contextmanager
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT_DIR)
+
+
+def load_converter(folder: str, script: str = 'generateTagPack.py'):
+    """
+    Import the converter script of a sub-folder, whose name is not a valid module name. The module is registered in
+    sys.modules, so that worker processes can unpickle its functions.
+    """
+    path = os.path.join(ROOT_DIR, folder, script)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(script)[0].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextmanager
+def timed(name: str, results: dict):
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+    print('{name}: {seconds:.3f} s'.format(name=name, seconds=results[name]))
@@ -0,0 +1,3 @@
+"""
+Code shared by the TagPack converters in the sub-folders of this repository.
+"""
@@ -0,0 +1,49 @@
+"""
+Run the converters of this repository from one process.
+
+Usage: python3 -m tagpack_converters list
+       python3 -m tagpack_converters run [--jobs JOBS] [--per-host PER_HOST] [--rebuild] (--all | NAME [NAME ...])
+"""
+import sys
+import logging
+import argparse
+
+from .runner import MAX_TASKS, MAX_TASKS_PER_HOST, converter_results, format_summary, run_converters
+from .sources import CONVERTERS, select_converters
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python3 -m tagpack_converters',
+                                     description='Run the TagPack converters of this repository from one process.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='list the converters')
+    run_parser = commands.add_parser('run', help='run converters')
+    run_parser.add_argument('names', nargs='*', metavar='NAME', help='converters to run, see list')
+    run_parser.add_argument('--all', action='store_true', help='run all converters but the optional ones')
+    run_parser.add_argument('--jobs', type=int, default=MAX_TASKS,
+                            help='stages running at the same time (default: {jobs})'.format(jobs=MAX_TASKS))
+    run_parser.add_argument('--per-host', type=int, default=MAX_TASKS_PER_HOST,
+                            help='stages sending requests to the same host at the same time (default: {jobs})'.format(
+                                jobs=MAX_TASKS_PER_HOST))
+    run_parser.add_argument('--rebuild', action='store_true', help='generate the TagPacks even if they are up to date')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for converter in CONVERTERS:
+            print('{name:<18}{folder}{optional}'.format(name=converter.name, folder=converter.folder,
+                                                      optional='' if converter.in_all else '  (optional)'))
+        return 0
+    if args.all == bool(args.names):
+        parser.error('give either --all or the names of the converters to run')
+    try:
+        converters = select_converters(args.names)
+    except ValueError as error:
+        parser.error(str(error))
+    logging.basicConfig(format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s', level=logging.INFO)
+    tasks = run_converters(converters, args.jobs, args.per_host, args.rebuild)
+    print(format_summary(tasks))
+    return 0 if all(converter_results(tasks).values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
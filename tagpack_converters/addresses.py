@@ -0,0 +1,110 @@
+"""
+Find cryptocurrency addresses in free text and classify single addresses by their currency.
+"""
+import re
+import math
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Pattern, Tuple
+
+from .checksums import base58_decode, has_base58_checksum, is_valid_cashaddr, is_valid_eip55, is_valid_segwit_address
+
+# Currencies recognised by classify_address
+CURRENCIES = ('BTC', 'BCH', 'LTC', 'ZEC', 'ETH', 'USDT')
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+# Base58 digits needed at most for a byte
+BASE58_DIGITS_PER_BYTE = math.log(256, 58)
+
+
+class AddressScanner:
+    """
+    Extract addresses of several currencies from a text with a single pass over it.
+
+    Running every pattern of a `REGEX` list with `finditer` scans a text once per currency. The scanner instead looks
+    for candidate positions once, i.e. the beginnings of word runs long enough to hold an address, and only tries the
+    currency patterns anchored at those positions. This requires every pattern to start with `\\b` followed by a word
+    character, which holds for the `REGEX` list of the BitcoinTalk converter. The matches are the very same ones the
+    `finditer` calls would return, in the same order.
+    """
+    # Beginnings of runs of at least 11 word characters (the shortest address is a bech32 one of 11 characters)
+    # and of the 'bchtest:' prefix, which precedes a shorter run
+    CANDIDATE_REGEX = re.compile(r'\b(?:\w{11,}|bchtest:)')
+    MIN_LENGTH = 11
+
+    def __init__(self, regex: List[Tuple[str, Pattern]]):
+        self.regex = regex
+        self.currency_order = {currency: index for index, (currency, _) in enumerate(regex)}
+
+    def finditer(self, text: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (currency, address) pairs of the text in the order of their positions.
+        """
+        last_ends = [0] * len(self.regex)
+        for candidate in self.CANDIDATE_REGEX.finditer(text):
+            position = candidate.start()
+            for index, (currency, address_pattern) in enumerate(self.regex):
+                if position < last_ends[index]:
+                    continue  # Inside a previous match of this currency, like finditer does
+                match = address_pattern.match(text, position)
+                if match is not None:
+                    last_ends[index] = match.end()
+                    yield currency, match.group(0)
+
+    def extract(self, values) -> Dict[str, str]:
+        """
+        Map each address found in the given string values to the currency it was first matched with.
+        """
+        addresses = {}
+        for value in values:
+            if type(value) != str or len(value) < self.MIN_LENGTH:
+                continue
+            found = list(self.finditer(value))
+            if not found:
+                continue
+            # Within a value, addresses of an earlier currency in the `REGEX` list take precedence
+            found.sort(key=lambda currency_address: self.currency_order[currency_address[0]])
+            for currency, address in found:
+                if address not in addresses:
+                    addresses[address] = currency
+        return addresses
+
+
+def has_base58check_version(address: str, versions: Tuple[bytes, ...], payload_length: int) -> bool:
+    """
+    Check the length and version of a Base58Check address before its checksum, which takes two SHA-256 digests.
+    """
+    raw_length = payload_length + 4
+    if len(address) > math.ceil(raw_length * BASE58_DIGITS_PER_BYTE):
+        return False
+    raw = base58_decode(address)
+    return raw is not None and len(raw) == raw_length and raw.startswith(versions) and has_base58_checksum(raw)
+
+
+@lru_cache(maxsize=65536)
+def classify_address(address: str) -> Optional[str]:
+    """
+    Return the currency of an address, or None if it is not a valid address of the CURRENCIES.
+
+    The leading characters select the candidate currency, whose checksum then confirms it. Legacy Bitcoin Cash
+    addresses are identical to Bitcoin ones and hence classified as BTC.
+
+    Unlike a REGEX fullmatch, this validates checksums, and thus costs a few times as much for an address seen for the
+    first time, mostly to decode Base58 and hash it twice. Repeated addresses are answered from the cache.
+    """
+    if address.startswith(('bitcoincash:', 'bchtest:')) or (len(address) == 42 and address[0] in 'qp'):
+        return 'BCH' if is_valid_cashaddr(address) else None
+    if address[:3].lower() == 'bc1':
+        return 'BTC' if is_valid_segwit_address('bc', address) else None
+    if address[:4].lower() == 'ltc1':
+        return 'LTC' if is_valid_segwit_address('ltc', address) else None
+    if (len(address) == 42 and address.startswith('0x')) or len(address) == 40:
+        hex_address = address[-40:]
+        return 'ETH' if HEX_DIGITS.issuperset(hex_address) and is_valid_eip55(hex_address) else None
+    if address[:1] in ('1', '3'):
+        return 'BTC' if has_base58check_version(address, (b'\x00', b'\x05'), 21) else None
+    if address[:1] in ('L', 'M'):
+        return 'LTC' if has_base58check_version(address, (b'\x30', b'\x32'), 21) else None
+    if address[:2] in ('t1', 't3'):
+        return 'ZEC' if has_base58check_version(address, (b'\x1c\xb8', b'\x1c\xbd'), 22) else None
+    if address[:1] == 'T':
+        return 'USDT' if has_base58check_version(address, (b'\x41',), 21) else None
+    return None
@@ -0,0 +1,41 @@
+"""
+Walk the files of an archive of saved pages, a directory or a tarball, without holding the list of its files.
+"""
+import os
+import tarfile
+from typing import Iterator, Optional, Tuple
+
+
+def walk_files(path: str) -> Iterator[str]:
+    """
+    Yield the paths of the regular files under a directory, reading each directory as it goes rather than listing
+    them all first, so that directories of millions of files are walked in constant memory.
+    """
+    directories = [path]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            subdirectories = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
+        # Depth first, the subdirectories in the order of their names
+        directories.extend(sorted(subdirectories, reverse=True))
+
+
+def archive_files(path: str) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Yield the name and content of each file of a tarball, possibly compressed, read as a stream, or the path of each
+    file under a directory with None as content, which is left to be read by whoever processes the file.
+    """
+    if os.path.isdir(path):
+        for fn in walk_files(path):
+            yield fn, None
+        return
+    with tarfile.open(path, 'r|*') as tar_file:
+        for member in tar_file:
+            if member.isfile():
+                yield member.name, tar_file.extractfile(member).read()
+            # The tar file keeps a list of the members read, which would grow with every file
+            tar_file.members = []
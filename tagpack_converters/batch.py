@@ -0,0 +1,402 @@
+"""
+Classify whole columns of addresses at once with NumPy.
+"""
+import hashlib
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+from .checksums import BASE58_ALPHABET, BECH32_ALPHABET, BECH32_CONST, BECH32M_CONST
+
+# Longer strings are no address of the currencies known to classify_address (bech32 addresses have at most 90)
+MAX_ADDRESS_LENGTH = 90
+NO_CURRENCY = ''
+CHUNK_SIZE = 1000000
+
+
+def alphabet_table(alphabet: str) -> np.ndarray:
+    """
+    Return a lookup table telling for each code point up to 127 (and 128 standing for any larger one) whether it
+    belongs to the alphabet. Code point 0 is the padding of fixed-width arrays and counts as a member.
+    """
+    table = np.zeros(129, dtype=bool)
+    table[[ord(char) for char in alphabet]] = True
+    table[0] = True
+    return table
+
+
+BASE58_TABLE = alphabet_table(BASE58_ALPHABET)
+HEX_TABLE = alphabet_table('0123456789abcdefABCDEF')
+LOWERCASE_TABLE = np.zeros(129, dtype=bool)
+LOWERCASE_TABLE[ord('a'):ord('z') + 1] = True
+UPPERCASE_TABLE = np.zeros(129, dtype=bool)
+UPPERCASE_TABLE[ord('A'):ord('Z') + 1] = True
+LOWERCASE_HEX_TABLE = np.zeros(129, dtype=bool)
+LOWERCASE_HEX_TABLE[[ord(char) for char in 'abcdef']] = True
+UPPERCASE_HEX_TABLE = np.zeros(129, dtype=bool)
+UPPERCASE_HEX_TABLE[[ord(char) for char in 'ABCDEF']] = True
+# Code points with ASCII letters lowercased, as str.lower does
+TO_LOWERCASE = np.arange(129, dtype=np.uint8)
+TO_LOWERCASE[UPPERCASE_TABLE] += 32
+# The value of each lowercase bech32 and CashAddr character, 255 for other code points
+BECH32_VALUES = np.full(129, 255, dtype=np.uint8)
+BECH32_VALUES[[ord(char) for char in BECH32_ALPHABET]] = np.arange(32, dtype=np.uint8)
+BASE58_DIGITS = np.zeros(129, dtype=np.uint8)
+BASE58_DIGITS[[ord(char) for char in BASE58_ALPHABET]] = np.arange(58, dtype=np.uint8)
+# Enough base-256 limbs for the largest Base58 number of BASE58_MAX_LENGTH characters
+BASE58_MAX_LENGTH = 36
+BASE58_LIMBS = 28
+BASE58_GROUP_WEIGHTS = [np.uint64(58 ** 3), np.uint64(58 ** 2), np.uint64(58), np.uint64(1)]
+# Leading characters, raw byte length and allowed version prefixes of the Base58Check addresses of classify_address
+BASE58CHECK_FORMATS = [
+    ('BTC', ('1', '3'), 25, (b'\x00', b'\x05')),
+    ('LTC', ('L', 'M'), 25, (b'\x30', b'\x32')),
+    ('ZEC', ('t1', 't3'), 26, (b'\x1c\xb8', b'\x1c\xbd')),
+    ('USDT', ('T',), 25, (b'\x41',))
+]
+# Human-readable parts of the segwit addresses of classify_address
+SEGWIT_FORMATS = [('BTC', 'bc'), ('LTC', 'ltc')]
+# Leading characters and prefix of the CashAddr addresses of classify_address; bare ones have 42 characters
+CASHADDR_FORMATS = [('bitcoincash:', 'bitcoincash'), ('bchtest:', 'bchtest'), ('', 'bitcoincash')]
+BECH32_GENERATOR = [np.uint64(value) for value in (0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3)]
+CASHADDR_GENERATOR = [np.uint64(value) for value in (0x98f2bc8e61, 0x79b76d99e2, 0xf33e5fb3c4, 0xae2eabe2a8,
+                                                      0x1e4f43e470)]
+# An odd multiplier of the row hashes of unique_rows, 2 ** 64 divided by the golden ratio
+ROW_HASH_MULTIPLIER = np.uint64(0x9e3779b97f4a7c15)
+KECCAK_RATE = 136
+KECCAK_ROUND_CONSTANTS = [np.uint64(value) for value in (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808a, 0x8000000080008000,
+    0x000000000000808b, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008a, 0x0000000000000088, 0x0000000080008009, 0x000000008000000a,
+    0x000000008000808b, 0x800000000000008b, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800a, 0x800000008000000a,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008)]
+KECCAK_ROTATIONS = [
+    [0, 36, 3, 41, 18], [1, 44, 10, 45, 2], [62, 6, 43, 15, 61], [28, 55, 25, 21, 56], [27, 20, 39, 8, 14]
+]
+
+
+def to_code_points(addresses: np.ndarray) -> np.ndarray:
+    """
+    View a fixed-width byte or unicode array as a matrix of code points, clipped to 128.
+    """
+    if addresses.dtype.kind == 'S':
+        codes = np.ascontiguousarray(addresses).view(np.uint8).reshape(len(addresses), -1)
+    else:
+        codes = np.ascontiguousarray(addresses).view(np.uint32).reshape(len(addresses), -1)
+    return np.minimum(codes, 128).astype(np.uint8)
+
+
+def unique_rows(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the distinct rows of a matrix of code points, and the index of the distinct row of every row.
+
+    Sorting the rows as a whole is slow, so the rows are hashed to 64 bits, eight code points at a time, and the
+    hashes deduplicated with np.unique. Only if two distinct rows share a hash are the rows themselves sorted.
+    """
+    used = np.flatnonzero(codes.any(axis=0))
+    width = -(-(used[-1] + 1 if len(used) else 0) // 8) * 8
+    padded = np.zeros((len(codes), width), dtype=np.uint8)
+    padded[:, :min(width, codes.shape[1])] = codes[:, :width]
+    words = padded.view(np.uint64)
+    hashes = np.zeros(len(codes), dtype=np.uint64)
+    for column in words.T:
+        hashes = (hashes ^ column) * ROW_HASH_MULTIPLIER
+        hashes ^= hashes >> np.uint64(32)
+    _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    if not all(np.array_equal(column[first][inverse], column) for column in words.T):
+        rows = padded.view(np.dtype((np.void, width))).ravel()
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+    return codes[first], inverse
+
+
+def starts_with(codes: np.ndarray, prefix: str) -> np.ndarray:
+    mask = np.ones(len(codes), dtype=bool)
+    for index, char in enumerate(prefix):
+        mask &= codes[:, index] == ord(char)
+    return mask
+
+
+def starts_with_any(codes: np.ndarray, prefixes: Tuple[str, ...]) -> np.ndarray:
+    mask = np.zeros(len(codes), dtype=bool)
+    for prefix in prefixes:
+        mask |= starts_with(codes, prefix)
+    return mask
+
+
+def decode_base58_rows(codes: np.ndarray, lengths: np.ndarray, raw_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode Base58 rows of code points into raw byte rows of the given length, and tell which rows have that length.
+
+    The digits are right-aligned, so that leading zero digits take the place of the padding, and combined into groups
+    of four, i.e. base 58 ** 4 digits. The big numbers are kept as rows of base-256 limbs, of which the least
+    significant one is the last. Horner's scheme runs over the digit groups of all addresses at once, only multiplies
+    the limbs the number may already occupy, and normalises carries every other group, as the unnormalised limbs do
+    not overflow 64 bits in between.
+    """
+    width = codes.shape[1]
+    # Negative positions wrap around to the padding behind the address, whose digit is zero
+    positions = (np.arange(width) - (width - lengths)[:, None]) % width
+    digits = np.take_along_axis(BASE58_DIGITS[codes], positions, axis=1).reshape(len(codes), -1, 4)
+    groups = np.zeros((digits.shape[1], len(codes)), dtype=np.uint64)
+    for weight, digit in zip(BASE58_GROUP_WEIGHTS, np.moveaxis(digits, 2, 0)):
+        groups += weight * digit.T.astype(np.uint64)
+    limbs = np.zeros((BASE58_LIMBS, len(codes)), dtype=np.uint64)
+    for index, group in enumerate(groups):
+        used_limbs = min(BASE58_LIMBS, 3 * (index + 1) + 1)  # 58 ** 4 < 256 ** 3
+        limbs[-used_limbs:] *= np.uint64(58 ** 4)
+        limbs[-1] += group
+        if index % 2 == 1:
+            normalise_limbs(limbs[-used_limbs:])
+    normalise_limbs(limbs)
+    not_one = codes != ord('1')
+    leading_ones = np.where(not_one.any(axis=1), not_one.argmax(axis=1), width)
+    nonzero = limbs != 0
+    significant = np.where(nonzero.any(axis=0), BASE58_LIMBS - nonzero.argmax(axis=0), 0)
+    return limbs[-raw_length:].T.astype(np.uint8), leading_ones + significant == raw_length
+
+
+def normalise_limbs(limbs: np.ndarray):
+    for index in range(len(limbs) - 1, 0, -1):
+        limbs[index - 1] += limbs[index] >> np.uint64(8)
+        limbs[index] &= np.uint64(0xff)
+
+
+def valid_base58check_rows(raw: np.ndarray) -> np.ndarray:
+    """
+    Check the double SHA-256 checksum of raw byte rows, which hashlib computes row by row.
+    """
+    payload_length = raw.shape[1] - 4
+    payloads = np.ascontiguousarray(raw[:, :payload_length]).tobytes()
+    sha256 = hashlib.sha256
+    checksums = b''.join(sha256(sha256(payloads[start:start + payload_length]).digest()).digest()[:4]
+                         for start in range(0, len(payloads), payload_length))
+    return (np.frombuffer(checksums, dtype=np.uint8).reshape(len(raw), 4) == raw[:, payload_length:]).all(axis=1)
+
+
+def classify_base58check(codes: np.ndarray, lengths: np.ndarray, currencies: np.ndarray, rows: np.ndarray):
+    """
+    Classify the given rows, which hold Base58 strings of plausible length, like classify_address does.
+    """
+    for currency, prefixes, raw_length, versions in BASE58CHECK_FORMATS:
+        selected = rows[starts_with_any(codes[rows], prefixes)]
+        if len(selected) == 0:
+            continue
+        raw, length_ok = decode_base58_rows(codes[selected, :BASE58_MAX_LENGTH], lengths[selected], raw_length)
+        version_ok = np.zeros(len(selected), dtype=bool)
+        for version in versions:
+            version_ok |= (raw[:, :len(version)] == np.frombuffer(version, dtype=np.uint8)).all(axis=1)
+        plausible = np.flatnonzero(length_ok & version_ok)
+        valid = valid_base58check_rows(raw[plausible])
+        currencies[selected[plausible[valid]]] = currency
+
+
+def keccak_f_rows(state: List[List[np.ndarray]]):
+    """
+    The Keccak-f[1600] permutation of checksums.keccak_f, on the lanes of every row at once.
+    """
+    for round_constant in KECCAK_ROUND_CONSTANTS:
+        c = [state[x][0] ^ state[x][1] ^ state[x][2] ^ state[x][3] ^ state[x][4] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ rotate_lanes(c[(x + 1) % 5], 1) for x in range(5)]
+        for x in range(5):
+            for y in range(5):
+                state[x][y] = state[x][y] ^ d[x]
+        b = [[None] * 5 for _ in range(5)]
+        for x in range(5):
+            for y in range(5):
+                b[y][(2 * x + 3 * y) % 5] = rotate_lanes(state[x][y], KECCAK_ROTATIONS[x][y])
+        for x in range(5):
+            for y in range(5):
+                state[x][y] = b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y])
+        state[0][0] = state[0][0] ^ round_constant
+
+
+def rotate_lanes(lanes: np.ndarray, rotation: int) -> np.ndarray:
+    if rotation == 0:
+        return lanes
+    return (lanes << np.uint64(rotation)) | (lanes >> np.uint64(64 - rotation))
+
+
+def keccak256_rows(data: np.ndarray) -> np.ndarray:
+    """
+    Return the Keccak-256 digest of every row of bytes shorter than a block, as rows of 32 bytes.
+    """
+    padded = np.zeros((len(data), KECCAK_RATE), dtype=np.uint8)
+    padded[:, :data.shape[1]] = data
+    padded[:, data.shape[1]] = 0x01
+    padded[:, -1] |= 0x80
+    lanes = padded.view('<u8').astype(np.uint64)
+    state = [[np.zeros(len(data), dtype=np.uint64) for _ in range(5)] for _ in range(5)]
+    for index in range(KECCAK_RATE // 8):
+        state[index % 5][index // 5] = lanes[:, index].copy()
+    keccak_f_rows(state)
+    digest = np.stack([state[index][0] for index in range(4)], axis=1).astype('<u8')
+    return digest.view(np.uint8).reshape(len(data), 32)
+
+
+def valid_eip55_rows(hex_codes: np.ndarray) -> np.ndarray:
+    """
+    Check the mixed-case checksum of rows of 40 hexadecimal digits, like checksums.is_valid_eip55.
+    """
+    digest = keccak256_rows(TO_LOWERCASE[hex_codes])
+    nibbles = np.stack([digest >> 4, digest & 0x0f], axis=2).reshape(len(hex_codes), 64)[:, :40]
+    letters = LOWERCASE_HEX_TABLE[hex_codes] | UPPERCASE_HEX_TABLE[hex_codes]
+    return ~(letters & (UPPERCASE_HEX_TABLE[hex_codes] != (nibbles >= 8))).any(axis=1)
+
+
+def classify_ethereum(codes: np.ndarray, lengths: np.ndarray, currencies: np.ndarray, rows: np.ndarray):
+    """
+    Classify the given rows, which hold 40 hexadecimal digits with or without '0x'. Rows with mixed case need a
+    valid EIP-55 checksum.
+    """
+    hex_codes = np.where((lengths[rows] == 42)[:, None], codes[rows, 2:42], codes[rows, :40])
+    mixed_case = UPPERCASE_HEX_TABLE[hex_codes].any(axis=1) & LOWERCASE_HEX_TABLE[hex_codes].any(axis=1)
+    valid = ~mixed_case
+    valid[mixed_case] = valid_eip55_rows(hex_codes[mixed_case])
+    currencies[rows[valid]] = 'ETH'
+
+
+def polymod_rows(checksums: np.ndarray, values: np.ndarray, active: np.ndarray, shift: int,
+                 generator: List[np.uint64]) -> np.ndarray:
+    """
+    Feed one value per row into the bech32 (shift 25) or CashAddr (shift 35) checksums of the active rows.
+    """
+    top = checksums >> np.uint64(shift)
+    updated = ((checksums & np.uint64((1 << shift) - 1)) << np.uint64(5)) ^ values.astype(np.uint64)
+    for index, coefficient in enumerate(generator):
+        updated ^= ((top >> np.uint64(index)) & np.uint64(1)) * coefficient
+    return np.where(active, updated, checksums)
+
+
+def bech32_values(codes: np.ndarray, lengths: np.ndarray, start: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the values of the characters of the rows from `start` on, the number of those characters, and whether the
+    rows have no mixed case and only bech32 characters there.
+    """
+    mixed_case = LOWERCASE_TABLE[codes].any(axis=1) & UPPERCASE_TABLE[codes].any(axis=1)
+    values = BECH32_VALUES[TO_LOWERCASE[codes[:, start:]]]
+    value_counts = lengths - start
+    in_address = np.arange(values.shape[1]) < value_counts[:, None]
+    valid = ~mixed_case & ((values != 255) | ~in_address).all(axis=1)
+    return np.where(in_address, values, 0), value_counts, valid
+
+
+def valid_segwit_rows(codes: np.ndarray, lengths: np.ndarray, hrp: str) -> np.ndarray:
+    """
+    Check rows starting with the human-readable part and '1' in any case, like checksums.is_valid_segwit_address.
+    The bech32 alphabet has no '1', so that the separator of a valid row follows the human-readable part.
+    """
+    data, data_lengths, valid = bech32_values(codes, lengths, len(hrp) + 1)
+    valid &= (lengths <= MAX_ADDRESS_LENGTH) & (data_lengths >= 7)
+    checksums = np.ones(len(codes), dtype=np.uint64)
+    always = np.ones(len(codes), dtype=bool)
+    for value in [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]:
+        checksums = polymod_rows(checksums, np.full(len(codes), value), always, 25, BECH32_GENERATOR)
+    for index in range(int(data_lengths[valid].max(initial=0))):
+        checksums = polymod_rows(checksums, data[:, index], index < data_lengths, 25, BECH32_GENERATOR)
+    witness_versions = data[:, 0]
+    valid &= (witness_versions <= 16) & (checksums == np.where(witness_versions == 0, BECH32_CONST, BECH32M_CONST))
+    # The witness program, converted from 5-bit to 8-bit groups, must have zero padding bits
+    program_bits = (data_lengths - 7) * 5
+    program_lengths = program_bits // 8
+    valid &= (program_bits % 8 < 5) & (program_lengths >= 2) & (program_lengths <= 40)
+    valid &= (witness_versions != 0) | (program_lengths == 20) | (program_lengths == 32)
+    return valid
+
+
+def valid_cashaddr_rows(codes: np.ndarray, lengths: np.ndarray, start: int, prefix: str) -> np.ndarray:
+    """
+    Check rows whose CashAddr payload starts at `start`, with the given prefix, like checksums.is_valid_cashaddr.
+    A payload with a ':' of its own is rejected, rather than taking the part before it as the prefix.
+    """
+    payload, payload_lengths, valid = bech32_values(codes, lengths, start)
+    valid &= payload_lengths >= 9
+    checksums = np.ones(len(codes), dtype=np.uint64)
+    always = np.ones(len(codes), dtype=bool)
+    for value in [ord(char) & 31 for char in prefix] + [0]:
+        checksums = polymod_rows(checksums, np.full(len(codes), value), always, 35, CASHADDR_GENERATOR)
+    for index in range(int(payload_lengths[valid].max(initial=0))):
+        checksums = polymod_rows(checksums, payload[:, index], index < payload_lengths, 35, CASHADDR_GENERATOR)
+    return valid & (checksums == 1)
+
+
+def candidate_masks(codes: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray],
+                                                                     List[np.ndarray]]:
+    """
+    Select the rows that may be valid addresses, a superset of those classify_address recognises. Return the masks
+    of Base58 strings, of Ethereum-like hexadecimal strings, of the SEGWIT_FORMATS and of the CASHADDR_FORMATS.
+
+    The cheap masks on length and leading characters come first, the alphabets are only checked on the rows left.
+    """
+    first = codes[:, 0]
+    # CashAddr addresses of BCH, then bech32 addresses of BTC and LTC; their leading characters take precedence in
+    # classify_address, e.g. for 40 hexadecimal digits starting with 'bc1'
+    cashaddr = [starts_with(codes, leading) for leading, _ in CASHADDR_FORMATS[:-1]]
+    cashaddr.append((lengths == 42) & np.isin(first, [ord('q'), ord('p')]) & ~cashaddr[0] & ~cashaddr[1])
+    taken = cashaddr[0] | cashaddr[1] | cashaddr[2]
+    lower = TO_LOWERCASE[codes[:, :4]]
+    segwit = []
+    for _, hrp in SEGWIT_FORMATS:
+        segwit.append(starts_with(lower, hrp + '1') & ~taken)
+        taken |= segwit[-1]
+    # Base58Check addresses of BTC, LTC, ZEC and USDT
+    base58 = (lengths >= 25) & (lengths <= BASE58_MAX_LENGTH) & ~taken
+    base58 &= np.isin(first, [ord('1'), ord('3'), ord('L'), ord('M'), ord('T')]) | (
+        (first == ord('t')) & np.isin(codes[:, 1], [ord('1'), ord('3')]))
+    rows = np.flatnonzero(base58)
+    base58[rows] = BASE58_TABLE[codes[rows, :BASE58_MAX_LENGTH]].all(axis=1)
+    # Ethereum addresses, with or without 0x
+    ethereum = ((lengths == 40) | ((lengths == 42) & starts_with(codes, '0x'))) & ~taken
+    rows = np.flatnonzero(ethereum)
+    offsets = np.where(lengths[rows] == 42, 2, 0)[:, None]
+    ethereum[rows] = HEX_TABLE[np.take_along_axis(codes[rows, :42], offsets + np.arange(40), axis=1)].all(axis=1)
+    return base58, ethereum, segwit, cashaddr
+
+
+def classify_codes(codes: np.ndarray) -> np.ndarray:
+    currencies = np.full(len(codes), NO_CURRENCY, dtype='U4')
+    if codes.shape[1] < MAX_ADDRESS_LENGTH + 1:  # Pad, so that column slicing never runs out of the matrix
+        codes = np.pad(codes, ((0, 0), (0, MAX_ADDRESS_LENGTH + 1 - codes.shape[1])))
+    codes = codes[:, :MAX_ADDRESS_LENGTH + 1]
+    lengths = np.count_nonzero(codes, axis=1)
+    short_enough = lengths <= MAX_ADDRESS_LENGTH
+    base58, ethereum, segwit, cashaddr = candidate_masks(codes, lengths)
+    classify_base58check(codes, lengths, currencies, np.flatnonzero(base58 & short_enough))
+    classify_ethereum(codes, lengths, currencies, np.flatnonzero(ethereum & short_enough))
+    for (currency, hrp), mask in zip(SEGWIT_FORMATS, segwit):
+        rows = np.flatnonzero(mask & short_enough)
+        currencies[rows[valid_segwit_rows(codes[rows], lengths[rows], hrp)]] = currency
+    for (leading, prefix), mask in zip(CASHADDR_FORMATS, cashaddr):
+        rows = np.flatnonzero(mask & short_enough)
+        currencies[rows[valid_cashaddr_rows(codes[rows], lengths[rows], len(leading), prefix)]] = 'BCH'
+    return currencies
+
+
+def classify_addresses(addresses: Union[np.ndarray, Sequence[str]]) -> np.ndarray:
+    """
+    Return the currency code of every address of a column, or an empty string where classify_address finds none.
+
+    The column is a fixed-width byte or unicode NumPy array or a sequence of strings. Each distinct address is
+    classified once: strings are deduplicated before they are converted to an array, arrays by unique_rows. Masks on
+    the length, the leading characters and the alphabet rule out most non-addresses, and the checksums are validated
+    on all candidates at once, but for the double SHA-256 of Base58Check addresses, which hashlib computes address by
+    address. Long columns are processed in chunks to bound the memory of the masks.
+    """
+    inverse = None
+    if not isinstance(addresses, np.ndarray):
+        distinct = dict.fromkeys(addresses)
+        positions = dict(zip(distinct, range(len(distinct))))
+        inverse = np.fromiter(map(positions.__getitem__, addresses), dtype=np.intp, count=len(addresses))
+        addresses = np.array(list(distinct), dtype='U{width}'.format(width=MAX_ADDRESS_LENGTH + 1))
+    chunks = []
+    for start in range(0, len(addresses), CHUNK_SIZE):
+        codes = to_code_points(addresses[start:start + CHUNK_SIZE])
+        if inverse is None:
+            codes, chunk_inverse = unique_rows(codes)
+            chunks.append(classify_codes(codes)[chunk_inverse])
+        else:
+            chunks.append(classify_codes(codes))
+    currencies = np.concatenate(chunks) if chunks else np.full(0, NO_CURRENCY, dtype='U4')
+    return currencies if inverse is None else currencies[inverse]
@@ -0,0 +1,127 @@
+"""
+Skip regenerating a TagPack whose inputs have not changed since it was last built.
+"""
+import os
+import json
+import glob
+import hashlib
+from typing import Dict, List
+
+CHUNK_SIZE = 1024 * 1024
+# Changing the layout of the cache invalidates the caches written before
+CACHE_VERSION = 1
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_digest(fn: str) -> str:
+    digest = hashlib.sha256()
+    with open(fn, 'rb') as in_file:
+        for chunk in iter(lambda: in_file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stat(fn: str) -> dict:
+    stat = os.stat(fn)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def code_files() -> List[str]:
+    """
+    The code shared by the converters, which the TagPacks depend on as much as on the code of the converters.
+    """
+    return sorted(glob.glob(os.path.join(PACKAGE_DIR, '*.py')))
+
+
+class BuildCache:
+    """
+    The record of the last build of a converter, in a JSON file: the SHA-256 digests of its input files, i.e. its raw
+    data, configuration and code, and the size and modification time of the TagPack files it wrote.
+
+    The TagPack is up to date as long as the digests of the inputs and the output files are the same. The digest of an
+    input is only computed again if its size or modification time changed since it was recorded, so that checking
+    unchanged sources takes no more than a few stat calls.
+    """
+
+    def __init__(self, fn: str):
+        self.fn = fn
+        self.record = self.load()
+        # The digests of the inputs when last checked, i.e. of the inputs a build starting then reads
+        self.checked_inputs = None
+
+    def load(self) -> dict:
+        try:
+            with open(self.fn, 'r', encoding='utf-8') as cache_file:
+                record = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(record, dict) or record.get('version') != CACHE_VERSION:
+            return {}
+        return record
+
+    def digests(self, inputs: List[str]) -> Dict[str, dict]:
+        """
+        Return the digest, size and modification time of each input file, reusing the recorded digests of unchanged
+        files.
+        """
+        recorded = self.record.get('inputs', {})
+        digests = {}
+        for fn in inputs + code_files():
+            stat = file_stat(fn)
+            entry = recorded.get(fn)
+            if entry is not None and all(entry.get(key) == value for key, value in stat.items()):
+                digests[fn] = entry
+            else:
+                digests[fn] = dict(stat, sha256=file_digest(fn))
+        return digests
+
+    def up_to_date(self, inputs: List[str], outputs: List[str]) -> bool:
+        try:
+            digests = self.checked_inputs = self.digests(inputs)
+        except OSError:
+            self.checked_inputs = None
+            return False
+        if not self.record:
+            return False
+        recorded = self.record.get('inputs', {})
+        if set(digests) != set(recorded):
+            return False
+        if any(digests[fn]['sha256'] != recorded[fn].get('sha256') for fn in digests):
+            return False
+        recorded_outputs = self.record.get('outputs', {})
+        if sorted(recorded_outputs) != sorted(outputs):
+            return False
+        for fn in outputs:
+            try:
+                if file_stat(fn) != recorded_outputs[fn]:
+                    return False
+            except OSError:
+                return False
+        if digests != recorded:  # Same content with a new modification time, e.g. after a download
+            self.record['inputs'] = digests
+            self.write()
+        return True
+
+    def save(self, inputs: List[str], outputs: List[str]):
+        """
+        Record a build, after the outputs were written from the inputs as they were when last checked.
+        """
+        self.record = {
+            'version': CACHE_VERSION,
+            'inputs': self.checked_inputs if self.checked_inputs is not None else self.digests(inputs),
+            'outputs': {fn: file_stat(fn) for fn in outputs}
+        }
+        self.write()
+
+    def write(self):
+        # Write to a temporary file first, so that an interrupted run never leaves a truncated record behind
+        tmp_fn = '{fn}.{pid}.tmp'.format(fn=self.fn, pid=os.getpid())
+        with open(tmp_fn, 'w', encoding='utf-8') as cache_file:
+            json.dump(self.record, cache_file, indent=1)
+        os.replace(tmp_fn, self.fn)
+
+    def clear(self):
+        self.record = {}
+        if os.path.exists(self.fn):
+            os.remove(self.fn)
+
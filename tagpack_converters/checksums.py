@@ -0,0 +1,192 @@
+"""
+Checksum validation of cryptocurrency address encodings: Base58Check, bech32/bech32m, CashAddr and EIP-55.
+"""
+import hashlib
+from typing import List, Optional
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+# The digit of each byte of a Base58 string, 255 for bytes outside the alphabet
+BASE58_DIGITS = bytes(BASE58_ALPHABET.find(chr(code)) % 256 for code in range(256))
+BECH32_ALPHABET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+BECH32_INDEX = {char: index for index, char in enumerate(BECH32_ALPHABET)}
+BECH32_CONST = 1
+BECH32M_CONST = 0x2bc830a3
+
+
+def base58_decode(address: str) -> Optional[bytes]:
+    """
+    Return the bytes a Base58 string encodes, or None if it has characters outside the alphabet.
+    """
+    digits = address.encode('latin-1', 'replace').translate(BASE58_DIGITS)
+    if 255 in digits:
+        return None
+    number = 0
+    for digit in digits:
+        number = number * 58 + digit
+    leading_zeros = len(address) - len(address.lstrip('1'))
+    return b'\x00' * leading_zeros + number.to_bytes((number.bit_length() + 7) // 8, 'big')
+
+
+def has_base58_checksum(raw: bytes) -> bool:
+    return len(raw) >= 5 and hashlib.sha256(hashlib.sha256(raw[:-4]).digest()).digest()[:4] == raw[-4:]
+
+
+def base58check_decode(address: str) -> Optional[bytes]:
+    """
+    Return the payload (version and hash) of a Base58Check string, or None if it is not valid Base58Check.
+    """
+    raw = base58_decode(address)
+    if raw is None or not has_base58_checksum(raw):
+        return None
+    return raw[:-4]
+
+
+def bech32_polymod(values: List[int]) -> int:
+    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    checksum = 1
+    for value in values:
+        top = checksum >> 25
+        checksum = (checksum & 0x1ffffff) << 5 ^ value
+        for index in range(5):
+            if (top >> index) & 1:
+                checksum ^= generator[index]
+    return checksum
+
+
+def is_valid_segwit_address(hrp: str, address: str) -> bool:
+    """
+    Check a segregated witness address (BIP 173 for witness version 0, BIP 350 for later versions).
+    """
+    if address.lower() != address and address.upper() != address:
+        return False  # Mixed case is not allowed
+    address = address.lower()
+    separator = address.rfind('1')
+    if address[:separator] != hrp or len(address) > 90 or len(address) - separator - 1 < 7:
+        return False
+    data = []
+    for char in address[separator + 1:]:
+        if char not in BECH32_INDEX:
+            return False
+        data.append(BECH32_INDEX[char])
+    hrp_values = [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+    witness_version = data[0]
+    if witness_version > 16:
+        return False
+    const = BECH32_CONST if witness_version == 0 else BECH32M_CONST
+    if bech32_polymod(hrp_values + data) != const:
+        return False
+    # Convert the witness program from 5-bit to 8-bit groups, the padding must be zero bits
+    program_bits = (len(data) - 7) * 5
+    if program_bits % 8 >= 5:
+        return False
+    program_length = program_bits // 8
+    if not 2 <= program_length <= 40:
+        return False
+    if witness_version == 0 and program_length not in (20, 32):
+        return False
+    return True
+
+
+def cashaddr_polymod(values: List[int]) -> int:
+    checksum = 1
+    for value in values:
+        top = checksum >> 35
+        checksum = ((checksum & 0x07ffffffff) << 5) ^ value
+        if top & 0x01:
+            checksum ^= 0x98f2bc8e61
+        if top & 0x02:
+            checksum ^= 0x79b76d99e2
+        if top & 0x04:
+            checksum ^= 0xf33e5fb3c4
+        if top & 0x08:
+            checksum ^= 0xae2eabe2a8
+        if top & 0x10:
+            checksum ^= 0x1e4f43e470
+    return checksum ^ 1
+
+
+def is_valid_cashaddr(address: str, default_prefix: str = 'bitcoincash') -> bool:
+    """
+    Check a Bitcoin Cash CashAddr, with or without its prefix.
+    """
+    if address.lower() != address and address.upper() != address:
+        return False
+    address = address.lower()
+    prefix, separator, payload = address.rpartition(':')
+    if not separator:
+        prefix = default_prefix
+    data = []
+    for char in payload:
+        if char not in BECH32_INDEX:
+            return False
+        data.append(BECH32_INDEX[char])
+    if len(data) < 9:
+        return False
+    return cashaddr_polymod([ord(char) & 31 for char in prefix] + [0] + data) == 0
+
+
+KECCAK_ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808a, 0x8000000080008000,
+    0x000000000000808b, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008a, 0x0000000000000088, 0x0000000080008009, 0x000000008000000a,
+    0x000000008000808b, 0x800000000000008b, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800a, 0x800000008000000a,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008
+]
+KECCAK_ROTATIONS = [
+    [0, 36, 3, 41, 18], [1, 44, 10, 45, 2], [62, 6, 43, 15, 61], [28, 55, 25, 21, 56], [27, 20, 39, 8, 14]
+]
+MASK_64 = (1 << 64) - 1
+
+
+def keccak_f(state: List[List[int]]):
+    for round_constant in KECCAK_ROUND_CONSTANTS:
+        # Theta
+        c = [state[x][0] ^ state[x][1] ^ state[x][2] ^ state[x][3] ^ state[x][4] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ ((c[(x + 1) % 5] << 1 | c[(x + 1) % 5] >> 63) & MASK_64) for x in range(5)]
+        for x in range(5):
+            for y in range(5):
+                state[x][y] ^= d[x]
+        # Rho and pi
+        b = [[0] * 5 for _ in range(5)]
+        for x in range(5):
+            for y in range(5):
+                lane, rotation = state[x][y], KECCAK_ROTATIONS[x][y]
+                b[y][(2 * x + 3 * y) % 5] = (lane << rotation | lane >> (64 - rotation)) & MASK_64
+        # Chi
+        for x in range(5):
+            for y in range(5):
+                state[x][y] = b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y])
+        # Iota
+        state[0][0] ^= round_constant
+
+
+def keccak256(data: bytes) -> bytes:
+    """
+    Keccak-256 as used by Ethereum, which differs from the standardised SHA3-256 of hashlib by its padding.
+    """
+    rate = 136
+    padded = bytearray(data) + b'\x01' + b'\x00' * (rate - 1 - len(data) % rate)
+    padded[-1] |= 0x80
+    state = [[0] * 5 for _ in range(5)]
+    for offset in range(0, len(padded), rate):
+        block = padded[offset:offset + rate]
+        for index in range(rate // 8):
+            state[index % 5][index // 5] ^= int.from_bytes(block[8 * index:8 * index + 8], 'little')
+        keccak_f(state)
+    return b''.join(state[index % 5][index // 5].to_bytes(8, 'little') for index in range(4))
+
+
+def is_valid_eip55(hex_address: str) -> bool:
+    """
+    Check the mixed-case checksum of an Ethereum address given as 40 hexadecimal digits without '0x'.
+
+    All-lowercase and all-uppercase addresses carry no checksum and are accepted.
+    """
+    if hex_address.lower() == hex_address or hex_address.upper() == hex_address:
+        return True
+    digest = keccak256(hex_address.lower().encode('ascii')).hex()
+    for char, nibble in zip(hex_address, digest):
+        if char.isalpha() and char.isupper() != (int(nibble, 16) >= 8):
+            return False
+    return True
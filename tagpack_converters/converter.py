@@ -0,0 +1,168 @@
+"""
+Run the converter scripts of the sub-folders as objects, so that several of them can run in one process.
+"""
+import os
+import re
+import sys
+import logging
+import importlib.util
+from datetime import datetime
+from types import ModuleType
+from typing import List, Optional, Set
+from urllib.parse import urlparse
+
+import yaml
+
+from .build_cache import BuildCache
+from .export import output_file_names, output_options
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+
+class Converter:
+    """
+    The converter of a sub-folder, i.e. its script and configuration, run in the stages of the script's main block:
+    download the raw data unless it exists, read it into the TagPackGenerator of the script, and save the TagPack.
+    Converters whose script downloads conditionally revalidate existing raw data instead. Generating and saving are
+    skipped while the TagPack is up to date with the raw data, configuration and code.
+
+    Unlike the main block, the converter takes the file names of the configuration relative to its folder, so that it
+    does not depend on the current directory. Subclasses adapt the stages to scripts that differ from the common one.
+    """
+    config_file_name = 'config.yaml'
+    # Configuration entry of the URL passed to the RawData of the script
+    url_key = 'URL'
+    # Whether existing raw data is downloaded again, which the download of the script only does if it changed
+    revalidate = False
+
+    def __init__(self, name: str, folder: str, script: str = 'generateTagPack.py', in_all: bool = True,
+                 raw_data_of: Optional[str] = None):
+        self.name = name
+        self.folder = os.path.join(ROOT_DIR, folder)
+        self.script = script
+        # Whether the converter runs with all others, or only when named
+        self.in_all = in_all
+        # The converter downloading the raw data this one reads too, if any
+        self.raw_data_of = raw_data_of
+        self._config = None
+        self._module = None
+        self._build_cache = None
+
+    def __repr__(self):
+        return '{cls}({name})'.format(cls=type(self).__name__, name=self.name)
+
+    def path(self, fn: str) -> str:
+        return os.path.join(self.folder, fn)
+
+    def load_config(self) -> dict:
+        with open(self.path(self.config_file_name), 'r') as config_file:
+            return yaml.safe_load(config_file)
+
+    @property
+    def config(self) -> dict:
+        if self._config is None:
+            self._config = self.load_config()
+        return self._config
+
+    @property
+    def module(self) -> ModuleType:
+        """
+        The script, imported on first use under a module name of its own, as the scripts of all folders share a file
+        name. The module is registered in sys.modules, so that worker processes can unpickle its functions.
+        """
+        if self._module is None:
+            module_name = 'tagpack_converter_{name}'.format(name=re.sub(r'\W', '_', self.name))
+            spec = importlib.util.spec_from_file_location(module_name, self.path(self.script))
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                del sys.modules[module_name]
+                raise
+            self._module = module
+        return self._module
+
+    @property
+    def raw_file_name(self) -> str:
+        return self.path(self.config['RAW_FILE_NAME'])
+
+    @property
+    def tagpack_file_name(self) -> str:
+        return self.path(self.config['TAGPACK_FILE_NAME'])
+
+    def raw_data(self):
+        return self.module.RawData(self.raw_file_name, self.config[self.url_key])
+
+    def last_mod(self):
+        return datetime.fromtimestamp(os.path.getmtime(self.raw_file_name)).date()
+
+    def hosts(self, stage: str) -> Set[str]:
+        """
+        Return the hosts the given stage sends requests to, whose concurrent requests the orchestrator limits.
+        """
+        if stage != 'download':
+            return set()
+        urls = self.config[self.url_key]
+        if isinstance(urls, str):
+            urls = [urls]
+        return {urlparse(url).hostname for url in urls}
+
+    def download(self):
+        if self.revalidate or not os.path.exists(self.raw_file_name):
+            self.raw_data().download()
+
+    def generate(self):
+        """
+        Read the raw data into the TagPackGenerator of the script, which generates the tags once saved.
+        """
+        config = self.config
+        return self.module.TagPackGenerator(self.raw_data().read(), config['TITLE'], config['CREATOR'],
+                                            config['DESCRIPTION'], self.last_mod(), config['SOURCE'])
+
+    def save(self, generator):
+        generator.saveYaml(self.tagpack_file_name, **output_options(self.config))
+
+    def build_inputs(self) -> Optional[List[str]]:
+        """
+        Return the files the TagPack is built from, or None if the converter cannot tell, e.g. as it streams its raw
+        data.
+        """
+        return [self.raw_file_name, self.path(self.config_file_name), self.path(self.script)]
+
+    def build_outputs(self) -> Optional[List[str]]:
+        """
+        Return the files of the TagPack, or None if the converter cannot tell before generating it.
+        """
+        return output_file_names(self.tagpack_file_name, **output_options(self.config))
+
+    @property
+    def build_cache(self) -> BuildCache:
+        if self._build_cache is None:
+            self._build_cache = BuildCache(self.path('.{name}.build.json'.format(name=self.name)))
+        return self._build_cache
+
+    def up_to_date(self) -> bool:
+        inputs = self.build_inputs()
+        outputs = self.build_outputs() if inputs is not None else None
+        if outputs is None:
+            return False
+        return self.build_cache.up_to_date(inputs, outputs)
+
+    def record_build(self):
+        inputs = self.build_inputs()
+        outputs = self.build_outputs() if inputs is not None else None
+        if outputs is None:
+            return
+        try:
+            self.build_cache.save(inputs, outputs)
+        except OSError as error:
+            logging.warning('Cannot record the build of {name}: {error}'.format(name=self.name, error=error))
+
+    def run(self, rebuild: bool = False):
+        self.download()
+        if not rebuild and self.up_to_date():
+            logging.info('{name} is up to date'.format(name=self.name))
+            return
+        self.save(self.generate())
+        self.record_build()
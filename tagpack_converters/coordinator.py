@@ -0,0 +1,196 @@
+"""
+Coordinate a crawl by workers on several hosts over HTTP: lease them ranges of IDs from a WorkQueue, and take the
+results they upload for the crawl to merge.
+"""
+import os
+import json
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import urljoin
+
+import requests
+
+from .work_queue import WorkQueue
+
+# Seconds a worker waits before asking for a range again, when the ranges left are leased to other workers
+POLL_INTERVAL = 10.0
+TIMEOUT = 60.0
+
+
+class Coordinator:
+    """
+    Lease the ranges of a WorkQueue to workers and take their results, until all ranges are done.
+
+    Subclasses add the ranges of the crawl in `add_range` when no range is left to lease, merge the results of the done
+    ranges in `merge`, and complete the crawl in `finish`. Each hook runs with the lock of the coordinator held.
+    """
+
+    def __init__(self, queue: WorkQueue):
+        self.queue = queue
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+
+    def add_range(self) -> bool:
+        """
+        Add the next range to the queue, and return whether there was one, i.e. whether the crawl goes on.
+        """
+        return False
+
+    def merge(self):
+        """
+        Process the results of the done ranges.
+        """
+
+    def finish(self):
+        """
+        Complete the crawl once all ranges are done, or the coordinator stopped, before the queue is removed.
+        """
+
+    def lease(self, worker: str) -> dict:
+        with self.lock:
+            lease = self.queue.lease(worker)
+            if lease is None and self.add_range():
+                lease = self.queue.lease(worker)
+            if lease is not None:
+                lease_id, first_id, last_id = lease
+                return {'lease': lease_id, 'first_id': first_id, 'last_id': last_id,
+                        'heartbeat': self.queue.lease_time / 3}
+            counts = self.queue.counts()
+            if not counts['pending'] and not counts['leased']:
+                self.finished.set()
+                return {'done': True}
+            return {'wait': POLL_INTERVAL}
+
+    def heartbeat(self, lease_id: str) -> bool:
+        return self.queue.heartbeat(lease_id)
+
+    def complete(self, lease_id: str, result: Any) -> bool:
+        with self.lock:
+            if self.queue.complete(lease_id, result) is None:
+                return False
+            self.merge()
+            return True
+
+    def serve(self, host: str, port: int):
+        """
+        Answer the workers over HTTP until all ranges are done, then finish the crawl and remove the queue.
+        """
+        server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+        server.daemon_threads = True
+        server.coordinator = self
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print('Coordinating {fn} on port {port}'.format(fn=self.queue.fn, port=server.server_address[1]))
+        try:
+            with self.lock:
+                self.merge()  # Ranges done before the coordinator was restarted
+            self.finished.wait()
+        finally:
+            server.shutdown()
+            server.server_close()
+            self.finish()
+        self.queue.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.queue.fn + suffix):
+                os.remove(self.queue.fn + suffix)
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """
+    The JSON API of a Coordinator: POST /lease, /heartbeat and /complete.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if coordinator.finished.is_set():
+            # Workers still connected once all ranges are done, while the queue is closed
+            response = {'done': True, 'held': False, 'accepted': False}
+        elif self.path == '/lease':
+            response = coordinator.lease(request['worker'])
+        elif self.path == '/heartbeat':
+            response = {'held': coordinator.heartbeat(request['lease'])}
+        elif self.path == '/complete':
+            response = {'accepted': coordinator.complete(request['lease'], request['result'])}
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class QueueWorker:
+    """
+    Crawl the ranges leased from a Coordinator, renewing the lease with heartbeats, and upload their results. A range
+    whose lease is lost, e.g. as the worker was paused for too long, is dropped.
+
+    Subclasses crawl a range in `crawl_range`.
+    """
+
+    def __init__(self, coordinator_url: str):
+        self.coordinator_url = coordinator_url
+        self.name = '{host}-{pid}'.format(host=socket.gethostname(), pid=os.getpid())
+        self.session = requests.Session()
+
+    def post(self, path: str, payload: dict) -> dict:
+        response = self.session.post(urljoin(self.coordinator_url, path), json=payload, timeout=TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def run(self):
+        while True:
+            try:
+                lease = self.post('lease', {'worker': self.name})
+            except requests.RequestException as error:
+                print('The coordinator at {url} is gone: {error}'.format(url=self.coordinator_url, error=error))
+                return
+            if lease.get('done'):
+                return
+            if 'wait' in lease:
+                time.sleep(lease['wait'])
+                continue
+            self.work(lease)
+
+    def crawl_range(self, first_id: int, last_id: int, held: threading.Event) -> Any:
+        """
+        Crawl the IDs from `first_id` to `last_id` and return the result to upload, which is JSON serializable. The
+        crawl may stop early once `held` is cleared, as the result is dropped then.
+        """
+        raise NotImplementedError
+
+    def work(self, lease: dict):
+        held = threading.Event()
+        held.set()
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(lease['heartbeat']):
+                try:
+                    if not self.post('heartbeat', {'lease': lease['lease']})['held']:
+                        held.clear()
+                        return
+                except requests.RequestException:
+                    pass  # Tried again with the next heartbeat, before the lease expires
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            result = self.crawl_range(lease['first_id'], lease['last_id'], held)
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+        if not held.is_set() or not self.post('complete', {'lease': lease['lease'], 'result': result})['accepted']:
+            print('Lost the lease of IDs {first} to {last}'.format(first=lease['first_id'], last=lease['last_id']))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,83 @@
+"""
+Crawl a site from asyncio tasks, overlapping the requests up to a bounded number of connections in total and per host.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+MAX_CONNECTIONS = 16
+MAX_CONNECTIONS_PER_HOST = 8
+RETRIES = 20
+TIMEOUT = 60.0
+
+
+class Crawler:
+    """
+    Send the GET requests of asyncio tasks with a requests session in a pool of threads, one per connection, and parse
+    the responses in a separate pool, so that neither blocks the event loop nor each other. Relative URLs are joined to
+    `base_url`, like the LiveServerSession of the converter scripts does.
+
+    The crawler is created and used within a running event loop, e.g. in the coroutine passed to asyncio.run.
+    """
+
+    def __init__(self, base_url: str = '', headers: Optional[dict] = None, max_connections: int = MAX_CONNECTIONS,
+                 max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST, parse_workers: int = 2,
+                 retries: int = RETRIES):
+        self.base_url = base_url
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.request_executor = ThreadPoolExecutor(max_connections, thread_name_prefix='crawl')
+        self.parse_executor = ThreadPoolExecutor(parse_workers, thread_name_prefix='parse')
+        self.connections = asyncio.Semaphore(max_connections)
+        self.host_connections = defaultdict(lambda: asyncio.Semaphore(max_connections_per_host))
+        self.request_count = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.request_executor.shutdown()
+        self.parse_executor.shutdown()
+        self.session.close()
+
+    async def get(self, url: str) -> requests.Response:
+        """
+        Return the response to a GET request, retrying on connection errors and timeouts.
+        """
+        url = urljoin(self.base_url, url)
+        loop = asyncio.get_running_loop()
+        async with self.host_connections[urlparse(url).hostname], self.connections:
+            for retry in range(self.retries):
+                try:
+                    response = await loop.run_in_executor(self.request_executor, self.fetch, url)
+                except requests.RequestException:
+                    logging.debug('Retry {retry} of {url}'.format(retry=retry + 1, url=url))
+                    continue
+                self.request_count += 1
+                return response
+        raise IOError('Too many retries of {url}'.format(url=url))
+
+    def fetch(self, url: str) -> requests.Response:
+        response = self.session.get(url, timeout=TIMEOUT)
+        response.content  # Read the body in the thread, not in the event loop
+        return response
+
+    async def parse(self, function: Callable, *args):
+        """
+        Return the result of a parser function, run in the parse pool.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, function, *args)
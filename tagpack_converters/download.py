@@ -0,0 +1,124 @@
+"""
+Download raw data over HTTP with a session shared by all converters of a process, conditionally and resumably.
+"""
+import os
+import json
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 1024 * 1024
+# Connections kept open per host, enough for the converters running at the same time
+POOL_SIZE = 16
+TIMEOUT = 60.0
+# Next to the downloaded file: the validators of its content, and the file being downloaded
+META_SUFFIX = '.download.json'
+PART_SUFFIX = '.part'
+# Results of download_file
+NOT_MODIFIED = 'not modified'
+DOWNLOADED = 'downloaded'
+RESUMED = 'resumed'
+
+session_lock = threading.Lock()
+shared_session = None
+
+
+def get_session() -> requests.Session:
+    """
+    Return the HTTP session of this process, created on first use, so that converters run one after another or in
+    parallel threads reuse the open connections to a host instead of each opening their own.
+    """
+    global shared_session
+    with session_lock:
+        if shared_session is None:
+            shared_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            shared_session.mount('http://', adapter)
+            shared_session.mount('https://', adapter)
+        return shared_session
+
+
+def read_meta(meta_fn: str) -> dict:
+    try:
+        with open(meta_fn, 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def write_meta(meta_fn: str, meta: dict):
+    tmp_fn = '{fn}.{pid}.{thread}.tmp'.format(fn=meta_fn, pid=os.getpid(), thread=threading.get_ident())
+    with open(tmp_fn, 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file, indent=1)
+    os.replace(tmp_fn, meta_fn)
+
+
+def response_validators(url: str, response: requests.Response) -> dict:
+    return {'url': url, 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+def range_validator(validators: dict):
+    """
+    Return the validator of an If-Range header, which must be a strong ETag or a modification date, or None.
+    """
+    etag = validators.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return validators.get('last_modified')
+
+
+def download_file(url: str, fn: str, conditional: bool = True) -> str:
+    """
+    Download a URL to a file with the shared session, and return whether the file was NOT_MODIFIED, DOWNLOADED or
+    RESUMED.
+
+    The ETag and Last-Modified validators of the file are kept in a file named like it with META_SUFFIX. If the file
+    exists, they are sent as If-None-Match and If-Modified-Since, unless `conditional` is false, and the file is left
+    as it is if the server answers that it has not been modified.
+
+    The body is streamed in chunks to a file named like the file with PART_SUFFIX, which replaces the file once
+    complete, so that an interrupted download never leaves a truncated file behind. The next download of the same URL
+    resumes the interrupted one with a Range request, as long as the If-Range validator shows that the content is the
+    same; otherwise the server sends the whole content again. Responses are requested without content encoding, so
+    that byte ranges and the Content-Length refer to the bytes written to disk.
+    """
+    meta_fn, part_fn = fn + META_SUFFIX, fn + PART_SUFFIX
+    meta = read_meta(meta_fn)
+    headers = {'Accept-Encoding': 'identity'}
+    if conditional and os.path.exists(fn) and meta.get('url') == url:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    partial = meta.get('partial') or {}
+    offset = os.path.getsize(part_fn) if os.path.exists(part_fn) else 0
+    if offset and partial.get('url') == url and range_validator(partial):
+        headers['Range'] = 'bytes={offset}-'.format(offset=offset)
+        headers['If-Range'] = range_validator(partial)
+    with get_session().get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        if response.status_code == 416:  # The partial file does not fit the content any more
+            os.remove(part_fn)
+            return download_file(url, fn, conditional)
+        response.raise_for_status()
+        resumed = 'Range' in headers and response.status_code == 206 and response.headers.get(
+            'Content-Range', '').startswith('bytes {offset}-'.format(offset=offset))
+        if not resumed:
+            offset = 0
+        validators = response_validators(url, response)
+        # Recorded before the body arrives, so that a download interrupted from now on can be resumed
+        meta['partial'] = validators
+        write_meta(meta_fn, meta)
+        with open(part_fn, 'ab' if resumed else 'wb') as part_file:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                part_file.write(chunk)
+        content_length = response.headers.get('Content-Length')
+    if content_length is not None and os.path.getsize(part_fn) != offset + int(content_length):
+        raise IOError('Incomplete download of {url}: {size} of {length} bytes'.format(
+            url=url, size=os.path.getsize(part_fn), length=offset + int(content_length)))
+    os.replace(part_fn, fn)
+    write_meta(meta_fn, validators)
+    return RESUMED if resumed else DOWNLOADED
@@ -0,0 +1,299 @@
+"""
+Write TagPacks as Parquet, Arrow or newline-delimited JSON files besides YAML, and in shards, for bulk loading.
+"""
+import os
+import json
+import heapq
+from datetime import date
+from typing import Dict, Iterable, List
+
+import yaml
+
+from .tagpack import TAG_FIELDS, TagPackWriter
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+BATCH_SIZE = 100000
+# File extensions of the formats; YAML files keep the name they are given
+FORMATS = {'yaml': '.yaml', 'jsonl': '.jsonl', 'parquet': '.parquet', 'arrow': '.arrows'}
+# Columns with few distinct values, which are dictionary-encoded
+DICTIONARY_FIELDS = ('currency', 'label', 'source', 'category', 'abuse')
+# Shards get about the same number of tags, or of bytes
+SHARD_BALANCES = ('count', 'bytes')
+
+
+def json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError('{type} is not JSON serializable'.format(type=type(value).__name__))
+
+
+def to_json(value) -> str:
+    return json.dumps(value, default=json_default, ensure_ascii=False)
+
+
+def header_fields(header: dict) -> dict:
+    return {key: value for key, value in header.items() if key != 'tags'}
+
+
+class JsonlTagPackWriter:
+    """
+    Write a TagPack as newline-delimited JSON: the header, i.e. all TagPack fields but the tags, on the first line,
+    then one tag per line. Dates are written in ISO format. Like the TagPackWriter, it writes to a temporary file, which
+    replaces `fn` once closed.
+    """
+
+    def __init__(self, fn: str, header: dict):
+        self.fn = fn
+        self.tag_count = 0
+        self.tmp_fn = '{fn}.{pid}.tmp'.format(fn=fn, pid=os.getpid())
+        self.file = open(self.tmp_fn, 'w', encoding='utf-8')
+        self.file.write(to_json(header_fields(header)) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write_tag(self, tag: dict):
+        self.file.write(to_json(tag) + '\n')
+        self.tag_count += 1
+
+    def write_tags(self, tags: Iterable[dict]):
+        for tag in tags:
+            self.write_tag(tag)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        os.replace(self.tmp_fn, self.fn)
+
+    def discard(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        os.remove(self.tmp_fn)
+
+
+class ArrowTagPackWriter:
+    """
+    Write a TagPack as a Parquet file or an Arrow IPC stream, with a column per field of TAG_FIELDS.
+
+    The header fields are stored as JSON strings in the schema metadata. The tags are written in record batches of
+    `batch_size` rows, in which the DICTIONARY_FIELDS are dictionary-encoded. Arrow IPC files allow only one dictionary
+    per column, hence the stream format, which lets every batch bring its own. Like the TagPackWriter, it writes to a
+    temporary file, which replaces `fn` once closed.
+    """
+
+    def __init__(self, fn: str, header: dict, file_format: str = 'parquet', batch_size: int = BATCH_SIZE):
+        if pyarrow is None:
+            raise ImportError('Writing {format} files requires pyarrow'.format(format=file_format))
+        self.fn = fn
+        self.tmp_fn = '{fn}.{pid}.tmp'.format(fn=fn, pid=os.getpid())
+        self.batch_size = batch_size
+        self.tag_count = 0
+        self.closed = False
+        column_types = {
+            'address': pyarrow.string(),
+            'lastmod': pyarrow.date32(),
+            'is_cluster_definer': pyarrow.bool_()
+        }
+        dictionary_type = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        column_types.update({field: dictionary_type for field in DICTIONARY_FIELDS})
+        metadata = {key: to_json(value) for key, value in header_fields(header).items()}
+        self.schema = pyarrow.schema([(field, column_types[field]) for field in TAG_FIELDS], metadata=metadata)
+        self.columns = {field: [] for field in TAG_FIELDS}
+        if file_format == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(self.tmp_fn, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_stream(self.tmp_fn, self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write_tag(self, tag: dict):
+        for field in tag:
+            if field not in self.columns:
+                raise ValueError('Tag field {field} has no column: {tag}'.format(field=field, tag=tag))
+        for field, column in self.columns.items():
+            column.append(tag.get(field))
+        self.tag_count += 1
+        if len(self.columns['address']) >= self.batch_size:
+            self.flush()
+
+    def write_tags(self, tags: Iterable[dict]):
+        for tag in tags:
+            self.write_tag(tag)
+
+    def flush(self):
+        if not self.columns['address']:
+            return
+        arrays = []
+        for field in self.schema:
+            values = self.columns[field.name]
+            if field.name in DICTIONARY_FIELDS:
+                arrays.append(pyarrow.array(values, type=pyarrow.string()).dictionary_encode())
+            else:
+                arrays.append(pyarrow.array(values, type=field.type))
+            values.clear()
+        self.writer.write_batch(pyarrow.record_batch(arrays, schema=self.schema))
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.writer.close()
+        self.closed = True
+        os.replace(self.tmp_fn, self.fn)
+
+    def discard(self):
+        if self.closed:
+            return
+        self.writer.close()
+        self.closed = True
+        os.remove(self.tmp_fn)
+
+
+def format_file_name(fn: str, file_format: str) -> str:
+    if file_format == 'yaml':
+        return fn
+    return os.path.splitext(fn)[0] + FORMATS[file_format]
+
+
+def open_writer(fn: str, header: dict, file_format: str, **dump_options):
+    if file_format not in FORMATS:
+        raise ValueError('Unknown TagPack format {format}, known are: {formats}'.format(
+            format=file_format, formats=', '.join(FORMATS)))
+    fn = format_file_name(fn, file_format)
+    if file_format == 'yaml':
+        return TagPackWriter(fn, header, **dump_options)
+    if file_format == 'jsonl':
+        return JsonlTagPackWriter(fn, header)
+    return ArrowTagPackWriter(fn, header, file_format)
+
+
+def shard_file_name(fn: str, index: int, shards: int) -> str:
+    stem, extension = os.path.splitext(fn)
+    return '{stem}.shard-{index:0{width}d}-of-{shards}{extension}'.format(
+        stem=stem, index=index, width=len(str(shards)), shards=shards, extension=extension)
+
+
+def manifest_file_name(fn: str) -> str:
+    return os.path.splitext(fn)[0] + '.manifest.yaml'
+
+
+def write_manifest(fn: str, header: dict, shard_writers: List[list], balance: str):
+    """
+    List the shards of a TagPack with their files, tag counts and file sizes in a YAML manifest next to them.
+    """
+    shards = []
+    for index, writers in enumerate(shard_writers, 1):
+        shards.append({
+            'shard': index,
+            'tags': writers[0].tag_count,
+            'files': [{'file': os.path.basename(writer.fn), 'bytes': os.path.getsize(writer.fn)} for writer in writers]
+        })
+    manifest = {
+        'title': header.get('title'),
+        'tagpack': os.path.basename(fn),
+        'balance': balance,
+        'tags': sum(shard['tags'] for shard in shards),
+        'shards': shards
+    }
+    manifest_fn = manifest_file_name(fn)
+    tmp_fn = '{fn}.{pid}.tmp'.format(fn=manifest_fn, pid=os.getpid())
+    with open(tmp_fn, 'w', encoding='utf-8') as manifest_file:
+        yaml.dump(manifest, manifest_file, sort_keys=False, allow_unicode=True)
+    os.replace(tmp_fn, manifest_fn)
+
+
+def output_file_names(fn: str, formats: Iterable[str] = ('yaml',), shards: int = 1,
+                      balance: str = 'count') -> List[str]:
+    """
+    Return the names of the files save_tagpack_as writes with the given options, including the manifest of shards.
+    """
+    shard_fns = [fn] if shards == 1 else [shard_file_name(fn, index, shards) for index in range(1, shards + 1)]
+    fns = [format_file_name(shard_fn, file_format) for shard_fn in shard_fns for file_format in formats]
+    if shards > 1:
+        fns.append(manifest_file_name(fn))
+    return fns
+
+
+def save_tagpack_as(fn: str, header: dict, tags: Iterable[dict], formats: Iterable[str] = ('yaml',), shards: int = 1,
+                    balance: str = 'count', **dump_options) -> Dict[str, int]:
+    """
+    Write a TagPack in each of the given formats with a single pass over the tags, and return the number of tags
+    written per file. The files are named like `fn` with the extension of their format; the dump options only apply
+    to YAML.
+
+    With more than one shard, the tags are split into as many TagPacks, which all repeat the header, and a manifest
+    lists them. As the number of tags is not known in advance, the tags are dealt out in turn to balance the tag
+    counts, or each to the shard with the fewest bytes so far to balance the sizes, measuring tags by their JSON size.
+    The order of the tags is hence not kept across shards.
+
+    The files are only replaced once all tags are written, so that a generator of tags failing midway leaves the
+    previous files in place.
+    """
+    formats = list(formats)
+    if not formats:
+        raise ValueError('No TagPack format given')
+    if shards < 1:
+        raise ValueError('The number of shards must be positive, not {shards}'.format(shards=shards))
+    if balance not in SHARD_BALANCES:
+        raise ValueError('Unknown shard balance {balance}, known are: {balances}'.format(
+            balance=balance, balances=', '.join(SHARD_BALANCES)))
+    shard_fns = [fn] if shards == 1 else [shard_file_name(fn, index, shards) for index in range(1, shards + 1)]
+    shard_writers = []
+    try:
+        for shard_fn in shard_fns:
+            shard_writers.append([])
+            for file_format in formats:
+                shard_writers[-1].append(open_writer(shard_fn, header, file_format, **dump_options))
+        shard_sizes = [(0, index) for index in range(shards)]
+        for tag_index, tag in enumerate(tags):
+            if balance == 'count':
+                index = tag_index % shards
+            else:
+                size, index = shard_sizes[0]
+                heapq.heapreplace(shard_sizes, (size + len(to_json(tag)), index))
+            for writer in shard_writers[index]:
+                writer.write_tag(tag)
+        for writers in shard_writers:
+            for writer in writers:
+                writer.close()
+    except BaseException:
+        for writers in shard_writers:
+            for writer in writers:
+                writer.discard()
+        raise
+    if shards > 1:
+        write_manifest(fn, header, shard_writers, balance)
+    return {writer.fn: writer.tag_count for writers in shard_writers for writer in writers}
+
+
+def output_options(config: dict) -> dict:
+    """
+    Read the output options of save_tagpack_as from the TAGPACK_FORMATS, TAGPACK_SHARDS and TAGPACK_SHARD_BALANCE
+    entries of a converter configuration, which are all optional.
+    """
+    return {
+        'formats': config.get('TAGPACK_FORMATS', ['yaml']),
+        'shards': config.get('TAGPACK_SHARDS', 1),
+        'balance': config.get('TAGPACK_SHARD_BALANCE', 'count')
+    }
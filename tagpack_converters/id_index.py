@@ -0,0 +1,148 @@
+"""
+Record which numeric IDs of a crawl were found, which were not, and when they were last checked.
+"""
+import os
+import re
+import json
+import time
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+UNKNOWN, PRESENT, ABSENT = 0, 1, 2
+# Changing the layout of the index invalidates the indexes written before
+INDEX_VERSION = 1
+# An absent ID is checked again after RETRY_BACKOFF seconds, then after RETRY_FACTOR times as long each time, up to
+# MAX_RETRY_BACKOFF seconds
+RETRY_BACKOFF = 60 * 60
+RETRY_FACTOR = 4
+MAX_RETRY_BACKOFF = 90 * 24 * 60 * 60
+# Seconds between saves of the index while IDs are being marked
+SAVE_INTERVAL = 60
+
+
+class IdStateIndex:
+    """
+    The state of each ID of a crawl writing JSON lines, i.e. whether a record of the ID was found, and for the IDs
+    without record the time they were last checked and how many times in a row they were found absent. The states are
+    kept in NumPy arrays indexed by ID, a few bytes per ID, and saved to a .npz file.
+
+    The JSON lines file remains the reference: the index records up to which size of the file it has read the IDs of
+    the records, so that `sync` only reads the lines appended since, and reads the whole file again if it was
+    rewritten. Marking IDs absent is saved regularly, so that an interrupted crawl loses at most SAVE_INTERVAL seconds
+    of checks.
+    """
+
+    def __init__(self, fn: str, id_key: str = 'id'):
+        self.fn = fn
+        self.id_key = id_key
+        # The ID of records written by json.dumps with the ID first, read without parsing the whole line
+        self.leading_id_regex = re.compile(rb'\{' + re.escape(json.dumps(id_key).encode()) + rb': (\d+)[,}]')
+        self.state = np.zeros(0, dtype=np.uint8)
+        self.checked = np.zeros(0, dtype=np.uint32)
+        self.attempts = np.zeros(0, dtype=np.uint8)
+        # Size of the JSON lines file whose IDs are marked present
+        self.synced_size = 0
+        self.last_save = time.monotonic()
+        self.load()
+
+    def load(self):
+        try:
+            with np.load(self.fn) as arrays:
+                meta = json.loads(str(arrays['meta']))
+                if meta.get('version') != INDEX_VERSION:
+                    return
+                self.state, self.checked, self.attempts = arrays['state'], arrays['checked'], arrays['attempts']
+                self.synced_size = meta['synced_size']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        # Write to a temporary file first, so that an interrupted run never leaves a truncated index behind
+        tmp_fn = '{fn}.{pid}.tmp'.format(fn=self.fn, pid=os.getpid())
+        meta = json.dumps({'version': INDEX_VERSION, 'synced_size': self.synced_size})
+        with open(tmp_fn, 'wb') as index_file:
+            np.savez(index_file, state=self.state, checked=self.checked, attempts=self.attempts, meta=np.array(meta))
+        os.replace(tmp_fn, self.fn)
+        self.last_save = time.monotonic()
+
+    def clear(self):
+        self.state = np.zeros(0, dtype=np.uint8)
+        self.checked = np.zeros(0, dtype=np.uint32)
+        self.attempts = np.zeros(0, dtype=np.uint8)
+        self.synced_size = 0
+
+    def reserve(self, max_id: int):
+        """
+        Grow the arrays to hold the given ID, by doubling them at least, so that marking IDs one after another is cheap.
+        """
+        if max_id < len(self.state):
+            return
+        size = max(max_id + 1, 2 * len(self.state), 1024)
+        for name in ('state', 'checked', 'attempts'):
+            array = getattr(self, name)
+            grown = np.zeros(size, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def sync(self, jsonl_fn: str):
+        """
+        Mark the IDs of the records appended to the JSON lines file since the last sync as present.
+        """
+        size = os.path.getsize(jsonl_fn) if os.path.exists(jsonl_fn) else 0
+        if size < self.synced_size:  # The file was rewritten
+            self.clear()
+        if size == self.synced_size:
+            return
+        with open(jsonl_fn, 'rb') as jsonlines_file:
+            jsonlines_file.seek(self.synced_size)
+            ids = []
+            offset = self.synced_size
+            for line in jsonlines_file:
+                if not line.endswith(b'\n'):
+                    break  # A line still being written, read on the next sync
+                offset += len(line)
+                match = self.leading_id_regex.match(line)
+                ids.append(int(match.group(1)) if match else json.loads(line)[self.id_key])
+        self.mark_present(ids)
+        self.synced_size = offset
+
+    def mark_present(self, ids: Iterable[int]):
+        ids = np.fromiter(ids, dtype=np.int64)
+        if len(ids):
+            self.reserve(int(ids.max()))
+            self.state[ids] = PRESENT
+            self.checked[ids] = int(time.time())
+            self.attempts[ids] = 0
+
+    def mark_absent(self, id_: int):
+        self.reserve(id_)
+        self.state[id_] = ABSENT
+        self.checked[id_] = int(time.time())
+        self.attempts[id_] = min(int(self.attempts[id_]) + 1, 255)
+        if time.monotonic() - self.last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def max_present(self) -> int:
+        present = np.flatnonzero(self.state == PRESENT)
+        return int(present[-1]) if len(present) else 0
+
+    def due_ids(self, max_id: Optional[int] = None, now: Optional[float] = None) -> List[int]:
+        """
+        Return the IDs from 1 to `max_id`, by default the largest present ID, that have no record and are due to be
+        checked: never checked, or checked longer ago than the backoff of the times they were found absent in a row.
+        """
+        if max_id is None:
+            max_id = self.max_present()
+        if now is None:
+            now = time.time()
+        self.reserve(max_id)
+        state = self.state[1:max_id + 1]
+        attempts = self.attempts[1:max_id + 1].astype(np.float64)
+        backoff = np.minimum(RETRY_BACKOFF * RETRY_FACTOR ** np.maximum(attempts - 1, 0), MAX_RETRY_BACKOFF)
+        due = (state == UNKNOWN) | ((state == ABSENT) & (self.checked[1:max_id + 1] + backoff <= now))
+        return (np.flatnonzero(due) + 1).tolist()
+
+    def counts(self) -> dict:
+        return {name: int(np.count_nonzero(self.state[1:] == value))
+                for name, value in (('present', PRESENT), ('absent', ABSENT))}
@@ -0,0 +1,215 @@
+"""
+Extract data from the records of a JSON lines file incrementally, as records are appended to it.
+"""
+import os
+import re
+import json
+import mmap
+import pickle
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Changing the layout of the results invalidates the results written before
+RESULTS_VERSION = 1
+# Bytes at the start of the file and before the offset processed, whose digests tell whether the file was rewritten
+CHECK_SIZE = 64 * 1024
+# Bytes of appended lines below which they are extracted in this process, and bytes per range of a worker process
+MIN_PARALLEL_SIZE = 16 * 1024 * 1024
+RANGE_SIZE = 8 * 1024 * 1024
+
+
+def line_digest(line: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), 'little')
+
+
+def line_ranges(jsonl_fn: str, start: int, end: int, range_size: int = RANGE_SIZE) -> List[Tuple[int, int]]:
+    """
+    Split the lines of the file from `start` to `end`, both at the start of a line, into ranges of whole lines of about
+    `range_size` bytes.
+    """
+    ranges = []
+    with open(jsonl_fn, 'rb') as jsonlines_file, \
+            mmap.mmap(jsonlines_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        while start < end:
+            newline = content.find(b'\n', min(start + range_size, end) - 1, end)
+            stop = end if newline < 0 else newline + 1
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+
+def extract_range(jsonl_fn: str, id_key: str, extract: Callable[[dict], Optional[Any]],
+                  start: int, end: int) -> Tuple[np.ndarray, np.ndarray, List[Tuple[int, Any]]]:
+    """
+    Return the IDs and digests of the lines of the file from `start` to `end`, and the position in the range and
+    result of the lines with a result, reading the file through a memory map.
+    """
+    ids, digests, results = [], [], []
+    with open(jsonl_fn, 'rb') as jsonlines_file, \
+            mmap.mmap(jsonlines_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        while start < end:
+            stop = content.find(b'\n', start, end) + 1
+            line = content[start:stop]
+            row = json.loads(line)
+            result = extract(row)
+            if result is not None:
+                results.append((len(ids), result))
+            ids.append(row[id_key])
+            digests.append(line_digest(line))
+            start = stop
+    return np.array(ids, dtype=np.int64), np.array(digests, dtype=np.uint64), results
+
+
+class IncrementalExtraction:
+    """
+    The results of a function extracting data from each record of a JSON lines file, kept in a pickle file together
+    with the offset of the file processed so far, so that `update` only processes the lines appended since. The records
+    have numeric IDs, which index NumPy arrays of the digest of the latest record of each ID and the position of its
+    result, so that loading the results takes little more than the results themselves.
+
+    An appended record of an ID whose latest record had the same content, e.g. a profile downloaded again, takes the
+    result of that record rather than being extracted again. With several processes, large appends, e.g. the whole file
+    on the first update, are split into ranges of lines extracted in parallel, and the results merged in the order of
+    the file.
+
+    The file is processed again from the start if its content up to the offset changed, e.g. as it was downloaded anew,
+    and the results are dropped if the `signature` of the extraction, e.g. the patterns it matches, changed.
+    """
+
+    def __init__(self, fn: str, signature: str, id_key: str = 'id'):
+        self.fn = fn
+        self.signature = signature
+        self.id_key = id_key
+        # The ID of records written by json.dumps with the ID first, read without parsing the whole line
+        self.leading_id_regex = re.compile(rb'\{' + re.escape(json.dumps(id_key).encode()) + rb': (\d+)[,}]')
+        self.clear()
+        self.load()
+
+    def clear(self):
+        self.offset = 0
+        self.checks = None
+        # The ID and result of the records with a result, in the order of the file
+        self.results = []
+        # The digest of the latest record of each ID, 0 for none, and the position of its result, -1 for none
+        self.digests = np.zeros(0, dtype=np.uint64)
+        self.latest = np.zeros(0, dtype=np.int64)
+
+    def reserve(self, max_id: int):
+        if max_id < len(self.digests):
+            return
+        size = max(max_id + 1, 2 * len(self.digests), 1024)
+        digests, latest = np.zeros(size, dtype=np.uint64), np.full(size, -1, dtype=np.int64)
+        digests[:len(self.digests)], latest[:len(self.latest)] = self.digests, self.latest
+        self.digests, self.latest = digests, latest
+
+    def load(self):
+        try:
+            with open(self.fn, 'rb') as results_file:
+                state = pickle.load(results_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, ValueError,
+                TypeError):
+            return
+        if not isinstance(state, dict) or state.get('version') != RESULTS_VERSION or \
+                state.get('signature') != self.signature:
+            return
+        self.offset, self.checks = state['offset'], state['checks']
+        self.results, self.digests, self.latest = state['results'], state['digests'], state['latest']
+
+    def save(self):
+        # Write to a temporary file first, so that an interrupted run never leaves truncated results behind
+        tmp_fn = '{fn}.{pid}.tmp'.format(fn=self.fn, pid=os.getpid())
+        state = {'version': RESULTS_VERSION, 'signature': self.signature, 'offset': self.offset, 'checks': self.checks,
+                 'results': self.results, 'digests': self.digests, 'latest': self.latest}
+        try:
+            with open(tmp_fn, 'wb') as results_file:
+                pickle.dump(state, results_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_fn, self.fn)
+        except OSError as error:
+            print('Cannot write the extraction results {fn}: {error}'.format(fn=self.fn, error=error))
+            if os.path.exists(tmp_fn):
+                os.remove(tmp_fn)
+
+    @staticmethod
+    def read_checks(jsonlines_file, offset: int) -> Tuple[bytes, bytes]:
+        """
+        Return the digests of the first bytes of the file, and of the bytes before the offset.
+        """
+        jsonlines_file.seek(0)
+        head = jsonlines_file.read(min(offset, CHECK_SIZE))
+        jsonlines_file.seek(max(offset - CHECK_SIZE, 0))
+        tail = jsonlines_file.read(offset - max(offset - CHECK_SIZE, 0))
+        return hashlib.sha256(head).digest(), hashlib.sha256(tail).digest()
+
+    def update(self, jsonl_fn: str, extract: Callable[[dict], Optional[Any]],
+               processes: int = 1) -> List[Tuple[int, Any]]:
+        """
+        Extract the records appended to the JSON lines file since the last update, save the results, and return the ID
+        and result of all records with a result that is not None, in the order of the file.
+
+        With more than one process, `extract` must be picklable, e.g. a function of a module or a partial of one.
+        """
+        size = os.path.getsize(jsonl_fn)
+        with open(jsonl_fn, 'rb') as jsonlines_file:
+            if size < self.offset or self.checks != self.read_checks(jsonlines_file, self.offset):
+                self.clear()  # The file was rewritten
+            if size == self.offset:
+                return self.results
+            if processes > 1 and size - self.offset >= MIN_PARALLEL_SIZE:
+                self.extract_parallel(jsonl_fn, size, extract, processes)
+            jsonlines_file.seek(self.offset)
+            for line in jsonlines_file:
+                if not line.endswith(b'\n'):
+                    break  # A line still being written, extracted on the next update
+                self.offset += len(line)
+                digest = line_digest(line)
+                match = self.leading_id_regex.match(line)
+                id_ = int(match.group(1)) if match else None
+                if id_ is not None and id_ < len(self.digests) and int(self.digests[id_]) == digest:
+                    # The same record as the latest of the ID
+                    position = int(self.latest[id_])
+                    result = self.results[position][1] if position >= 0 else None
+                else:
+                    row = json.loads(line)
+                    id_ = row[self.id_key]
+                    result = extract(row)
+                self.reserve(id_)
+                self.digests[id_] = digest
+                self.latest[id_] = len(self.results) if result is not None else -1
+                if result is not None:
+                    self.results.append((id_, result))
+            self.checks = self.read_checks(jsonlines_file, self.offset)
+        self.save()
+        return self.results
+
+    def extract_parallel(self, jsonl_fn: str, size: int, extract: Callable[[dict], Optional[Any]], processes: int):
+        """
+        Extract the complete lines from the offset on in a pool of worker processes, and move the offset past them.
+        """
+        with open(jsonl_fn, 'rb') as jsonlines_file, \
+                mmap.mmap(jsonlines_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            end = content.rfind(b'\n', self.offset, size) + 1  # After the last complete line
+        if end <= self.offset:
+            return
+        ranges = line_ranges(jsonl_fn, self.offset, end, min(RANGE_SIZE, (end - self.offset) // processes + 1))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # The ranges come back in order, each as soon as it and those before are extracted
+            starts, ends = zip(*ranges)
+            for ids, digests, results in executor.map(partial(extract_range, jsonl_fn, self.id_key, extract),
+                                                      starts, ends):
+                if not len(ids):
+                    continue
+                positions = np.full(len(ids), -1, dtype=np.int64)
+                for index, result in results:
+                    positions[index] = len(self.results)
+                    self.results.append((int(ids[index]), result))
+                # The latest record of each ID in the range, as an ID may have been downloaded twice
+                unique_ids, reversed_index = np.unique(ids[::-1], return_index=True)
+                last = len(ids) - 1 - reversed_index
+                self.reserve(int(unique_ids[-1]))
+                self.digests[unique_ids] = digests[last]
+                self.latest[unique_ids] = positions[last]
+        self.offset = end
@@ -0,0 +1,65 @@
+"""
+Keep the results of lookups in remote services across runs, in a JSON file.
+"""
+import os
+import json
+import time
+from typing import Any, Iterable, List
+
+# Changing the layout of the cache invalidates the caches written before
+CACHE_VERSION = 1
+DAY = 24 * 60 * 60
+
+
+class LookupCache:
+    """
+    The results of lookups by key, each recorded with the time it was looked up. A result is reused for `ttl` seconds,
+    or `negative_ttl` seconds if the lookup found nothing, which is recorded as None.
+    """
+
+    def __init__(self, fn: str, ttl: float = 30 * DAY, negative_ttl: float = 7 * DAY):
+        self.fn = fn
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = self.load()
+        self.changed = False
+
+    def load(self) -> dict:
+        try:
+            with open(self.fn, 'r', encoding='utf-8') as cache_file:
+                cache = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+            return {}
+        return cache.get('entries', {})
+
+    def __contains__(self, key: str) -> bool:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        ttl = self.negative_ttl if entry['value'] is None else self.ttl
+        return time.time() - entry['checked'] < ttl
+
+    def __getitem__(self, key: str) -> Any:
+        return self.entries[key]['value']
+
+    def __setitem__(self, key: str, value: Any):
+        self.entries[key] = {'value': value, 'checked': time.time()}
+        self.changed = True
+
+    def missing(self, keys: Iterable[str]) -> List[str]:
+        """
+        Return the keys, once each, whose result is not cached or has expired.
+        """
+        return [key for key in dict.fromkeys(keys) if key not in self]
+
+    def save(self):
+        if not self.changed:
+            return
+        # Write to a temporary file first, so that an interrupted run never leaves a truncated cache behind
+        tmp_fn = '{fn}.{pid}.tmp'.format(fn=self.fn, pid=os.getpid())
+        with open(tmp_fn, 'w', encoding='utf-8') as cache_file:
+            json.dump({'version': CACHE_VERSION, 'entries': self.entries}, cache_file)
+        os.replace(tmp_fn, self.fn)
+        self.changed = False
@@ -0,0 +1,146 @@
+"""
+Find the records of a JSON lines file by numeric ID without reading the file.
+"""
+import os
+import re
+import json
+import mmap
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+# Changing the layout of the index invalidates the indexes written before
+INDEX_VERSION = 1
+
+
+class OffsetIndex:
+    """
+    The offset and length of the latest record of each ID in a JSON lines file, kept in NumPy arrays sorted by ID and
+    saved to a .npz file, so that the record of an ID, or those of a range of IDs, are found by binary search and read
+    through a memory map of the file.
+
+    Like the IdStateIndex, the index records up to which size of the file it has read the records, so that `sync`
+    only reads the lines appended since, and reads the whole file again if it was rewritten. A record appended for an
+    ID that had one, e.g. a profile downloaded twice, replaces it in the index; `duplicate_count` tells how many
+    records of the file the index skips.
+    """
+
+    def __init__(self, fn: str, id_key: str = 'id'):
+        self.fn = fn
+        self.id_key = id_key
+        # The ID of records written by json.dumps with the ID first, read without parsing the whole line
+        self.leading_id_regex = re.compile(rb'\{' + re.escape(json.dumps(id_key).encode()) + rb': (\d+)[,}]')
+        self.clear()
+        self.load()
+
+    def clear(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int64)
+        # Size of the JSON lines file whose records are indexed, and the number of its lines
+        self.synced_size = 0
+        self.line_count = 0
+
+    def load(self):
+        try:
+            with np.load(self.fn) as arrays:
+                meta = json.loads(str(arrays['meta']))
+                if meta.get('version') != INDEX_VERSION:
+                    return
+                self.ids, self.offsets, self.lengths = arrays['ids'], arrays['offsets'], arrays['lengths']
+                self.synced_size, self.line_count = meta['synced_size'], meta['line_count']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        # Write to a temporary file first, so that an interrupted run never leaves a truncated index behind
+        tmp_fn = '{fn}.{pid}.tmp'.format(fn=self.fn, pid=os.getpid())
+        meta = json.dumps({'version': INDEX_VERSION, 'synced_size': self.synced_size, 'line_count': self.line_count})
+        with open(tmp_fn, 'wb') as index_file:
+            np.savez(index_file, ids=self.ids, offsets=self.offsets, lengths=self.lengths, meta=np.array(meta))
+        os.replace(tmp_fn, self.fn)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def duplicate_count(self) -> int:
+        return self.line_count - len(self.ids)
+
+    def sync(self, jsonl_fn: str):
+        """
+        Index the records appended to the JSON lines file since the last sync.
+        """
+        size = os.path.getsize(jsonl_fn) if os.path.exists(jsonl_fn) else 0
+        if size < self.synced_size:  # The file was rewritten
+            self.clear()
+        if size == self.synced_size:
+            return
+        ids, offsets, lengths = [], [], []
+        with open(jsonl_fn, 'rb') as jsonlines_file:
+            jsonlines_file.seek(self.synced_size)
+            offset = self.synced_size
+            for line in jsonlines_file:
+                if not line.endswith(b'\n'):
+                    break  # A line still being written, indexed on the next sync
+                match = self.leading_id_regex.match(line)
+                ids.append(int(match.group(1)) if match else json.loads(line)[self.id_key])
+                offsets.append(offset)
+                lengths.append(len(line))
+                offset += len(line)
+        self.add(np.array(ids, dtype=np.int64), np.array(offsets, dtype=np.int64), np.array(lengths, dtype=np.int64))
+        self.synced_size = offset
+
+    def add(self, ids: np.ndarray, offsets: np.ndarray, lengths: np.ndarray):
+        """
+        Index records following those indexed, in the order of the file.
+        """
+        self.line_count += len(ids)
+        ids = np.concatenate([self.ids, ids])
+        offsets = np.concatenate([self.offsets, offsets])
+        lengths = np.concatenate([self.lengths, lengths])
+        # The last record of each ID in the order of the file, which np.unique finds first in the reversed arrays
+        unique_ids, reversed_index = np.unique(ids[::-1], return_index=True)
+        latest = len(ids) - 1 - reversed_index
+        self.ids, self.offsets, self.lengths = unique_ids, offsets[latest], lengths[latest]
+
+    def find(self, id_: int) -> Optional[Tuple[int, int]]:
+        """
+        Return the offset and length of the record of the ID, or None if there is none.
+        """
+        position = int(np.searchsorted(self.ids, id_))
+        if position < len(self.ids) and self.ids[position] == id_:
+            return int(self.offsets[position]), int(self.lengths[position])
+        return None
+
+    def between(self, first_id: int, last_id: int) -> slice:
+        """
+        Return the positions in the index of the records with IDs from `first_id` to `last_id`.
+        """
+        return slice(int(np.searchsorted(self.ids, first_id, 'left')),
+                     int(np.searchsorted(self.ids, last_id, 'right')))
+
+    def read(self, jsonl_fn: str, first_id: int, last_id: Optional[int] = None) -> Iterator[dict]:
+        """
+        Read the records with IDs from `first_id` to `last_id`, by default `first_id` alone, in the order of the IDs.
+        """
+        positions = self.between(first_id, first_id if last_id is None else last_id)
+        if positions.start == positions.stop:
+            return
+        with open(jsonl_fn, 'rb') as jsonlines_file, \
+                mmap.mmap(jsonlines_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            for offset, length in zip(self.offsets[positions].tolist(), self.lengths[positions].tolist()):
+                yield json.loads(content[offset:offset + length])
+
+    def write_deduplicated(self, jsonl_fn: str, out_fn: str):
+        """
+        Write the latest record of each ID of the JSON lines file to another, in the order of the IDs.
+        """
+        if not len(self.ids):
+            open(out_fn, 'wb').close()
+            return
+        with open(jsonl_fn, 'rb') as jsonlines_file, \
+                mmap.mmap(jsonlines_file.fileno(), 0, access=mmap.ACCESS_READ) as content, \
+                open(out_fn, 'wb') as out_file:
+            for offset, length in zip(self.offsets.tolist(), self.lengths.tolist()):
+                out_file.write(content[offset:offset + length])
@@ -0,0 +1,50 @@
+"""
+Keep the requests of several workers to a site within a shared budget of requests per second.
+"""
+import time
+import threading
+import multiprocessing
+
+
+class RateLimiter:
+    """
+    Hand out request slots at most `rate` times a second, in total over all threads sharing the limiter. A thread
+    waiting for a slot reserves the next free one and sleeps until it comes, so that the workers take turns in the
+    order they asked and the requests are spread evenly, rather than sent in bursts.
+    """
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError('The rate must be positive, not {rate}'.format(rate=rate))
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    A RateLimiter whose budget is shared by processes too, e.g. the workers of a ProcessPoolExecutor given the limiter
+    in their initargs. The slots are times of the monotonic clock, which is the same for all processes of a machine.
+    """
+
+    def __init__(self, rate: float, context=None):
+        super().__init__(rate)
+        context = context or multiprocessing.get_context()
+        self.lock = context.Lock()
+        self.shared_next_slot = context.Value('d', self.next_slot, lock=False)
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.shared_next_slot.value)
+            self.shared_next_slot.value = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
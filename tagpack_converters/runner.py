@@ -0,0 +1,255 @@
+"""
+Run several converters concurrently in one process, stage by stage, under global and per-host limits.
+"""
+import time
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence
+
+from .converter import Converter
+
+STAGES = ('download', 'generate', 'save')
+# The result of a generate or save task whose TagPack is up to date
+UP_TO_DATE = 'up to date'
+MAX_TASKS = 8
+MAX_TASKS_PER_HOST = 2
+
+
+class Task:
+    """
+    A stage of a converter, which runs once the tasks it depends on have succeeded.
+    """
+
+    def __init__(self, converter: Converter, stage: str, dependencies: List['Task']):
+        self.converter = converter
+        self.stage = stage
+        self.name = '{converter}:{stage}'.format(converter=converter.name, stage=stage)
+        self.dependencies = dependencies
+        self.dependents = []
+        for dependency in dependencies:
+            dependency.dependents.append(self)
+        self.hosts = set()
+        self.status = 'pending'  # Then ready, running, and ok, cached, failed or skipped
+        self.error = None
+        self.result = None
+        # Seconds since the start of the run
+        self.ready_at = self.start = self.end = None
+        # The task whose end let this one start, i.e. its predecessor on a critical path: the dependency that ended
+        # last, or the task that freed a slot for it if it had to wait
+        self.cause = None
+        self.ready_round = None
+
+    def __repr__(self):
+        return 'Task({name})'.format(name=self.name)
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start if self.start is not None else 0.0
+
+    def run(self, rebuild: bool = False):
+        """
+        Run the stage. The generate stage checks the build cache of the converter first, and neither it nor the save
+        stage do anything while the TagPack is up to date, unless rebuilding.
+        """
+        # Log lines tell the converters apart by the name of their thread
+        threading.current_thread().name = self.converter.name
+        if self.stage == 'download':
+            return self.converter.download()
+        if self.stage == 'generate':
+            if not rebuild and self.converter.up_to_date():
+                logging.info('{name} is up to date'.format(name=self.converter.name))
+                return UP_TO_DATE
+            return self.converter.generate()
+        generate_task = next(task for task in self.dependencies if task.stage == 'generate')
+        generator, generate_task.result = generate_task.result, None  # Released once saved
+        if generator is UP_TO_DATE:
+            return UP_TO_DATE
+        self.converter.save(generator)
+        self.converter.record_build()
+
+
+def plan_tasks(converters: Sequence[Converter]) -> List[Task]:
+    """
+    Return the download, generate and save tasks of the converters. Each stage depends on the previous stage of its
+    converter, and the download of a converter reading the raw data of another one on the download of that one.
+    """
+    tasks = []
+    downloads = {}
+    for converter in converters:
+        previous = []
+        for stage in STAGES:
+            task = Task(converter, stage, previous)
+            tasks.append(task)
+            previous = [task]
+            if stage == 'download':
+                downloads[converter.name] = task
+    for task in tasks:
+        raw_data_of = task.converter.raw_data_of
+        if task.stage == 'download' and raw_data_of in downloads and raw_data_of != task.converter.name:
+            task.dependencies.append(downloads[raw_data_of])
+            downloads[raw_data_of].dependents.append(task)
+    return tasks
+
+
+class Orchestrator:
+    """
+    Run tasks in a pool of `max_tasks` threads, with at most `max_tasks_per_host` tasks sending requests to the same
+    host at a time, so that the downloads from different sources overlap while no site gets more than a few at once.
+
+    A task starts as soon as its dependencies have succeeded and the limits allow, in the order of the tasks; ready
+    tasks held back by a busy host do not hold back the others. The tasks depending on a failed task are skipped.
+    With `rebuild`, TagPacks are generated even if they are up to date.
+    """
+
+    def __init__(self, tasks: List[Task], max_tasks: int = MAX_TASKS, max_tasks_per_host: int = MAX_TASKS_PER_HOST,
+                 rebuild: bool = False):
+        self.tasks = tasks
+        self.rebuild = rebuild
+        self.max_tasks = max(1, max_tasks)
+        self.max_tasks_per_host = max(1, max_tasks_per_host)
+        self.host_load = Counter()
+        self.ready = []
+        self.running = {}
+        self.started_at = None
+        # Rounds of finishing tasks and starting ready ones
+        self.round = 0
+
+    def now(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def make_ready(self, task: Task):
+        task.ready_at = self.now()
+        task.ready_round = self.round
+        try:
+            task.hosts = task.converter.hosts(task.stage)
+        except Exception as exc:
+            self.fail(task, exc)
+            return
+        task.status = 'ready'
+        self.ready.append(task)
+
+    def fail(self, task: Task, exc: BaseException):
+        logging.error('{name} failed'.format(name=task.name), exc_info=exc)
+        task.status = 'failed'
+        task.error = '{type}: {error}'.format(type=type(exc).__name__, error=exc)
+        if task.end is None:
+            task.end = self.now()
+        self.skip_dependents(task)
+
+    def skip_dependents(self, task: Task):
+        for dependent in task.dependents:
+            if dependent.status == 'pending':
+                dependent.status = 'skipped'
+                dependent.error = 'after {name} failed'.format(name=task.name)
+                self.skip_dependents(dependent)
+
+    def start_ready_tasks(self, executor: ThreadPoolExecutor, slot_freed_by: Optional[Task]):
+        for task in list(self.ready):
+            if len(self.running) >= self.max_tasks:
+                break
+            if any(self.host_load[host] >= self.max_tasks_per_host for host in task.hosts):
+                continue
+            self.ready.remove(task)
+            self.host_load.update(task.hosts)
+            task.status = 'running'
+            task.start = self.now()
+            if task.ready_round == self.round and task.dependencies:
+                task.cause = max(task.dependencies, key=lambda dependency: dependency.end)
+            elif task.ready_round < self.round:
+                task.cause = slot_freed_by
+            logging.info('Starting {name}'.format(name=task.name))
+            self.running[executor.submit(task.run, self.rebuild)] = task
+
+    def finish(self, future, task: Task):
+        self.host_load.subtract(task.hosts)
+        task.end = self.now()
+        try:
+            task.result = future.result()
+        except (Exception, SystemExit) as exc:  # Some scripts give up with SystemExit
+            self.fail(task, exc)
+            return
+        task.status = 'cached' if task.result is UP_TO_DATE else 'ok'
+        logging.info('{name} finished in {seconds:.1f} s'.format(name=task.name, seconds=task.seconds))
+        for dependent in task.dependents:
+            if dependent.status != 'pending':
+                continue
+            if all(dependency.status in ('ok', 'cached') for dependency in dependent.dependencies):
+                self.make_ready(dependent)
+
+    def run(self) -> List[Task]:
+        self.started_at = time.perf_counter()
+        for task in self.tasks:
+            if not task.dependencies:
+                self.make_ready(task)
+        with ThreadPoolExecutor(max_workers=self.max_tasks) as executor:
+            self.start_ready_tasks(executor, None)
+            while self.running:
+                done, _ = wait(self.running, return_when=FIRST_COMPLETED)
+                self.round += 1
+                last = None
+                for future in sorted(done, key=lambda f: self.running[f].name):
+                    task = self.running.pop(future)
+                    self.finish(future, task)
+                    last = task
+                self.start_ready_tasks(executor, last)
+        return self.tasks
+
+
+def critical_path(tasks: Sequence[Task]) -> List[Task]:
+    """
+    Return the chain of tasks that determined the duration of the run: the task that ended last, the task whose end
+    let it start, be it a dependency or a task freeing a slot, and so on.
+    """
+    finished = [task for task in tasks if task.end is not None and task.start is not None]
+    if not finished:
+        return []
+    path = [max(finished, key=lambda task: task.end)]
+    while path[-1].cause is not None:
+        path.append(path[-1].cause)
+    return path[::-1]
+
+
+def run_converters(converters: Sequence[Converter], max_tasks: int = MAX_TASKS,
+                   max_tasks_per_host: int = MAX_TASKS_PER_HOST, rebuild: bool = False) -> List[Task]:
+    """
+    Run the download, generate and save stages of the converters, and return the tasks. A failing converter does not
+    stop the others.
+
+    The converters share the process, and hence the HTTP session of tagpack_converters.download and the loaded modules;
+    their downloads and crawls, which mostly wait for the network or a browser, overlap.
+    """
+    return Orchestrator(plan_tasks(converters), max_tasks, max_tasks_per_host, rebuild).run()
+
+
+def converter_results(tasks: Sequence[Task]) -> Dict[str, bool]:
+    results = {}
+    for task in tasks:
+        results[task.converter.name] = results.get(task.converter.name, True) and task.status in ('ok', 'cached')
+    return results
+
+
+def format_summary(tasks: Sequence[Task]) -> str:
+    """
+    Tabulate the tasks with their status, start, waiting time between being ready and starting, and duration, in
+    seconds since the start of the run, followed by the critical path.
+    """
+    def seconds(value: Optional[float]) -> str:
+        return '{value:.1f}'.format(value=value) if value is not None else '-'
+
+    width = max([len(task.name) for task in tasks] + [len('Task')])
+    lines = ['{name:<{width}}  {status:<7}  {start:>8}  {waited:>8}  {seconds:>8}'.format(
+        name='Task', width=width, status='Status', start='Start', waited='Waited', seconds='Seconds')]
+    for task in tasks:
+        waited = task.start - task.ready_at if task.start is not None else None
+        lines.append('{name:<{width}}  {status:<7}  {start:>8}  {waited:>8}  {seconds:>8}{error}'.format(
+            name=task.name, width=width, status=task.status, start=seconds(task.start), waited=seconds(waited),
+            seconds=seconds(task.seconds if task.start is not None else None),
+            error='  ' + task.error if task.error else ''))
+    path = critical_path(tasks)
+    if path:
+        lines.append('Critical path, {seconds:.1f} s: {path}'.format(
+            seconds=path[-1].end, path=' -> '.join(
+                '{name} ({seconds:.1f} s)'.format(name=task.name, seconds=task.seconds) for task in path)))
+    return '\n'.join(lines)
@@ -0,0 +1,187 @@
+"""
+The registry of the converters in the sub-folders of this repository.
+"""
+import os
+import json
+from datetime import datetime
+from typing import Iterable, List, Set
+from urllib.parse import urlparse
+
+from .converter import Converter
+from .download import download_file
+from .export import save_tagpack_as
+
+
+class BitcointalkConverter(Converter):
+    """
+    Bitcointalk extracts the addresses from the raw data file incrementally, rather than from rows read into memory.
+    """
+
+    def generate(self):
+        config = self.config
+        return self.module.TagPackGenerator(None, config['TITLE'], config['CREATOR'], config['DESCRIPTION'],
+                                            self.last_mod(), config['SOURCE'], self.raw_file_name)
+
+
+class CoinPayUConverter(Converter):
+    url_key = 'SOURCE'
+
+
+class FileConverter(Converter):
+    """
+    A converter whose script downloads a single file with download_file, which only transfers it again if it changed.
+    """
+    revalidate = True
+
+
+class BitcoinOTCConverter(FileConverter):
+    """
+    Bitcoin OTC looks up the OpenPGP keys of the users while generating the tags, keeping them in a key cache.
+    """
+
+    def generate(self):
+        config = self.config
+        key_cache_fn = self.path(config.get('KEY_CACHE_FILE_NAME', self.module.KEY_CACHE_FILE_NAME))
+        return self.module.TagPackGenerator(self.raw_data().read(), config['TITLE'], config['CREATOR'],
+                                            config['DESCRIPTION'], self.last_mod(), config['SOURCE'], key_cache_fn)
+
+    def hosts(self, stage: str) -> Set[str]:
+        if stage == 'save':
+            return {urlparse(self.module.SKS_LOOKUP_URL).hostname}
+        return super().hosts(stage)
+
+
+class GlassChainConverter(Converter):
+
+    def hosts(self, stage: str) -> Set[str]:
+        if stage == 'download':
+            return super().hosts(stage) | {'api.glasschain.io'}  # The wallet API of the script
+        return set()
+
+    def last_mod(self):
+        return datetime.fromtimestamp(os.path.getmtime(self.raw_file_name)).isoformat()
+
+
+class GlassChainLargeConverter(GlassChainConverter):
+    """
+    Write a TagPack per wallet into the folder, rather than a single TagPack.
+    """
+
+    def generate(self):
+        config = self.config
+        return self.module.TagPackGenerator(self.raw_data().read(), config['TITLE'], config['CREATOR'],
+                                            config['DESCRIPTION'], self.last_mod(), config['SOURCE'],
+                                            formats=config.get('TAGPACK_FORMATS', ['yaml']), out_dir=self.folder)
+
+    def build_outputs(self):
+        return None  # The wallets are only known once generated
+
+    def save(self, generator):
+        generator.generateAndSave()
+
+
+class EtherScamDBConverter(Converter):
+    """
+    The RawData of EtherScamDB downloads the raw data when created, unless it exists.
+    """
+
+    def download(self):
+        if os.path.exists(self.raw_file_name):
+            self.raw_data().downloadYaml()
+        else:
+            self.raw_data()
+
+    def generate(self):
+        config = self.config
+        return self.module.TagPackGenerator(self.raw_data().returnYaml(), config['TITLE'], config['CREATOR'],
+                                            config['DESCRIPTION'], config['LASTMOD'])
+
+
+class RansomwhereConverter(Converter):
+    """
+    The RawData of Ransomwhere downloads the raw data when created, unless it exists.
+    """
+
+    def download(self):
+        if os.path.exists(self.raw_file_name):
+            self.raw_data().downloadJson()
+        else:
+            self.raw_data()
+
+    def generate(self):
+        config = self.config
+        return self.module.TagPackGenerator(self.raw_data().returnJson(), config['TITLE'], config['CREATOR'],
+                                            config['DESCRIPTION'], datetime.now().date(), config['SOURCE'])
+
+
+class OFACConverter(Converter):
+    """
+    OFAC is configured in a config.json of lowercase entries, and downloads the SDN list to a file named after it.
+    """
+    config_file_name = 'config.json'
+
+    @property
+    def raw_file_name(self) -> str:
+        return self.module.Convert.raw_file_name(self.config, self.path(self.config_file_name))
+
+    @property
+    def tagpack_file_name(self) -> str:
+        return self.path('OFAC_tagpack.yaml')
+
+    def load_config(self) -> dict:
+        with open(self.path(self.config_file_name), 'r') as config_file:
+            return json.load(config_file)
+
+    def hosts(self, stage: str) -> Set[str]:
+        if stage == 'download':
+            return {urlparse(self.config['source']).hostname}
+        return set()
+
+    def download(self):
+        download_file(self.config['source'], self.raw_file_name)
+
+    def generate(self):
+        data = self.module.Convert.add_tags(self.path(self.config_file_name), download=False)
+        if data is None:
+            raise ValueError('Invalid configuration {fn}'.format(fn=self.path(self.config_file_name)))
+        return data
+
+    def save(self, generator):
+        config = self.config
+        save_tagpack_as(self.tagpack_file_name, generator, generator['tags'], config.get('formats', ['yaml']),
+                        config.get('shards', 1), config.get('shard_balance', 'count'))
+
+
+CONVERTERS = [
+    Converter('BitcoinAbuse', 'BitcoinAbuse'),
+    BitcoinOTCConverter('BitcoinOTC', 'Bitcoin OTC'),
+    BitcointalkConverter('Bitcointalk', 'Bitcointalk Users'),
+    CoinPayUConverter('CoinPayU', 'CoinPayU'),
+    EtherScamDBConverter('EtherScamDB', 'EtherScamDB'),
+    GlassChainConverter('GlassChain', 'GlassChain'),
+    GlassChainLargeConverter('GlassChain-large', 'GlassChain', 'generateTagPack-large.py', in_all=False,
+                             raw_data_of='GlassChain'),
+    OFACConverter('OFAC', 'OFAC Specially Designated Nationals'),
+    Converter('PipeFlare', 'PipeFlare'),
+    RansomwhereConverter('Ransomwhere', 'Ransomwhere'),
+    Converter('NBCTF', 'Sanctioned NBCTF'),
+    Converter('ScamSearch', 'ScamSearch'),
+    Converter('Seekoin', 'Seekoin'),
+    FileConverter('SPLC', 'SPLC Cryptocurrency Report')
+]
+REGISTRY = {converter.name.lower(): converter for converter in CONVERTERS}
+
+
+def select_converters(names: Iterable[str]) -> List[Converter]:
+    """
+    Return the converters of the given names, ignoring case, or all converters that run with all others if no name is
+    given.
+    """
+    names = list(names)
+    if not names:
+        return [converter for converter in CONVERTERS if converter.in_all]
+    unknown = [name for name in names if name.lower() not in REGISTRY]
+    if unknown:
+        raise ValueError('Unknown converter {names}, known are: {known}'.format(
+            names=', '.join(unknown), known=', '.join(converter.name for converter in CONVERTERS)))
+    return [REGISTRY[name.lower()] for name in dict.fromkeys(name.lower() for name in names)]
@@ -0,0 +1,179 @@
+"""
+Write TagPacks to YAML files.
+"""
+import os
+import re
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+import yaml
+from yaml.resolver import Resolver
+
+try:
+    from yaml import CDumper as FallbackDumper  # The libyaml emitter
+except ImportError:
+    from yaml import Dumper as FallbackDumper
+
+BATCH_SIZE = 1000
+TAG_FIELDS = ('address', 'currency', 'label', 'source', 'lastmod', 'category', 'abuse', 'is_cluster_definer')
+FIRST_LINE_PREFIXES = {field: '- {field}: '.format(field=field) for field in TAG_FIELDS}
+LINE_PREFIXES = {field: '  {field}: '.format(field=field) for field in TAG_FIELDS}
+# PyYAML folds plain scalars at single spaces beyond this column
+BEST_WIDTH = 80
+# Strings PyYAML writes as plain scalars in a block mapping: no indicator first, no line breaks or special characters,
+# and no document marker; ': ', ' #' and trailing colons or spaces are ruled out separately
+PLAIN_FIRST_CHARS = r'$()+./0-9;<=A-Z\\^_a-z~'
+PRINTABLE_UNICODE = r'\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd\U00010000-\U0010ffff'
+PLAIN_ASCII_REGEX = re.compile(r'(?!\.\.\.)[{first}][\x20-\x7e]*'.format(first=PLAIN_FIRST_CHARS))
+PLAIN_UNICODE_REGEX = re.compile(r'(?!\.\.\.)[{first}{unicode}][\x20-\x7e{unicode}]*'.format(
+    first=PLAIN_FIRST_CHARS, unicode=PRINTABLE_UNICODE))
+STR_TAG = 'tag:yaml.org,2002:str'
+
+
+def resolves_to_str(value: str) -> bool:
+    """
+    Tell whether a plain scalar reads back as a string, rather than e.g. a number, a boolean or a date.
+    """
+    for tag, regexp in Resolver.yaml_implicit_resolvers.get(value[0], ()):
+        if regexp.match(value):
+            return tag == STR_TAG
+    return True
+
+
+class TagEmitter:
+    """
+    Serialise tags to YAML with string templates for the flat TagPack tag schema.
+
+    Tags of the TAG_FIELDS holding strings, dates, booleans, integers or None are written line by line, exactly as
+    `yaml.dump` would: strings are left unquoted unless PyYAML would quote or fold them. Any other tag is left to
+    `yaml.dump` with the libyaml emitter, if PyYAML was built with it, which may fold and escape quoted strings
+    differently from PyYAML's own emitter, but loads to the same data.
+    """
+
+    def __init__(self, allow_unicode: bool = False):
+        self.allow_unicode = allow_unicode
+        self.plain_regex = PLAIN_UNICODE_REGEX if allow_unicode else PLAIN_ASCII_REGEX
+
+    def format_scalar(self, field: str, value) -> Optional[str]:
+        """
+        Return the plain scalar of a field value, or None if the template cannot write it.
+        """
+        value_type = type(value)
+        if value_type is str:
+            if (self.plain_regex.fullmatch(value) is None or ': ' in value or ' #' in value or value[-1] in ': '
+                    or value.rfind(' ') + len(field) + 4 > BEST_WIDTH or not resolves_to_str(value)):
+                return None
+            return value
+        if value_type is date:
+            return value.isoformat()
+        if value_type is bool:
+            return 'true' if value else 'false'
+        if value_type is int:
+            return str(value)
+        if value_type is datetime:
+            return value.isoformat(' ')
+        if value is None:
+            return 'null'
+        return None
+
+    def emit_tag(self, tag: dict) -> str:
+        lines = []
+        prefixes = FIRST_LINE_PREFIXES
+        for field, value in tag.items():
+            text = self.format_scalar(field, value) if field in prefixes else None
+            if text is None:
+                return yaml.dump([tag], Dumper=FallbackDumper, sort_keys=False, allow_unicode=self.allow_unicode)
+            lines.append(prefixes[field])
+            lines.append(text)
+            lines.append('\n')
+            prefixes = LINE_PREFIXES
+        if not lines:
+            return '- {}\n'
+        return ''.join(lines)
+
+    def emit(self, tags: Iterable[dict]) -> str:
+        """
+        Return the tags as a YAML sequence, indented like the tags sequence within the TagPack mapping.
+        """
+        return ''.join(map(self.emit_tag, tags))
+
+
+class TagPackWriter:
+    """
+    Write a TagPack to a YAML file tag by tag, so that the tags never need to be in memory all at once.
+
+    The header, i.e. all TagPack fields but the tags, is written first. The tags are collected in batches of
+    `batch_size`, and each batch is serialised by a TagEmitter and written as one block. The file loads to the same
+    data as `yaml.dump` of the whole TagPack with its tags last, and is byte-identical to it where the tags fit the
+    templates of the TagEmitter and share no objects, which `yaml.dump` would turn into anchors and aliases. Dump
+    options other than `allow_unicode` are passed on to `yaml.dump` for the tags too.
+
+    The TagPack is written to a temporary file, which only replaces `fn` once closed, so that a generator of tags
+    failing midway leaves the previous TagPack in place; `discard` drops the temporary file instead.
+    """
+
+    def __init__(self, fn: str, header: dict, batch_size: int = BATCH_SIZE, **dump_options):
+        self.fn = fn
+        self.batch_size = batch_size
+        self.dump_options = dump_options
+        self.emitter = TagEmitter(**dump_options) if set(dump_options) <= {'allow_unicode'} else None
+        self.batch = []
+        self.tag_count = 0
+        self.tmp_fn = '{fn}.{pid}.tmp'.format(fn=fn, pid=os.getpid())
+        self.file = open(self.tmp_fn, 'w', encoding='utf-8')
+        header = {key: value for key, value in header.items() if key != 'tags'}
+        self.file.write(yaml.dump(header, sort_keys=False, **dump_options))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write_tag(self, tag: dict):
+        if self.tag_count == 0:
+            self.file.write('tags:\n')
+        self.batch.append(tag)
+        self.tag_count += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def write_tags(self, tags: Iterable[dict]):
+        for tag in tags:
+            self.write_tag(tag)
+
+    def flush(self):
+        if self.batch:
+            if self.emitter is not None:
+                self.file.write(self.emitter.emit(self.batch))
+            else:
+                # A sequence at the top level is indented like the tags sequence within the TagPack mapping
+                self.file.write(yaml.dump(self.batch, sort_keys=False, **self.dump_options))
+            self.batch = []
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.tag_count == 0:
+            self.file.write('tags: []\n')
+        self.flush()
+        self.file.close()
+        os.replace(self.tmp_fn, self.fn)
+
+    def discard(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        os.remove(self.tmp_fn)
+
+
+def save_tagpack(fn: str, header: dict, tags: Iterable[dict], **dump_options) -> int:
+    """
+    Write a TagPack with the given header and tags, and return the number of tags written.
+    """
+    with TagPackWriter(fn, header, **dump_options) as writer:
+        writer.write_tags(tags)
+        return writer.tag_count
@@ -0,0 +1,149 @@
+"""
+A durable queue of ranges of IDs to crawl, leased to workers which may fail, kept in an SQLite database.
+"""
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Iterator, Optional, Tuple
+
+# Seconds a lease lasts unless renewed by a heartbeat
+LEASE_TIME = 300.0
+PENDING, LEASED, DONE = 'pending', 'leased', 'done'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ranges (
+    first_id INTEGER PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    lease_id TEXT,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS ranges_state ON ranges (state, lease_expires);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+
+class WorkQueue:
+    """
+    Ranges of IDs from pending to leased to done, each done range with the result its worker uploaded. A lease expires
+    after `lease_time` seconds unless its worker renews it with a heartbeat, so that the range of a worker that died is
+    leased to another. Only the worker holding the current lease of a range can complete it, so that the result of a
+    range is stored once, even if a worker presumed dead comes back.
+
+    Every change is committed to the database before it is answered, so that the queue survives the process using it,
+    and a `meta` table keeps the state of the crawl as JSON values. The queue may be used by several threads.
+    """
+
+    def __init__(self, fn: str, lease_time: float = LEASE_TIME):
+        self.fn = fn
+        self.lease_time = lease_time
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(fn, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def transaction(self):
+        """
+        Return a context manager running a transaction, for changes of ranges and meta values that go together.
+        """
+        return Transaction(self)
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key: str, value: Any):
+        self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def add_range(self, first_id: int, last_id: int):
+        self.connection.execute('INSERT INTO ranges (first_id, last_id, state) VALUES (?, ?, ?)',
+                                (first_id, last_id, PENDING))
+
+    def lease(self, worker: str, now: Optional[float] = None) -> Optional[Tuple[str, int, int]]:
+        """
+        Lease the first range that is pending or whose lease expired to the worker, and return the lease ID and the
+        range, or None if there is none.
+        """
+        now = time.time() if now is None else now
+        with self.transaction():
+            row = self.connection.execute(
+                'SELECT first_id, last_id FROM ranges WHERE state = ? OR (state = ? AND lease_expires < ?) '
+                'ORDER BY first_id LIMIT 1', (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            lease_id = uuid.uuid4().hex
+            self.connection.execute(
+                'UPDATE ranges SET state = ?, lease_id = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 '
+                'WHERE first_id = ?', (LEASED, lease_id, worker, now + self.lease_time, row[0]))
+        return lease_id, row[0], row[1]
+
+    def heartbeat(self, lease_id: str, now: Optional[float] = None) -> bool:
+        """
+        Renew the lease, and return whether it is still held, i.e. did not expire and was not given to another worker.
+        """
+        now = time.time() if now is None else now
+        with self.transaction():
+            cursor = self.connection.execute(
+                'UPDATE ranges SET lease_expires = ? WHERE lease_id = ? AND state = ? AND lease_expires >= ?',
+                (now + self.lease_time, lease_id, LEASED, now))
+        return cursor.rowcount == 1
+
+    def complete(self, lease_id: str, result: Any) -> Optional[Tuple[int, int]]:
+        """
+        Store the result of the leased range and mark it done, and return the range, or None if the lease is not held
+        any more. A lease that expired can still complete its range, as long as no other worker leased it since.
+        """
+        with self.transaction():
+            row = self.connection.execute('SELECT first_id, last_id FROM ranges WHERE lease_id = ? AND state = ?',
+                                          (lease_id, LEASED)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute('UPDATE ranges SET state = ?, lease_expires = NULL, result = ? WHERE first_id = ?',
+                                    (DONE, json.dumps(result), row[0]))
+        return row[0], row[1]
+
+    def done_ranges(self, first_id: int) -> Iterator[Tuple[int, int, Any]]:
+        """
+        Yield the done ranges that follow each other from `first_id` on, with their results.
+        """
+        while True:
+            row = self.connection.execute('SELECT last_id, result FROM ranges WHERE first_id = ? AND state = ?',
+                                          (first_id, DONE)).fetchone()
+            if row is None:
+                return
+            yield first_id, row[0], json.loads(row[1])
+            first_id = row[0] + 1
+
+    def remove(self, first_id: int):
+        self.connection.execute('DELETE FROM ranges WHERE first_id = ?', (first_id,))
+
+    def counts(self) -> dict:
+        counts = dict(self.connection.execute('SELECT state, COUNT(*) FROM ranges GROUP BY state').fetchall())
+        return {state: counts.get(state, 0) for state in (PENDING, LEASED, DONE)}
+
+
+class Transaction:
+
+    def __init__(self, queue: WorkQueue):
+        self.queue = queue
+
+    def __enter__(self):
+        self.queue.lock.acquire()
+        self.queue.connection.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.queue.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.queue.lock.release()
@@ -0,0 +1,71 @@
+"""
+Load large raw YAML files quickly, with libyaml and a parse cache.
+"""
+import os
+import pickle
+import hashlib
+from typing import Any, Optional
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader  # The libyaml parser
+except ImportError:
+    from yaml import SafeLoader
+
+CACHE_SUFFIX = '.cache.pickle'
+# Changing the layout of the cache invalidates the caches written before
+CACHE_VERSION = 1
+
+
+def load_yaml(content: bytes) -> Any:
+    return yaml.load(content, Loader=SafeLoader)
+
+
+def read_cache(cache_fn: str, digest: str) -> Optional[dict]:
+    """
+    Return the cache entry of the given content digest, or None if the cache is missing, stale or unreadable.
+    """
+    try:
+        with open(cache_fn, 'rb') as cache_file:
+            cache = pickle.load(cache_file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, ValueError, TypeError):
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION or cache.get('digest') != digest:
+        return None
+    return cache
+
+
+def write_cache(cache_fn: str, digest: str, data: Any):
+    # Write to a temporary file first, so that an interrupted run never leaves a truncated cache behind
+    tmp_fn = '{fn}.{pid}.tmp'.format(fn=cache_fn, pid=os.getpid())
+    try:
+        with open(tmp_fn, 'wb') as cache_file:
+            pickle.dump({'version': CACHE_VERSION, 'digest': digest, 'data': data}, cache_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_fn, cache_fn)
+    except OSError as error:
+        print('Cannot write the cache {fn}: {error}'.format(fn=cache_fn, error=error))
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+
+
+def load_yaml_cached(fn: str, cache_fn: Optional[str] = None) -> Any:
+    """
+    Load a YAML file, or the data parsed from it before if its content has not changed since.
+
+    The parsed data is pickled to `cache_fn`, by default the file name followed by CACHE_SUFFIX, together with the
+    SHA-256 digest of the file content. Any change of the content, e.g. a new download, hence invalidates the cache,
+    whatever the modification time of the file says.
+    """
+    if cache_fn is None:
+        cache_fn = fn + CACHE_SUFFIX
+    with open(fn, 'rb') as yaml_file:
+        content = yaml_file.read()
+    digest = hashlib.sha256(content).hexdigest()
+    cache = read_cache(cache_fn, digest)
+    if cache is not None:
+        return cache['data']
+    data = load_yaml(content)
+    write_cache(cache_fn, digest, data)
+    return data